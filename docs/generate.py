@@ -0,0 +1,42 @@
+import datetime
+import os
+import os.path
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, "..", "watchy-image-editor"))
+
+from file import File
+from picker import Pick, Picker
+
+WATCHFACES_DIR = f"{ROOT_DIR}/../watchfaces"
+DATA_DIR = f"{ROOT_DIR}/data"
+
+# dates the docs page can look up
+START = datetime.date(2021, 1, 1)
+END = datetime.date(2030, 12, 31)
+
+# header, watchface file with the pointer tables, random function of each table
+WATCHFACES = {
+    "tetris": (
+        f"{WATCHFACES_DIR}/tetris-2.0/tetris.h",
+        f"{WATCHFACES_DIR}/tetris-2.0/Watchy_Tetris.cpp",
+        [Pick("day", "pieces")],
+    ),
+    "pokemon": (
+        f"{WATCHFACES_DIR}/pokemon-2.0/pokemon.h",
+        f"{WATCHFACES_DIR}/pokemon-2.0/Watchy_Pokemon.cpp",
+        [Pick("day", "pokemon_back"), Pick("hour", "pokemon_front", hourly=True)],
+    ),
+}
+
+if __name__ == "__main__":
+    os.makedirs(DATA_DIR, exist_ok=True)
+    for name, (header, tables, picks) in WATCHFACES.items():
+        file = File(header)
+        file.import_tables(tables)
+        index = Picker.export(name, file, picks, START, END, DATA_DIR)
+        print(
+            f"{DATA_DIR}/{name}.json: {index['days']} days, "
+            f"{sum(pick['count'] for pick in index['picks'].values())} images"
+        )
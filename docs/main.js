@@ -1,40 +1,102 @@
 /* exported app, utils */
 
-images = ['piece0_0', 'piece0_1',
-  'piece1_0', 'piece1_1',
-  'piece2_0', 'piece2_1', 'piece2_2', 'piece2_3',
-  'piece3_0', 'piece3_1', 'piece3_2', 'piece3_3',
-  'piece4_0', 'piece4_1',
-  'piece5_0',
-  'piece6_0', 'piece6_1', 'piece6_2', 'piece6_3'];
+// tables and sprite atlases written by generate.py
+const SCALE = 2;
 
 let app = {
   el: '#app',
   data: {
     title: 'Watchy tools',
     tetris_input: '',
-    tetris_path: 'img/piece0_0.png'
+    tetris_style: {},
+    pokemon_input: '',
+    pokemon_hour: 0,
+    pokemon_back_style: {},
+    pokemon_front_style: {},
+    indexes: {},
   },
   methods: {
-    compute_tetris: function() {
+    load_index: function (name) {
       const self = this;
-      const date = new Date(self.tetris_input);
-      const v = Math.floor(self.random_cpp(date) * images.length);
-      self.tetris_path = `img/${images[v]}.png`;
-    },
-    random_cpp: function (date) {
-      let seed = date.getFullYear() - 1970;
-      seed = seed * 12 + (date.getMonth() + 1);
-      seed = seed * 31 + date.getDate();
-    
+      return fetch(`data/${name}.json`)
+        .then((response) => response.json())
+        .then((index) => {
+          Object.values(index.picks).forEach((pick) => {
+            pick.table = Uint8Array.from(atob(pick.data), (c) => c.charCodeAt(0));
+          });
+          self.$set(self.indexes, name, index);
+        });
+    },
+    parse_date: function (text) {
+      // yyyy-mm-dd, without time zone
+      const [year, month, day] = text.split('-').map((v) => parseInt(v, 10));
+      return { year, month, day };
+    },
+    lookup: function (index, pick, date, hour) {
+      // atlas cell of the image shown at this date
+      const day = Math.round((Date.UTC(date.year, date.month - 1, date.day) - Date.parse(index.start)) / 86400000);
+      if (day >= 0 && day < index.days) {
+        return pick.offset + pick.table[day * pick.stride + (pick.stride > 1 ? hour : 0)];
+      }
+      // outside of the tables, computed like the watch
+      return pick.offset + Math.floor(this.random_cpp(date, pick.stride > 1 ? hour : undefined) * pick.count);
+    },
+    sprite_style: function (index, cell) {
+      const [width, height] = index.cell;
+      const rows = Math.ceil(Object.values(index.picks).reduce((sum, pick) => sum + pick.count, 0) / index.columns);
+      return {
+        width: `${width * SCALE}px`,
+        height: `${height * SCALE}px`,
+        'background-image': `url(data/${index.atlas})`,
+        'background-size': `${index.columns * width * SCALE}px ${rows * height * SCALE}px`,
+        'background-position': `-${(cell % index.columns) * width * SCALE}px -${Math.floor(cell / index.columns) * height * SCALE}px`,
+      };
+    },
+    compute_tetris: function () {
+      const self = this;
+      const index = self.indexes.tetris;
+      if (!index || !self.tetris_input) {
+        return;
+      }
+      const date = self.parse_date(self.tetris_input);
+      self.tetris_style = self.sprite_style(index, self.lookup(index, index.picks.day, date));
+    },
+    compute_pokemon: function () {
+      const self = this;
+      const index = self.indexes.pokemon;
+      if (!index || !self.pokemon_input) {
+        return;
+      }
+      const date = self.parse_date(self.pokemon_input);
+      const hour = parseInt(self.pokemon_hour, 10) || 0;
+      self.pokemon_back_style = self.sprite_style(index, self.lookup(index, index.picks.day, date));
+      self.pokemon_front_style = self.sprite_style(index, self.lookup(index, index.picks.hour, date, hour));
+    },
+    random_cpp: function (date, hour) {
+      let seed = date.year - 1970;
+      seed = seed * 12 + date.month;
+      seed = seed * 31 + date.day;
+      if (hour !== undefined) {
+        seed = seed * 24 + hour;
+      }
+
       let v = Math.pow(seed, 6/7);
       v *= (Math.sin(v) + 1);
-    
+
       return v - Math.floor(v);
     },
   },
   watch: {
     tetris_input: 'compute_tetris',
+    pokemon_input: 'compute_pokemon',
+    pokemon_hour: 'compute_pokemon',
+    indexes: {
+      handler: function () {
+        this.compute_tetris();
+        this.compute_pokemon();
+      },
+      deep: false,
+    },
   },
   'mounted': function () {
     const self = this;
@@ -42,7 +104,12 @@ let app = {
     setTimeout(() => {
       self.$el.setAttribute('style', '');
     });
-    self.tetris_input = (new Date()).toISOString().substr(0, 10);
+    const now = new Date();
+    self.tetris_input = now.toISOString().substr(0, 10);
+    self.pokemon_input = self.tetris_input;
+    self.pokemon_hour = now.getHours();
+    self.load_index('tetris');
+    self.load_index('pokemon');
   }
 };
 
@@ -1,35 +1,60 @@
-from PIL import Image
 import os.path
+import sys
 
-ROOT_DIR = f"{os.path.dirname(__file__)}/pokemon-src/main-sprites/yellow"
-FRONT_DIR = f"{ROOT_DIR}/gray"
-BACK_DIR = f"{ROOT_DIR}/back/gray"
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, "..", "..", "watchy-image-editor"))
+
+from file import File
+from pipeline import Pipeline
+
+SOURCE_DIR = f"{ROOT_DIR}/pokemon-src/main-sprites/yellow"
+FRONT_DIR = f"{SOURCE_DIR}/gray"
+BACK_DIR = f"{SOURCE_DIR}/back/gray"
 
 COUNT = 151
 
-OUT_DIR = f"{os.path.dirname(__file__)}/pokemon-out"
-
-THRESHOLD = 127
-
-for i in range(1, COUNT + 1):
-    with Image.open(f"{FRONT_DIR}/{i}.png") as im_src:
-        w0, h0 = im_src.size
-        im = Image.new(im_src.mode, (56, 56), 'white')
-        im.paste(im_src, ((56 - w0) // 2, (56 - h0) // 2))
-        im = im.resize((68, 68))
-        im = im.point(lambda p: 1 if p > THRESHOLD else 0, mode="1")
-        im0, im = im, Image.new(im.mode, (80, 68), color=1)
-        im.paste(im0, (0, 0))
-        im = im.convert(mode="P")
-        im.save(f"{OUT_DIR}/front_{i}.bmp")
-    
-    with Image.open(f"{BACK_DIR}/{i}.png") as im:
-        w0, h0 = im.size
-        im0, im = im, Image.new(im.mode, (28, 28), 'white')
-        im.paste(im0, (0, 0))
-        im = im.resize((68, 68))
-        im = im.point(lambda p: 1 if p > THRESHOLD else 0, mode="1")
-        im0, im = im, Image.new(im.mode, (80, 68), color=1)
-        im.paste(im0, (0, 0))
-        im = im.convert(mode="P")
-        im.save(f"{OUT_DIR}/back_{i}.bmp")
\ No newline at end of file
+HEADER = f"{ROOT_DIR}/pokemon.h"
+# sources that did not change since the last run are skipped
+MANIFEST = f"{ROOT_DIR}/pokemon-src/manifest.json"
+
+# gray levels below are black
+THRESHOLD = 128
+
+FRONT = Pipeline(
+    [
+        ("pad", 56, 56, "c"),
+        ("resize", 68, 68),
+        ("threshold", THRESHOLD),
+        ("canvas", 80, 68, "nw"),
+    ]
+)
+BACK = Pipeline(
+    [
+        ("pad", 28, 28, "nw"),
+        ("resize", 68, 68),
+        ("threshold", THRESHOLD),
+        ("canvas", 80, 68, "nw"),
+    ]
+)
+
+if __name__ == "__main__":
+    file = File(HEADER)
+    jobs = [
+        job
+        for i in range(1, COUNT + 1)
+        for job in [
+            FRONT.job(f"front_{i}", f"{FRONT_DIR}/{i}.png"),
+            BACK.job(f"back_{i}", f"{BACK_DIR}/{i}.png"),
+        ]
+    ]
+    results = Pipeline.run(file, jobs, MANIFEST)
+    errors = [result for result in results if result.error is not None]
+    for result in errors:
+        print(f"{result.path}: {result.error}", file=sys.stderr)
+    print(
+        f"{len(results) - len(errors)} sprites processed, {len(errors)} failed, "
+        f"{len(jobs) - len(results)} unchanged"
+    )
+    if file.modified:
+        file.save(HEADER)
+        print(f"{HEADER}: saved")
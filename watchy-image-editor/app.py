@@ -1,15 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from typing import Optional
+from typing import Callable, Iterable, List, Optional
 from enum import Enum
 import os.path
 
 from explorer import Explorer
 from image_view import ImageView
 from input_popup import InputPopup
+from size_popup import SizePopup
+from task import Task
+from task_bar import TaskBar
 from file import File
 from image import Image
 from bitmap import Bitmap, BitmapError
+from bulk import Bulk, BulkResult
+from dither import Dither
+from history import Batch, History, ListChange
+from packbits import PackBits
+from transform import Transform
 
 
 class MenuEntryType(Enum):
@@ -17,6 +25,9 @@ class MenuEntryType(Enum):
     NEED_FILE = 1
     NEED_IMAGE = 2
     SEPARATOR = 4
+    ALWAYS = 8
+    # an image of the list, font glyphs are not renamed, moved or deleted
+    NEED_LISTED_IMAGE = 16
 
 
 class App(ttk.Frame):
@@ -27,6 +38,11 @@ class App(ttk.Frame):
             ("", "", MenuEntryType.SEPARATOR),
             ("Save File", "_file_save", MenuEntryType.NEED_FILE),
             ("Save File As...", "_file_save_as", MenuEntryType.NEED_FILE),
+            (
+                "Save Compressed As...",
+                "_file_save_compressed_as",
+                MenuEntryType.NEED_FILE,
+            ),
             ("Close File", "_file_close", MenuEntryType.NEED_FILE),
             ("", "", MenuEntryType.SEPARATOR),
             (
@@ -34,34 +50,43 @@ class App(ttk.Frame):
                 "_file_new_image",
                 MenuEntryType.NEED_FILE,
             ),
+            (
+                "Import Tables...",
+                "_file_import_tables",
+                MenuEntryType.NEED_FILE,
+            ),
             ("", "", MenuEntryType.SEPARATOR),
-            ("Quit", "_file_quit", MenuEntryType.DEFAULT),
+            ("Quit", "_file_quit", MenuEntryType.ALWAYS),
+        ],
+        "Edit": [
+            ("Undo", "_edit_undo", MenuEntryType.NEED_FILE),
+            ("Redo", "_edit_redo", MenuEntryType.NEED_FILE),
         ],
         "Image": [
             (
                 "Edit Image Name...",
                 "_image_edit_name",
-                MenuEntryType.NEED_IMAGE,
+                MenuEntryType.NEED_LISTED_IMAGE,
             ),
             (
                 "Edit Image Size...",
                 "_image_edit_size",
                 MenuEntryType.NEED_IMAGE,
-            ),  # TODO _image_edit_size
+            ),
             (
                 "Move Image Up",
                 "_image_move_up",
-                MenuEntryType.NEED_IMAGE,
+                MenuEntryType.NEED_LISTED_IMAGE,
             ),
             (
                 "Move Image Down",
                 "_image_move_down",
-                MenuEntryType.NEED_IMAGE,
+                MenuEntryType.NEED_LISTED_IMAGE,
             ),
             (
                 "Delete Image",
                 "_image_delete",
-                MenuEntryType.NEED_IMAGE,
+                MenuEntryType.NEED_LISTED_IMAGE,
             ),
         ],
         "Bitmap": [
@@ -93,14 +118,22 @@ class App(ttk.Frame):
 
         self.parent = parent
         self.current_file = None
+        self.history = History()
 
         self.explorer = Explorer(self, self.update)
         self.explorer.grid(column=0, row=0, sticky="nsw")
 
-        self.image_view = ImageView(self)
+        self.image_view = ImageView(self, self.history, lambda: self.task_bar.running)
         self.image_view.grid(column=1, row=0, sticky="nsew")
 
+        self.task_bar = TaskBar(self, self.update)
+        self.task_bar.grid(column=0, row=1, columnspan=2, sticky="ew")
+        self.task_bar.grid_remove()
+
         self.init_menus()
+        parent.bind("<Control-z>", lambda event: self._edit_undo())
+        parent.bind("<Control-y>", lambda event: self._edit_redo())
+        parent.bind("<Control-Z>", lambda event: self._edit_redo())
 
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -116,11 +149,15 @@ class App(ttk.Frame):
         else:
             return self.explorer.current_image
 
-    def update(self, force: bool = False) -> None:
+    def update(self, force: bool = False, changed: Iterable[Image] = ()) -> None:
+        # changed images get their explorer row refreshed, the current one always
+        # does, force refreshes every row
         self.update_title()
         self.update_menus()
+        if self.current_image is not None:
+            self.current_file.touch(self.current_image)
         self.image_view.update(self.current_image)
-        self.explorer.update(self.current_file, force)
+        self.explorer.update(self.current_file, force, changed)
 
     def update_title(self) -> None:
         title = "Watchy Image Editor"
@@ -158,45 +195,128 @@ class App(ttk.Frame):
                         label=entry_name, command=entry_action
                     )
 
+        # conversion of colored .bmp files, used by every import
+        self.dither_mode = tk.StringVar(self.parent, Dither.THRESHOLD)
+        dither_menu = tk.Menu(self.menus["Bitmap"])
+        for mode in Dither.MODES:
+            dither_menu.add_radiobutton(
+                label=mode.replace("-", " ").title(),
+                variable=self.dither_mode,
+                value=mode,
+            )
+        self.menus["Bitmap"].add_separator()
+        self.menus["Bitmap"].add_cascade(menu=dither_menu, label="Import Dithering")
+
+        # save options, both change what the watchface compiles so are off by default
+        self.deduplicate = tk.BooleanVar(self.parent, False)
+        self.imported_tables = tk.BooleanVar(self.parent, False)
+        save_menu = tk.Menu(self.menus["File"])
+        save_menu.add_checkbutton(
+            label="Write Identical Images Once", variable=self.deduplicate
+        )
+        save_menu.add_checkbutton(
+            label="Write Imported Tables", variable=self.imported_tables
+        )
+        self.menus["File"].insert_cascade(
+            self.menus["File"].index("Close File"), menu=save_menu, label="Save Options"
+        )
+
     def update_menus(self) -> None:
+        busy = self.task_bar.running
         for menu_name in self.MENU_ENTRIES:
             any_enabled = False
             for entry_name, entry_action, entry_type in self.MENU_ENTRIES[menu_name]:
                 if entry_type == MenuEntryType.NEED_FILE:
-                    self.menus[menu_name].entryconfigure(
-                        entry_name,
-                        state=(
-                            "normal" if self.current_file is not None else "disabled"
-                        ),
-                    )
-                    any_enabled |= self.current_file is not None
+                    enabled = self.current_file is not None and not busy
                 elif entry_type == MenuEntryType.NEED_IMAGE:
-                    self.menus[menu_name].entryconfigure(
-                        entry_name,
-                        state=(
-                            "normal" if self.current_image is not None else "disabled"
-                        ),
-                    )
-                    any_enabled |= self.current_image is not None
+                    enabled = self.current_image is not None and not busy
+                elif entry_type == MenuEntryType.NEED_LISTED_IMAGE:
+                    enabled = self.explorer.current_id is not None and not busy
                 elif entry_type == MenuEntryType.DEFAULT:
-                    any_enabled = True
+                    enabled = not busy
+                elif entry_type == MenuEntryType.ALWAYS:
+                    enabled = True
+                else:
+                    continue
+                self.menus[menu_name].entryconfigure(
+                    entry_name,
+                    state=("normal" if enabled else "disabled"),
+                )
+                any_enabled |= enabled
 
             self.menubar.entryconfigure(
                 menu_name, state=("normal" if any_enabled else "disabled")
             )
 
+    def run_task(self, task: Task, done_callback: Callable[[Task], None]) -> None:
+        # strokes in progress are recorded before the file is read or written
+        self.image_view.end_stroke()
+        self.task_bar.start(task, done_callback)
+        self.update_menus()
+
     def open_file(self, path: Optional[str], new: bool = False) -> None:
+        if self.current_file is not None:
+            self.current_file.close()
+        self.history.clear()
         if path is None and not new:
             self.current_file = None
+        elif path is None:
+            self.current_file = File(None)
         else:
-            self.current_file = File(path)
+            file = File(path, read=False, lazy=os.path.getsize(path) >= File.LAZY_SIZE)
+            self.current_file = file
+
+            def read(task: Task) -> None:
+                for position, total in file.read_images():
+                    task.report(position, total, f"{len(file.images)} images")
+
+            self.run_task(Task("Opening...", read), self.__open_file_done)
         self.update(force=True)
 
+    def __open_file_done(self, task: Task) -> None:
+        if task.error is not None:
+            messagebox.showerror(title="Open file error", message=str(task.error))
+        if task.error is not None or task.cancelled:
+            self.open_file(None)
+        else:
+            self.update(force=True)
+
     def save_file(self, path: Optional[str] = None) -> None:
         if path == "":
             path = filedialog.asksaveasfilename()
-        self.current_file.export(path)
-        self.open_file(path)
+
+        deduplicate = self.deduplicate.get()
+        imported_tables = self.imported_tables.get()
+        # their rows lose their modified mark once saved
+        modified = [image for image in self.current_file.images if image.modified]
+        modified += [
+            glyph.image
+            for font in self.current_file.fonts
+            for glyph in font.glyphs
+            if glyph.image.modified
+        ]
+
+        def export(task: Task) -> None:
+            self.current_file.save(
+                path,
+                lambda i, total, written: task.report(
+                    i, total, f"{written} bytes written"
+                ),
+                deduplicate,
+                imported_tables,
+            )
+
+        self.run_task(
+            Task("Saving...", export),
+            lambda task: self.__save_file_done(task, modified),
+        )
+
+    def __save_file_done(self, task: Task, modified: List[Image]) -> None:
+        if task.error is not None:
+            messagebox.showerror(title="Save file error", message=str(task.error))
+        # on failure the previous file is left untouched, on success the
+        # model already matches what was written, keep editing either way
+        self.update(changed=modified)
 
     def _file_new(self) -> None:
         self.open_file(None, True)
@@ -225,7 +345,10 @@ class App(ttk.Frame):
         else:
             self.save_file(self.current_file.path)
 
-    def _file_save_as(self) -> None:
+    def _file_save_compressed_as(self) -> None:
+        self._file_save_as(PackBits.NAME)
+
+    def _file_save_as(self, encoding: Optional[str] = None) -> None:
         path = filedialog.asksaveasfilename(
             filetypes=File.FILE_TYPES,
             defaultextension=File.FILE_TYPES,
@@ -241,6 +364,16 @@ class App(ttk.Frame):
             ),
         )
         if path:
+            self.current_file.encoding = encoding
+            if encoding == PackBits.NAME:
+                # the watchface needs the decoder to draw compressed images
+                try:
+                    PackBits.write_decoder(
+                        os.path.join(os.path.dirname(path), "packbits.h")
+                    )
+                except OSError as e:
+                    messagebox.showerror(title="Save file error", message=str(e))
+                    return
             self.save_file(path)
 
     def _file_close(self) -> None:
@@ -253,12 +386,51 @@ class App(ttk.Frame):
             message="Please enter image name",
         )
         if popup.value:
-            self.current_file.images += [Image(popup.value, 20, 20, empty=True)]
+            image = Image(popup.value, 20, 20, empty=True)
+            self.history.change_list(
+                self.current_file, image, lambda: self.current_file.images.append(image)
+            )
+            self.update(changed=[image])
+
+    def _file_import_tables(self) -> None:
+        path = filedialog.askopenfilename(
+            filetypes=[("C++ File", "*.cpp"), *File.FILE_TYPES],
+        )
+        if path:
+            try:
+                count = self.current_file.import_tables(path)
+            except (OSError, UnicodeDecodeError) as e:
+                messagebox.showerror(title="Import tables error", message=str(e))
+                return
+            messagebox.showinfo(
+                title="Import tables", message=f"{count} table(s) imported"
+            )
             self.update()
 
     def _file_quit(self) -> None:
         self.parent.destroy()
 
+    def _edit_undo(self) -> None:
+        self.__apply_history(True)
+
+    def _edit_redo(self) -> None:
+        self.__apply_history(False)
+
+    def __apply_history(self, undo: bool) -> None:
+        # shortcuts are bound to the window, menus may be disabled
+        if self.current_file is None or self.task_bar.running:
+            return
+        self.image_view.end_stroke()
+        entry = self.history.undo() if undo else self.history.redo()
+        if entry is None:
+            return
+        if isinstance(entry, (ListChange, Batch)):
+            self.update(force=True)
+        else:
+            self.update(changed=[entry.image])
+        if entry.image in self.current_file.images:
+            self.explorer.focus(self.current_file.images.index(entry.image))
+
     def _image_edit_name(self) -> None:
         popup = InputPopup(
             self,
@@ -267,17 +439,64 @@ class App(ttk.Frame):
             initial_value=self.explorer.current_image.name,
         )
         if popup.value:
-            self.explorer.current_image.name = popup.value
+            self.history.rename(
+                self.current_file, self.explorer.current_image, popup.value
+            )
+            self.update()
+
+    def _image_edit_size(self) -> None:
+        image = self.current_image
+        popup = SizePopup(
+            self, title="Edit image size", width=image.width, height=image.height
+        )
+        choice = popup.value
+        if choice is None:
+            return
+        if choice.all_images:
+            file = self.current_file
+            snapshot = self.history.snapshot(file)
+
+            def resize_all(task: Task) -> int:
+                return Transform.resize_all(
+                    file,
+                    choice.width,
+                    choice.height,
+                    choice.mode,
+                    choice.anchor,
+                    progress=lambda i, total: task.report(i, total, f"{i}/{total}"),
+                )
+
+            def resize_done(task: Task) -> None:
+                self.history.record_file(file, snapshot)
+                if task.error is not None:
+                    messagebox.showerror(title="Resize error", message=str(task.error))
+                self.update(force=True)
+
+            self.run_task(Task("Resizing...", resize_all), resize_done)
+        else:
+            self.history.begin(image)
+            Transform.resize(
+                image, choice.width, choice.height, choice.mode, choice.anchor
+            )
+            self.history.end(image)
             self.update()
 
     def _image_move_up(self) -> None:
-        self.explorer.move_up()
+        self.history.change_list(
+            self.current_file, self.current_image, self.explorer.move_up
+        )
 
     def _image_move_down(self) -> None:
-        self.explorer.move_down()
+        self.history.change_list(
+            self.current_file, self.current_image, self.explorer.move_down
+        )
 
     def _image_delete(self) -> None:
-        self.explorer.delete()
+        try:
+            self.history.change_list(self.current_file, None, self.explorer.delete)
+        except ValueError as e:
+            messagebox.showerror(title="Delete image error", message=str(e))
+        self.update()
 
     def _bmp_import_all(self) -> None:
         paths = filedialog.askopenfilenames(
@@ -285,23 +504,60 @@ class App(ttk.Frame):
             defaultextension=Bitmap.FILE_TYPES,
         )
         if paths and len(paths) > 0:
-            for path in paths:
-                name = os.path.basename(path).rstrip(".bmp")
-                image = self.current_file.search(name)
-                if image is None:
-                    image = Image(name, 20, 20, empty=True)
-                    self.current_file.images += [image]
-                try:
-                    image.import_bmp(path)
-                except BitmapError as e:
-                    pass
-            self.update()
+            file = self.current_file
+            snapshot = self.history.snapshot(file)
+            dither = self.dither_mode.get()
+
+            def import_all(task: Task) -> List[BulkResult]:
+                return Bulk.import_bmps(
+                    file,
+                    paths,
+                    progress=lambda i, total: task.report(i, total, f"{i}/{total}"),
+                    dither=dither,
+                )
+
+            def import_done(task: Task) -> None:
+                # undone as a whole, failed files left nothing to undo
+                self.history.record_file(file, snapshot)
+                self.__bulk_done(task, "Bitmap import error", True)
+
+            self.run_task(Task("Importing...", import_all), import_done)
 
     def _bmp_export_all(self) -> None:
         dir_path = filedialog.askdirectory()
         if dir_path:
-            for image in self.current_file.images:
-                image.export_bmp(os.path.join(dir_path, f"{image.name}.bmp"))
+            file = self.current_file
+
+            def export_all(task: Task) -> List[BulkResult]:
+                return Bulk.export_bmps(
+                    file,
+                    dir_path,
+                    progress=lambda i, total: task.report(i, total, f"{i}/{total}"),
+                )
+
+            self.run_task(
+                Task("Exporting...", export_all),
+                lambda task: self.__bulk_done(task, "Bitmap export error"),
+            )
+
+    def __bulk_done(self, task: Task, title: str, force: bool = False) -> None:
+        self.update(force)
+        if task.error is not None:
+            messagebox.showerror(title=title, message=str(task.error))
+        elif task.result is not None:
+            self.show_bulk_errors(title, task.result)
+
+    def show_bulk_errors(self, title: str, results: List[BulkResult]) -> None:
+        errors = [
+            f"{os.path.basename(result.path)}: {result.error}"
+            for result in results
+            if result.error is not None
+        ]
+        if len(errors) > 0:
+            messagebox.showerror(
+                title=title,
+                message=f"{len(errors)} file(s) failed:\n" + "\n".join(errors[:20]),
+            )
 
     def _bmp_import_image(self) -> None:
         path = filedialog.askopenfilename(
@@ -309,10 +565,14 @@ class App(ttk.Frame):
             defaultextension=Bitmap.FILE_TYPES,
         )
         if path:
+            image = self.current_image
+            self.history.begin(image)
             try:
-                self.current_image.import_bmp(path)
+                image.import_bmp(path, self.dither_mode.get())
+                self.history.end(image)
                 self.update()
             except BitmapError as e:
+                self.history.cancel(image)
                 messagebox.showerror(title="Bitmap import error", message=str(e))
 
     def _bmp_export_image(self) -> None:
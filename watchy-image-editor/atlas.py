@@ -0,0 +1,281 @@
+from typing import Dict, List, NamedTuple, Optional, TextIO, Tuple
+import math
+import re
+
+from file import File
+from image import Image
+from simulator import Frame
+from transform import Transform
+
+
+class Sprite(NamedTuple):
+    name: str
+    # trimmed image in the sheet
+    x: int
+    y: int
+    width: int
+    height: int
+    # position of the trimmed image in the original one
+    x_offset: int
+    y_offset: int
+    full_width: int
+    full_height: int
+
+
+class Sheet(NamedTuple):
+    width: int
+    height: int
+    data: bytes
+    sprites: List[Sprite]
+
+
+class Atlas:
+    # sprites are placed at any bit of a row, ALIGN = 8 keeps them on bytes
+    # at the cost of some flash
+    ALIGN = 1
+    SPRITE_VALUES = 8
+    SPRITE_SIZE = 2 * SPRITE_VALUES
+    SPRITE_PATTERN = re.compile(r"\{([^{}]*)\}[ \t]*,?[ \t]*//[ \t]*(\w+)")
+    SPRITES_PATTERN = re.compile(
+        r"const\s+uint16_t\s+(?P<name>\w+)_sprites\s*\[\s*\d*\s*\]\s*\[\s*8\s*\]\s*"
+        r"(?:PROGMEM\s*)?=\s*\{(?P<entries>(?:[^{}/]|//[^\n]*|\{[^{}]*\})*)\}\s*;"
+    )
+    HELPER = """\
+// sprite atlas helper for atlases exported by watchy-image-editor
+#ifndef WATCHY_ATLAS_H
+#define WATCHY_ATLAS_H
+
+#include <Arduino.h>
+
+// sprite: x, y, width, height, x offset, y offset, full width, full height
+// draws the sprite like drawBitmap would draw the original image at (x, y)
+template <typename Display>
+void drawAtlasSprite(Display &display, int16_t x, int16_t y, const uint8_t *atlas, uint16_t atlas_width, const uint16_t *sprite, uint16_t color)
+{
+    uint16_t sx = pgm_read_word(&sprite[0]);
+    uint16_t sy = pgm_read_word(&sprite[1]);
+    int16_t w = pgm_read_word(&sprite[2]);
+    int16_t h = pgm_read_word(&sprite[3]);
+    x += pgm_read_word(&sprite[4]);
+    y += pgm_read_word(&sprite[5]);
+    uint16_t stride = (atlas_width + 7) / 8;
+    for (int16_t j = 0; j < h; j++)
+    {
+        // sprites do not start on a byte, bits are shifted out one by one
+        const uint8_t *row = atlas + (uint32_t)(sy + j) * stride + sx / 8;
+        uint8_t bits = pgm_read_byte(row++) << (sx & 7);
+        uint8_t left = 8 - (sx & 7);
+        for (int16_t i = 0; i < w; i++)
+        {
+            if (left == 0)
+            {
+                bits = pgm_read_byte(row++);
+                left = 8;
+            }
+            if (bits & 0x80)
+                display.drawPixel(x + i, y + j, color);
+            bits <<= 1;
+            left--;
+        }
+    }
+}
+
+#endif
+"""
+
+    @staticmethod
+    def trim(image: Image) -> Tuple[int, int, int, int]:
+        # (x, y, width, height) of the inked pixels, empty for blank images
+        rows = [int.from_bytes(row, "big") for row in image.rows()]
+        inked = [j for j, row in enumerate(rows) if row != 0]
+        if len(inked) == 0:
+            return 0, 0, 0, 0
+        columns = 0
+        for row in rows:
+            columns |= row
+        bit_count = 8 * image.row_size
+        first = bit_count - columns.bit_length()
+        last = bit_count - (columns & -columns).bit_length() + 1
+        return first, inked[0], last - first, inked[-1] - inked[0] + 1
+
+    @staticmethod
+    def pack(
+        sizes: List[Tuple[int, int]], width: int, align: int = ALIGN
+    ) -> Tuple[List[Tuple[int, int]], int]:
+        # skyline bottom-left packing: tallest rectangles first, each one at the
+        # lowest then leftmost position, returns positions and sheet height
+        positions: List[Tuple[int, int]] = [(0, 0)] * len(sizes)
+        # (x, y, width) segments of the top edge, left to right
+        skyline = [(0, 0, width)]
+        order = sorted(range(len(sizes)), key=lambda k: (-sizes[k][1], -sizes[k][0], k))
+        for k in order:
+            w, h = sizes[k]
+            if w == 0 or h == 0:
+                continue
+            w = -(-w // align) * align
+            best = None
+            for i, (x, _, _) in enumerate(skyline):
+                if x + w > width:
+                    break
+                y = 0
+                end = i
+                while end < len(skyline) and skyline[end][0] < x + w:
+                    y = max(y, skyline[end][1])
+                    end += 1
+                if best is None or (y, x) < best[:2]:
+                    best = (y, x, i, end)
+            if best is None:
+                raise ValueError(f"{w}px wide image in a {width}px wide sheet")
+            y, x, i, end = best
+            positions[k] = (x, y)
+            # the rectangle replaces the segments below it
+            last_x, last_y, last_w = skyline[end - 1]
+            segments = [(x, y + h, w)]
+            if last_x + last_w > x + w:
+                segments += [(x + w, last_y, last_x + last_w - x - w)]
+            skyline[i:end] = segments
+        height = max((y + sizes[k][1] for k, (_, y) in enumerate(positions)), default=0)
+        return positions, height
+
+    @classmethod
+    def get_widths(cls, sizes: List[Tuple[int, int]]) -> List[int]:
+        # sheet widths tried, around a square sheet
+        minimum = max((w for w, _ in sizes), default=8)
+        area = sum(w * h for w, h in sizes)
+        widths = {minimum}
+        for factor in (0.5, 0.7, 1, 1.4, 2, 2.8):
+            widths.add(max(minimum, int(math.sqrt(area) * factor)))
+        return sorted(-(-width // 8) * 8 for width in widths)
+
+    @classmethod
+    def build(
+        cls, images: List[Image], width: Optional[int] = None, align: int = ALIGN
+    ) -> Sheet:
+        # identical trimmed images share their place in the sheet
+        bounds = [cls.trim(image) for image in images]
+        trimmed: Dict[Tuple[int, int, bytes], int] = {}
+        datas = []
+        owners = []
+        for image, (x, y, w, h) in zip(images, bounds):
+            data = bytes(
+                Transform.window(image.data, image.width, image.height, x, y, w, h)
+            )
+            key = (w, h, data)
+            if key not in trimmed:
+                trimmed[key] = len(datas)
+                datas += [(w, h, data)]
+            owners += [trimmed[key]]
+        sizes = [(w, h) for w, h, _ in datas]
+
+        best = None
+        for sheet_width in [width] if width is not None else cls.get_widths(sizes):
+            positions, height = cls.pack(sizes, sheet_width, align)
+            size = (sheet_width + 7) // 8 * height
+            if best is None or size < best[0]:
+                best = (size, sheet_width, height, positions)
+        _, sheet_width, height, positions = best
+
+        frame = Frame(sheet_width, height)
+        for (w, h, data), (x, y) in zip(datas, positions):
+            if w > 0 and h > 0:
+                frame.blit(data, x, y, w, h)
+        sprites = [
+            Sprite(
+                image.name,
+                *positions[owner],
+                bound[2],
+                bound[3],
+                bound[0],
+                bound[1],
+                image.width,
+                image.height,
+            )
+            for image, bound, owner in zip(images, bounds, owners)
+        ]
+        return Sheet(sheet_width, height, frame.data, sprites)
+
+    @classmethod
+    def extract(cls, sheet: Sheet) -> List[Image]:
+        # original images, blank borders included
+        images = []
+        for sprite in sheet.sprites:
+            data = Transform.window(
+                sheet.data,
+                sheet.width,
+                sheet.height,
+                sprite.x,
+                sprite.y,
+                sprite.width,
+                sprite.height,
+            )
+            image = Image(sprite.name, sprite.full_width, sprite.full_height)
+            image.data = Transform.window(
+                data,
+                sprite.width,
+                sprite.height,
+                -sprite.x_offset,
+                -sprite.y_offset,
+                sprite.full_width,
+                sprite.full_height,
+            )
+            images += [image]
+        return images
+
+    @classmethod
+    def write_cpp(cls, f: TextIO, name: str, sheet: Sheet) -> int:
+        # the sheet is a regular image, followed by the sprites and their ids
+        image = Image(name, sheet.width, sheet.height)
+        image.data = bytearray(sheet.data)
+        written = image.write_cpp(f)
+        written += f.write(
+            f"\n// x, y, width, height, x offset, y offset, full width, full height\n"
+            f"const uint16_t {name}_sprites[{len(sheet.sprites)}]"
+            f"[{cls.SPRITE_VALUES}] PROGMEM = {{\n"
+        )
+        for sprite in sheet.sprites:
+            values = ", ".join(str(value) for value in sprite[1:])
+            written += f.write(f"\t{{{values}}}, // {sprite.name}\n")
+        written += f.write("};\n\n")
+        written += f.write(f"#define {name.upper()}_WIDTH {sheet.width}\n")
+        written += f.write(f"#define {name.upper()}_HEIGHT {sheet.height}\n")
+        for k, sprite in enumerate(sheet.sprites):
+            written += f.write(f"#define {name.upper()}_{sprite.name.upper()} {k}\n")
+        return written
+
+    @classmethod
+    def export(cls, sheet: Sheet, name: str, path: str) -> None:
+        with File.replace_file(path) as f:
+            f.write(f"// {len(sheet.sprites)} images, see {name}_sprites\n")
+            cls.write_cpp(f, name, sheet)
+
+    @classmethod
+    def read(cls, path: str, name: Optional[str] = None) -> Sheet:
+        # sheet of a header written by export, the first one unless named
+        with open(path) as f:
+            content = f.read()
+        for match in cls.SPRITES_PATTERN.finditer(content):
+            if name is None or match.group("name") == name:
+                break
+        else:
+            raise ValueError(f"{path}: no atlas found")
+        name = match.group("name")
+        image = File(path).search(name)
+        if image is None:
+            raise ValueError(f"{path}: no {name} image")
+        sprites = []
+        for values, sprite_name in cls.SPRITE_PATTERN.findall(match.group("entries")):
+            sprites += [
+                Sprite(sprite_name, *(int(value) for value in values.split(",")))
+            ]
+        return Sheet(image.width, image.height, bytes(image.data), sprites)
+
+    @classmethod
+    def report(cls, images: List[Image], sheet: Sheet) -> Tuple[int, int]:
+        # (bytes as separate images, bytes as an atlas) of image data in flash
+        separate = sum(image.row_size * image.height for image in images)
+        return separate, len(sheet.data) + cls.SPRITE_SIZE * len(sheet.sprites)
+
+    @classmethod
+    def write_helper(cls, path: str) -> None:
+        with File.replace_file(path) as f:
+            f.write(cls.HELPER)
@@ -0,0 +1,708 @@
+from typing import Callable, List, Tuple
+import re
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from atlas import Atlas
+from bitmap import Bitmap
+from bulk import Bulk
+from dither import Dither
+from cache import ParseCache
+from compare import Compare
+from file import File
+from header import HeaderParser
+from history import History
+from image import Image
+from packbits import PackBits
+from pipeline import Pipeline, PILImage
+from pixels import Pixels, numpy
+from simulator import POKEMON, Simulator
+from transform import Transform
+
+WATCHFACES_DIR = os.path.join(os.path.dirname(__file__), "..", "watchfaces")
+
+HEADERS = [
+    os.path.join(WATCHFACES_DIR, "pokemon-2.0", "pokemon.h"),
+    os.path.join(WATCHFACES_DIR, "tetris-2.0", "tetris.h"),
+]
+
+
+def timeit(function: Callable, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def legacy_read_file(path: str) -> List[Tuple[str, int, int, List[int]]]:
+    # line-based parser and list storage used before HeaderParser, kept as a reference
+    images = []
+    current_image = None
+    with open(path) as f:
+        for line in f:
+            header = re.match(r"const unsigned char (\w+) \[\] PROGMEM \= \{", line)
+            if header:
+                groups = header.groups()
+                if current_image is None:
+                    current_image = [groups[0], 0, 0, []]
+                current_image[0] = groups[0]
+            elif current_image is not None and current_image[0] is not None:
+                data = re.match(r"((0x\w+,? ?)+)", line.strip())
+                if data:
+                    values = data.groups()[0].strip().strip(",").split(", ")
+                    for v in values:
+                        current_image[3] += [int(v, 16)]
+                else:
+                    images += [tuple(current_image)]
+                    current_image = None
+            comment_header = re.match(r"// '(\w+)', (\d+)x(\d+)px", line)
+            if comment_header:
+                groups = comment_header.groups()
+                current_image = [groups[0], int(groups[1]), int(groups[2]), []]
+    return images
+
+
+def bench_parse() -> None:
+    for path in HEADERS:
+        legacy = legacy_read_file(path)
+        images = list(HeaderParser.read_file(path))
+        assert legacy == [(i.name, i.width, i.height, list(i.data)) for i in images]
+        legacy_time = timeit(lambda: legacy_read_file(path))
+        parser_time = timeit(lambda: list(HeaderParser.read_file(path)))
+        print(
+            f"parse {os.path.basename(path)}: {len(images)} images, "
+            f"legacy {legacy_time * 1000:.1f}ms, "
+            f"parser {parser_time * 1000:.1f}ms "
+            f"(x{legacy_time / parser_time:.1f})"
+        )
+
+
+def measure_memory(function: Callable) -> int:
+    tracemalloc.start()
+    result = function()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_memory() -> None:
+    path = HEADERS[0]
+    legacy_size = measure_memory(lambda: legacy_read_file(path))
+    image_size = measure_memory(lambda: list(HeaderParser.read_file(path)))
+    print(
+        f"memory {os.path.basename(path)}: "
+        f"legacy {legacy_size / 1024:.0f}KiB, "
+        f"bytearray {image_size / 1024:.0f}KiB "
+        f"(x{legacy_size / image_size:.1f})"
+    )
+
+
+def legacy_color_bytes(image: Image) -> bytes:
+    # per-pixel encoding used before Pixels.expand, kept as a reference
+    output = bytes()
+    for y in range(image.height):
+        for x in range(image.width):
+            if image.get_pixel(x, y):
+                output += bytes([0, 0, 0])
+            else:
+                output += bytes([255, 255, 255])
+    return output
+
+
+def legacy_format_data(width: int, height: int, color_depth: int, data: bytes) -> bytes:
+    line_padding = (width * color_depth) % 4
+    output_data = bytes()
+    for y in range(height):
+        start = (height - y - 1) * color_depth * width
+        output_data += data[start : start + width * color_depth]
+        if line_padding > 0:
+            output_data += bytes([0]) * (4 - line_padding)
+    return output_data
+
+
+def legacy_pack(width: int, height: int, color_depth: int, data: bytes) -> bytearray:
+    image = Image("legacy", width, height, empty=True)
+    for y in range(height):
+        for x in range(width):
+            position = (y * width + x) * color_depth
+            colors = data[position : position + color_depth]
+            mean_color = sum(c for c in colors) / color_depth
+            if mean_color < 128:
+                image.set_pixel(x, y, True)
+    return image.data
+
+
+def bench_bmp() -> None:
+    images = list(HeaderParser.read_file(HEADERS[0]))
+    size = sum(image.width * image.height * 3 for image in images)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [os.path.join(tmp_dir, f"{image.name}.bmp") for image in images]
+        headers = []
+        for image, path in zip(images, paths):
+            image.export_bmp(path, monochrome=False)
+            with open(path, mode="rb") as f:
+                headers += [f.read(Bitmap.HEADER_SIZE)]
+
+        def legacy_export() -> None:
+            for image, path, header in zip(images, paths, headers):
+                with open(path, mode="wb") as f:
+                    f.write(header)
+                    f.write(
+                        legacy_format_data(
+                            image.width, image.height, 3, legacy_color_bytes(image)
+                        )
+                    )
+
+        def export() -> None:
+            for image, path in zip(images, paths):
+                image.export_bmp(path, monochrome=False)
+
+        def export_monochrome() -> None:
+            for image, path in zip(images, paths):
+                image.export_bmp(path)
+
+        def legacy_import() -> None:
+            for path in paths:
+                width, height, color_depth, data = Bitmap.read_bmp(path)
+                legacy_pack(width, height, color_depth, data)
+
+        def import_() -> None:
+            for path in paths:
+                Image("bench", 0, 0).import_bmp(path)
+
+        legacy_export_time = timeit(legacy_export, repeat=1)
+        legacy_import_time = timeit(legacy_import, repeat=1)
+        for image, path in zip(images, paths):
+            with open(path, mode="rb") as f:
+                legacy_data = f.read()
+            image.export_bmp(path, monochrome=False)
+            with open(path, mode="rb") as f:
+                assert f.read() == legacy_data
+            width, height, color_depth, data = Bitmap.read_bmp(path)
+            assert Pixels.pack(data, width, height, color_depth) == legacy_pack(
+                width, height, color_depth, data
+            )
+        print(
+            f"bmp legacy: export {size / legacy_export_time / 1e6:.1f}MB/s, "
+            f"import {size / legacy_import_time / 1e6:.1f}MB/s"
+        )
+        modes = [False, True] if numpy is not None else [False]
+        for use_numpy in modes:
+            Pixels.use_numpy = use_numpy
+            export_time = timeit(export)
+            import_time = timeit(import_)
+            print(
+                f"bmp {'numpy' if use_numpy else 'tables'}: "
+                f"export {size / export_time / 1e6:.1f}MB/s "
+                f"(x{legacy_export_time / export_time:.1f}), "
+                f"import {size / import_time / 1e6:.1f}MB/s "
+                f"(x{legacy_import_time / import_time:.1f})"
+            )
+        Pixels.use_numpy = numpy is not None
+        for image, path in zip(images, paths):
+            image.export_bmp(path)
+            copy = Image(image.name, 0, 0)
+            copy.import_bmp(path)
+            assert copy.data == image.data
+        export_time = timeit(export_monochrome)
+        import_time = timeit(import_)
+        print(
+            f"bmp 1-bit: export {size / export_time / 1e6:.1f}MB/s "
+            f"(x{legacy_export_time / export_time:.1f}), "
+            f"import {size / import_time / 1e6:.1f}MB/s "
+            f"(x{legacy_import_time / import_time:.1f}), "
+            f"{os.path.getsize(paths[0])} bytes for {images[0].name}"
+        )
+
+
+def legacy_render(canvas, image: Image, draw_scale: float) -> None:
+    # one rectangle per black pixel, used before the PhotoImage rendering
+    canvas.delete("all")
+    for x in range(image.width):
+        for y in range(image.height):
+            if image.get_pixel(x, y):
+                canvas.create_rectangle(
+                    x * draw_scale + 1,
+                    y * draw_scale + 1,
+                    (x + 1) * draw_scale + 1,
+                    (y + 1) * draw_scale + 1,
+                    fill="black",
+                    outline="",
+                )
+
+
+def bench_render() -> None:
+    import tkinter as tk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print("render: no display available, skipped")
+        return
+
+    from image_view import ImageView
+
+    view = ImageView(root)
+    view.pack()
+    image = next(HeaderParser.read_file(HEADERS[0]))
+    view.update(image)
+    for draw_scale in [0.75, 1.5, 3, 6, 12]:
+
+        def legacy() -> None:
+            legacy_render(view.canvas, image, draw_scale)
+            root.update()
+
+        def render() -> None:
+            view.draw_scale = draw_scale
+            view.update(image)
+            root.update()
+
+        legacy_time = timeit(legacy, repeat=2)
+        render_time = timeit(render)
+        print(
+            f"render {image.name} x{draw_scale}: "
+            f"legacy {legacy_time * 1000:.1f}ms, "
+            f"photo {render_time * 1000:.1f}ms "
+            f"(x{legacy_time / render_time:.1f})"
+        )
+    root.destroy()
+
+
+def legacy_export_cpp(image: Image) -> str:
+    # quadratic formatting used before Image.write_cpp, empties image.data
+    output = [
+        f"// '{image.name}', {image.width}x{image.height}px",
+        f"const unsigned char {image.name} [] PROGMEM = {{",
+    ]
+    while len(image.data) > 16:
+        output += ["\t" + ", ".join(f"0x{v:02x}" for v in image.data[0:16]) + ","]
+        image.data = image.data[16:]
+    output += ["\t" + ", ".join(f"0x{v:02x}" for v in image.data), "};", ""]
+    return "\n".join(output)
+
+
+def bench_export() -> None:
+    for path in HEADERS:
+        # images without a source are always formatted, never copied
+        file = File(None)
+        file.images = list(HeaderParser.read_file(path))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, os.path.basename(path))
+
+            def legacy_export() -> None:
+                copy = File(None)
+                copy.images = [Image(i.name, i.width, i.height) for i in file.images]
+                for image, source in zip(copy.images, file.images):
+                    image.data = bytearray(source.data)
+                with open(output_path, mode="w") as f:
+                    for image in copy.images:
+                        f.write(legacy_export_cpp(image))
+
+            legacy_time = timeit(legacy_export)
+            with open(output_path) as f:
+                legacy_content = f.read()
+            export_time = timeit(lambda: file.export(output_path))
+            with open(output_path) as f:
+                assert f.read() == legacy_content
+        print(
+            f"export {os.path.basename(path)}: "
+            f"legacy {legacy_time * 1000:.1f}ms, "
+            f"streaming {export_time * 1000:.1f}ms "
+            f"(x{legacy_time / export_time:.1f})"
+        )
+
+
+def bench_lazy() -> None:
+    for path in HEADERS:
+        files = []
+
+        def open_lazy() -> File:
+            file = File(path, lazy=True)
+            files.append(file)
+            return file
+
+        eager_time = timeit(lambda: File(path))
+        lazy_time = timeit(open_lazy)
+        eager_size = measure_memory(lambda: File(path))
+        lazy_size = measure_memory(open_lazy)
+        file = open_lazy()
+        decode_time = timeit(lambda: file.images[-1].source.load(file.images[-1]))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, os.path.basename(path))
+            eager_export_time = timeit(lambda: File(path).export(output_path))
+            with open(output_path) as f:
+                eager_content = f.read()
+            lazy_export_time = timeit(lambda: file.export(output_path))
+            with open(output_path) as f:
+                assert f.read() == eager_content
+        for file in files:
+            file.close()
+        print(
+            f"lazy {os.path.basename(path)}: "
+            f"open eager {eager_time * 1000:.1f}ms {eager_size / 1024:.0f}KiB, "
+            f"lazy {lazy_time * 1000:.1f}ms {lazy_size / 1024:.0f}KiB "
+            f"(x{eager_time / lazy_time:.1f}), "
+            f"decode {decode_time * 1000000:.0f}us, "
+            f"open+save eager {eager_export_time * 1000:.1f}ms, "
+            f"lazy save {lazy_export_time * 1000:.1f}ms"
+        )
+
+
+def bench_cache() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ParseCache.directory = tmp_dir
+        ParseCache.enabled = True
+        for path in HEADERS:
+            # the editor opens headers larger than File.LAZY_SIZE lazily
+            for lazy in (False, True):
+
+                def cold() -> File:
+                    ParseCache.clear()
+                    return File(path, lazy=lazy)
+
+                cold_file = cold()
+                warm_file = File(path, lazy=lazy)
+                assert [
+                    (i.name, i.width, i.height, i.data) for i in cold_file.images
+                ] == [(i.name, i.width, i.height, i.data) for i in warm_file.images]
+                ParseCache.enabled = False
+                parse_time = timeit(lambda: File(path, lazy=lazy))
+                ParseCache.enabled = True
+                cold_time = timeit(cold)
+                File(path, lazy=lazy)
+                warm_time = timeit(lambda: File(path, lazy=lazy))
+                print(
+                    f"cache {os.path.basename(path)}{' lazy' if lazy else ''}: "
+                    f"no cache {parse_time * 1000:.1f}ms, "
+                    f"cold {cold_time * 1000:.1f}ms, "
+                    f"warm {warm_time * 1000:.1f}ms "
+                    f"(x{parse_time / warm_time:.1f}), "
+                    f"entry {os.path.getsize(ParseCache.get_path(path))} bytes"
+                )
+        ParseCache.enabled = False
+        ParseCache.directory = None
+
+
+def bench_packbits() -> None:
+    for path in HEADERS:
+        file = File(path)
+        report = PackBits.report(file.images)
+        raw_size = sum(size for _, size, _ in report)
+        packed_size = sum(size for _, _, size in report)
+        assert PackBits.verify(file.images) == []
+        encode_time = timeit(lambda: [PackBits.encode_image(i) for i in file.images])
+        packed = [PackBits.encode_image(i) for i in file.images]
+        decode_time = timeit(
+            lambda: [
+                PackBits.decode(data, i.row_size, i.height)
+                for data, i in zip(packed, file.images)
+            ]
+        )
+        print(
+            f"packbits {os.path.basename(path)}: "
+            f"{raw_size} -> {packed_size} bytes "
+            f"({packed_size * 100 / raw_size:.0f}%), "
+            f"encode {encode_time * 1000:.1f}ms, "
+            f"decode {decode_time * 1000:.1f}ms"
+        )
+
+
+def bench_save() -> None:
+    for path in HEADERS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, os.path.basename(path))
+            shutil.copyfile(path, output_path)
+            for lazy in [False, True]:
+                file = File(output_path, lazy=lazy)
+
+                def reload() -> None:
+                    # previous behaviour: write everything then read it again
+                    file.images[-1].set_pixel(0, 0, not file.images[-1].get_pixel(0, 0))
+                    file.export(output_path)
+                    File(output_path, lazy=lazy).close()
+
+                def save() -> None:
+                    file.images[-1].set_pixel(0, 0, not file.images[-1].get_pixel(0, 0))
+                    file.save(output_path)
+
+                reload_time = timeit(reload)
+                save_time = timeit(save)
+                file.close()
+                print(
+                    f"save {os.path.basename(path)}{' lazy' if lazy else ''}: "
+                    f"export+reload {reload_time * 1000:.1f}ms, "
+                    f"incremental {save_time * 1000:.1f}ms "
+                    f"(x{reload_time / save_time:.1f})"
+                )
+
+
+def bench_history() -> None:
+    # short strokes on a full screen image, as drawn in the editor
+    image = Image("screen", 200, 200, empty=True)
+    strokes = [[(x, (x * 7 + k) % 200) for k in range(10)] for x in range(200)]
+
+    def draw(history: History) -> None:
+        history.clear()
+        for stroke in strokes:
+            history.begin(image)
+            for x, y in stroke:
+                image.set_pixel(x, y, not image.get_pixel(x, y))
+            # rows of the stroke, like ImageView
+            rows = [y for _, y in stroke]
+            history.end(
+                image, (min(rows) * image.row_size, (max(rows) + 1) * image.row_size)
+            )
+
+    history = History(max_size=1 << 30)
+    draw_time = timeit(lambda: draw(history), repeat=3)
+    snapshot_size = 2 * len(image.data) * len(strokes)
+    undo_time = timeit(lambda: [history.undo() for _ in strokes] and None, repeat=1)
+    redo_time = timeit(lambda: [history.redo() for _ in strokes] and None, repeat=1)
+    print(
+        f"history {len(strokes)} strokes: "
+        f"{history.size} bytes vs {snapshot_size} for snapshots "
+        f"(x{snapshot_size / history.size:.0f}), "
+        f"record {draw_time * 1000 / len(strokes):.3f}ms, "
+        f"undo {undo_time * 1000 / len(strokes):.3f}ms, "
+        f"redo {redo_time * 1000 / len(strokes):.3f}ms per stroke"
+    )
+
+
+def legacy_resize(image: Image, width: int, height: int, x: int, y: int) -> Image:
+    # per-pixel copy, what a resize without Transform would do
+    output = Image(image.name, width, height, empty=True)
+    for j in range(height):
+        for i in range(width):
+            if 0 <= x + i < image.width and 0 <= y + j < image.height:
+                output.set_pixel(i, j, image.get_pixel(x + i, y + j))
+    return output
+
+
+def bench_resize() -> None:
+    for path in HEADERS:
+        images = File(path).images
+        legacy_time = timeit(
+            lambda: [legacy_resize(i, i.width + 12, i.height, -6, 0) for i in images],
+            repeat=1,
+        )
+        pad_time = timeit(
+            lambda: [
+                Transform.window(
+                    i.data, i.width, i.height, -6, 0, i.width + 12, i.height
+                )
+                for i in images
+            ]
+        )
+        scale_time = timeit(
+            lambda: [
+                Transform.scale_data(
+                    i.data, i.width, i.height, i.width * 3 // 2, i.height * 3 // 2
+                )
+                for i in images
+            ]
+        )
+        print(
+            f"resize {os.path.basename(path)}: "
+            f"per-pixel pad {legacy_time * 1000:.1f}ms, "
+            f"row pad {pad_time * 1000:.1f}ms (x{legacy_time / pad_time:.0f}), "
+            f"scale x1.5 {scale_time * 1000:.1f}ms"
+        )
+
+
+def bench_pipeline() -> None:
+    if PILImage is None:
+        print("pipeline: skipped, PIL is not installed")
+        return
+    steps = [("pad", 56, 56, "c"), ("resize", 68, 68), ("canvas", 80, 68, "nw")]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(151):
+            source = PILImage.new("L", (40 + i % 16, 40 + i % 12), "white")
+            source.putdata(
+                [(x * 7 + i) % 256 for x in range(source.width * source.height)]
+            )
+            paths += [os.path.join(tmp_dir, f"{i}.png")]
+            source.save(paths[-1])
+
+        def legacy() -> None:
+            # images.py then a bulk import: PIL, intermediate .bmp files
+            bmp_paths = []
+            for path in paths:
+                with PILImage.open(path) as source:
+                    image = PILImage.new(source.mode, (56, 56), "white")
+                    image.paste(
+                        source,
+                        ((56 - source.width) // 2, (56 - source.height) // 2),
+                    )
+                    image = image.resize((68, 68), PILImage.NEAREST)
+                    image = image.point(lambda p: 1 if p > 127 else 0, mode="1")
+                    canvas = PILImage.new(image.mode, (80, 68), color=1)
+                    canvas.paste(image, (0, 0))
+                    bmp_paths += [path[:-4] + ".bmp"]
+                    canvas.convert(mode="P").save(bmp_paths[-1])
+            Bulk.import_bmps(File(None), bmp_paths)
+
+        pipeline = Pipeline(steps)
+        jobs = [pipeline.job(f"front_{i}", path) for i, path in enumerate(paths)]
+        manifest_path = os.path.join(tmp_dir, "manifest.json")
+        legacy_time = timeit(legacy, repeat=3)
+        run_time = timeit(lambda: Pipeline.run(File(None), jobs), repeat=3)
+        file = File(None)
+        Pipeline.run(file, jobs, manifest_path)
+        skip_time = timeit(lambda: Pipeline.run(file, jobs, manifest_path), repeat=3)
+        print(
+            f"pipeline {len(paths)} sprites: "
+            f"PIL+bmp {legacy_time * 1000:.1f}ms, "
+            f"pipeline {run_time * 1000:.1f}ms (x{legacy_time / run_time:.1f}), "
+            f"unchanged {skip_time * 1000:.1f}ms"
+        )
+
+
+def bench_dither() -> None:
+    # a 24-bit photo-like screen: gradients and noise
+    width, height = 200, 200
+    data = bytes(
+        (x + y + (x * y * 7919) % 61) % 256
+        for y in range(height)
+        for x in range(width)
+        for _ in range(3)
+    )
+    legacy_time = timeit(lambda: legacy_pack(width, height, 3, data), repeat=3)
+    print(f"dither {width}x{height}: per-pixel threshold {legacy_time * 1000:.1f}ms")
+    for use_numpy in [False, True] if numpy is not None else [False]:
+        Pixels.use_numpy = use_numpy
+        for mode in Dither.MODES:
+            elapsed = timeit(lambda: Dither.pack(data, width, height, 3, mode))
+            print(
+                f"\t{mode}{' numpy' if use_numpy else ''}: "
+                f"{elapsed * 1000:.1f}ms (x{legacy_time / elapsed:.1f})"
+            )
+    Pixels.use_numpy = numpy is not None
+
+
+def legacy_composite(frame: Image, image: Image, x: int, y: int) -> None:
+    # per-pixel drawBitmap, as hand-composited previews did
+    for j in range(image.height):
+        for i in range(image.width):
+            if image.get_pixel(i, j):
+                frame.set_pixel(x + i, y + j, True)
+
+
+def bench_simulate() -> None:
+    directory = os.path.join(WATCHFACES_DIR, "pokemon-2.0")
+    files = [
+        File(os.path.join(directory, name))
+        for name in ["pokemon.h", "FreeMonoBold7pt7b.h", "FreeMonoBold10pt7b.h"]
+    ]
+    files[0].import_tables(os.path.join(directory, "Watchy_Pokemon.cpp"))
+    simulator = Simulator(files)
+    variables = next(Simulator.get_combinations(POKEMON))
+    images = [
+        (simulator.get_image(operation[3].format(**variables)), *operation[1:3])
+        for operation in POKEMON.operations
+        if operation[0] == "bitmap"
+    ]
+
+    def legacy_render() -> None:
+        frame = Image("preview", Simulator.WIDTH, Simulator.HEIGHT, empty=True)
+        for image, x, y in images:
+            legacy_composite(frame, image, x, y)
+
+    legacy_time = timeit(legacy_render, repeat=3)
+    render_time = timeit(lambda: simulator.render(POKEMON, variables))
+    start = time.perf_counter()
+    count = sum(1 for _ in simulator.batch(POKEMON))
+    batch_time = time.perf_counter() - start
+    frames = [frame for _, frame in simulator.batch(POKEMON, {"back": [0]})][:64]
+    sheet_time = timeit(lambda: Simulator.contact_sheet(frames, 8), repeat=3)
+    print(
+        f"simulate pokemon: per-pixel frame {legacy_time * 1000:.1f}ms, "
+        f"frame {render_time * 1000:.3f}ms (x{legacy_time / render_time:.0f}), "
+        f"{count} frames {batch_time:.2f}s, 64 frames sheet {sheet_time * 1000:.1f}ms"
+    )
+
+
+def legacy_compare(images: List[Image], max_distance: int) -> int:
+    # every pair of images of the same size, pixel by pixel
+    pairs = 0
+    for a in range(len(images)):
+        for b in range(a + 1, len(images)):
+            first, second = images[a], images[b]
+            if (first.width, first.height) != (second.width, second.height):
+                continue
+            distance = sum(
+                first.get_pixel(x, y) != second.get_pixel(x, y)
+                for y in range(first.height)
+                for x in range(first.width)
+            )
+            pairs += distance <= max_distance
+    return pairs
+
+
+def bench_compare() -> None:
+    directory = os.path.join(WATCHFACES_DIR, "pokemon-2.0")
+    files = [
+        File(os.path.join(directory, name)) for name in ["pokemon.h", "pokemon_fr.h"]
+    ]
+    images = [image for file in files for image in file.images][:40]
+    legacy_time = timeit(lambda: legacy_compare(images, Compare.MAX_DISTANCE), repeat=1)
+    print(f"compare {len(images)} images: per-pixel pairs {legacy_time * 1000:.1f}ms")
+    elapsed = timeit(lambda: Compare.compare(files))
+    count = sum(len(file.images) for file in files)
+    print(
+        f"compare {count} images: {elapsed * 1000:.1f}ms, "
+        f"x{legacy_time / elapsed * (count / len(images)) ** 2:.0f} "
+        "on the projected per-pixel time"
+    )
+
+
+def bench_atlas() -> None:
+    for path in HEADERS:
+        file = File(path)
+        name = os.path.basename(path)
+        for align in [1, 8]:
+            elapsed = timeit(lambda: Atlas.build(file.images, align=align), repeat=3)
+            sheet = Atlas.build(file.images, align=align)
+            separate, packed = Atlas.report(file.images, sheet)
+            extract_time = timeit(lambda: Atlas.extract(sheet))
+            print(
+                f"atlas {name} align {align}: {separate} -> {packed} bytes "
+                f"({packed * 100 / separate:.0f}%), packed in {elapsed * 1000:.1f}ms, "
+                f"extracted in {extract_time * 1000:.1f}ms"
+            )
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "memory": bench_memory,
+    "bmp": bench_bmp,
+    "render": bench_render,
+    "export": bench_export,
+    "lazy": bench_lazy,
+    "cache": bench_cache,
+    "packbits": bench_packbits,
+    "save": bench_save,
+    "history": bench_history,
+    "resize": bench_resize,
+    "pipeline": bench_pipeline,
+    "dither": bench_dither,
+    "simulate": bench_simulate,
+    "compare": bench_compare,
+    "atlas": bench_atlas,
+}
+
+if __name__ == "__main__":
+    # only the cache benchmark reads or writes the user cache
+    ParseCache.enabled = False
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
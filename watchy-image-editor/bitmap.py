@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import List, Tuple
 
 
 class BitmapError(Exception):
@@ -8,6 +8,13 @@ class BitmapError(Exception):
 class Bitmap:
     HEADER_SIZE = 54
     FILE_TYPES = [("Bitmap Image", "*.bmp"), ("All Files", "*.*")]
+    # color depth of 1 bit per pixel data, packed in byte-aligned rows, 1 = black
+    PACKED = 0
+    # white for 0 bits, black for 1 bits (B, G, R, reserved)
+    MONOCHROME_PALETTE = bytes([255, 255, 255, 0, 0, 0, 0, 0])
+
+    __nibbles_table = [bytes([v >> 4, v & 0x0F]) for v in range(256)]
+    __invert_table = bytes(range(255, -1, -1))
 
     @classmethod
     def write_bmp(cls, path: str, width: int, color_depth: int, data: bytes) -> None:
@@ -16,23 +23,41 @@ class Bitmap:
 
     @classmethod
     def __get_bmp_data(cls, width: int, color_depth: int, data: bytes) -> bytes:
-        height = len(data) // (width * 3)
-        return cls.__get_header(
-            width, height, color_depth, len(data)
-        ) + cls.__format_data(width, height, color_depth, data)
+        if color_depth == cls.PACKED:
+            row_length = (width + 7) // 8
+            bits_per_pixel = 1
+            palette = cls.MONOCHROME_PALETTE
+        else:
+            row_length = width * color_depth
+            bits_per_pixel = color_depth * 8
+            palette = bytes()
+        height = len(data) // row_length
+        formated_data = cls.__format_data(row_length, height, data)
+        return (
+            cls.__get_header(
+                width, height, bits_per_pixel, len(palette), len(formated_data)
+            )
+            + palette
+            + formated_data
+        )
 
     @classmethod
     def __get_header(
-        cls, width: int, height: int, color_depth: int, data_len: int
+        cls,
+        width: int,
+        height: int,
+        bits_per_pixel: int,
+        palette_len: int,
+        data_len: int,
     ) -> bytes:
         header = bytes()
         # BMP header
         header += "BM".encode()  # (0, 2) BM
-        header += (cls.HEADER_SIZE + data_len).to_bytes(
+        header += (cls.HEADER_SIZE + palette_len + data_len).to_bytes(
             4, byteorder="little"
         )  # (2, 4) file size
         header += bytes([0]) * 4  # (6, 4) application reserved
-        header += (cls.HEADER_SIZE).to_bytes(
+        header += (cls.HEADER_SIZE + palette_len).to_bytes(
             4, byteorder="little"
         )  # (10, 4) data offset
         # DIB header
@@ -40,7 +65,7 @@ class Bitmap:
         header += width.to_bytes(4, byteorder="little")  # (18, 4) width
         header += height.to_bytes(4, byteorder="little")  # (22, 4) height
         header += (1).to_bytes(2, byteorder="little")  # (26, 2) color panes
-        header += (color_depth * 8).to_bytes(
+        header += (bits_per_pixel).to_bytes(
             2, byteorder="little"
         )  # (28, 2) bits per pixel
         header += bytes([0]) * 4  # (30, 4) BI_RGB, no compression
@@ -53,67 +78,140 @@ class Bitmap:
         header += (2835).to_bytes(
             4, byteorder="little"
         )  # (42, 4) vertical print resolution
-        header += bytes([0]) * 4  # (46, 4) color in palette
+        header += (palette_len // 4).to_bytes(
+            4, byteorder="little"
+        )  # (46, 4) color in palette
         header += bytes([0]) * 4  # (50, 4) 0 important colors
         return header
 
     @classmethod
-    def __format_data(
-        cls, width: int, height: int, color_depth: int, data: bytes
-    ) -> bytes:
-        size = width * height * color_depth
+    def __format_data(cls, row_length: int, height: int, data: bytes) -> bytes:
+        size = row_length * height
         if len(data) < size:
             data += bytes([0]) * (size - len(data))
         elif len(data) > size:
             data = data[:size]
-        line_padding = (width * color_depth) % 4
-        output_data = bytes()
-        for y in range(height):
-            start = (height - y - 1) * color_depth * width
-            output_data += data[start : start + width * color_depth]
-            if line_padding > 0:
-                output_data += bytes([0]) * (4 - line_padding)
-        return output_data
+        if row_length == 0:
+            return bytes()
+        padding = bytes((4 - row_length % 4) % 4)
+        return b"".join(
+            data[start : start + row_length] + padding
+            for start in range((height - 1) * row_length, -1, -row_length)
+        )
 
     @classmethod
     def read_bmp(cls, path: str) -> Tuple[int, int, int, bytes]:
         with open(path, mode="rb") as f:
             bmp_data = f.read()
-        width, height, color_depth, data_start, data_size = cls.__read_header(bmp_data)
+        (
+            width,
+            height,
+            bits_per_pixel,
+            palette,
+            data_start,
+            data_size,
+        ) = cls.__read_header(bmp_data)
         content_data = bmp_data[data_start:]
         if data_size > 0:
             content_data = content_data[:data_size]
-        output_data = cls.__read_formated_data(width, height, color_depth, content_data)
-        return width, height, color_depth, output_data
+        if bits_per_pixel == 1:
+            row_length = (width + 7) // 8
+        else:
+            row_length = (width * bits_per_pixel + 7) // 8
+        output_data = cls.__read_formated_data(row_length, height, content_data)
+        height = abs(height)
+        if bits_per_pixel == 1:
+            return (
+                width,
+                height,
+                cls.PACKED,
+                cls.__read_monochrome(width, height, palette, output_data),
+            )
+        elif bits_per_pixel == 4:
+            indexes = b"".join(map(cls.__nibbles_table.__getitem__, output_data))
+            if width % 2 != 0:
+                indexes = b"".join(
+                    indexes[start : start + width]
+                    for start in range(0, len(indexes), width + 1)
+                )
+            return width, height, 1, indexes.translate(cls.__gray_table(palette))
+        elif bits_per_pixel == 8 and len(palette) > 0:
+            return width, height, 1, output_data.translate(cls.__gray_table(palette))
+        return width, height, bits_per_pixel // 8, output_data
 
     @classmethod
-    def __read_header(cls, bmp_data: bytes) -> Tuple[int, int, int, int, int]:
-        if bmp_data[0:2].decode() != "BM":
+    def __read_header(
+        cls, bmp_data: bytes
+    ) -> Tuple[int, int, int, List[bytes], int, int]:
+        if bmp_data[0:2] != b"BM":
             raise BitmapError("Not a Bitmap Image")
         if int.from_bytes(bmp_data[30:34], byteorder="little") != 0:
             raise BitmapError("Cannot read Bitmap: need no compression")
         if int.from_bytes(bmp_data[26:28], byteorder="little") != 1:
             raise BitmapError("Cannot read Bitmap: need 1 color panes")
+        dib_size = int.from_bytes(bmp_data[14:18], byteorder="little")
         width = int.from_bytes(bmp_data[18:22], byteorder="little")
-        height = int.from_bytes(bmp_data[22:26], byteorder="little")
-        color_depth = int.from_bytes(bmp_data[28:30], byteorder="little") // 8
-        if color_depth < 1:
-            raise BitmapError("Cannot read Bitmap: bits per pixels is < 8")
+        # negative height for top-down bitmaps
+        height = int.from_bytes(bmp_data[22:26], byteorder="little", signed=True)
+        bits_per_pixel = int.from_bytes(bmp_data[28:30], byteorder="little")
+        if bits_per_pixel not in [1, 4] and bits_per_pixel < 8:
+            raise BitmapError(
+                f"Cannot read Bitmap: {bits_per_pixel} bits per pixels is not supported"
+            )
         data_start = int.from_bytes(bmp_data[10:14], byteorder="little")
         data_size = int.from_bytes(bmp_data[34:38], byteorder="little")
-        return width, height, color_depth, data_start, data_size
+        palette = []
+        if bits_per_pixel <= 8:
+            palette_size = int.from_bytes(bmp_data[46:50], byteorder="little")
+            palette_start = 14 + dib_size
+            if palette_size == 0:
+                palette_size = max(data_start - palette_start, 0) // 4
+            palette_size = min(palette_size, 2**bits_per_pixel)
+            palette = [
+                bmp_data[start : start + 4]
+                for start in range(palette_start, palette_start + palette_size * 4, 4)
+            ]
+            if bits_per_pixel < 8 and len(palette) < 2:
+                raise BitmapError("Cannot read Bitmap: missing color palette")
+        return width, height, bits_per_pixel, palette, data_start, data_size
+
+    @classmethod
+    def __gray_table(cls, palette: List[bytes]) -> bytes:
+        # mean of B, G, R for each index, unknown indexes are white
+        return bytes(sum(color[:3]) // 3 for color in palette) + bytes(
+            [255] * (256 - len(palette))
+        )
+
+    @classmethod
+    def __read_monochrome(
+        cls, width: int, height: int, palette: List[bytes], data: bytes
+    ) -> bytes:
+        if sum(palette[0][:3]) < sum(palette[1][:3]):
+            # 0 bits are the dark ones
+            data = data.translate(cls.__invert_table)
+        if width % 8 != 0:
+            # clear padding bits at the end of each row
+            row_size = (width + 7) // 8
+            mask = (0xFF << (8 - width % 8)) & 0xFF
+            data = bytearray(data)
+            data[row_size - 1 :: row_size] = bytes(
+                v & mask for v in data[row_size - 1 :: row_size]
+            )
+        return bytes(data)
 
     @classmethod
     def __read_formated_data(
-        cls, width: int, height: int, color_depth: int, bmp_data: bytes
+        cls, row_length: int, height: int, bmp_data: bytes
     ) -> bytes:
-        line_padding = (width * color_depth) % 4
-        if line_padding > 0:
-            real_width = width * color_depth + (4 - line_padding)
-        else:
-            real_width = width * color_depth
-        output_data = bytes()
-        for y in range(height):
-            start = (height - y - 1) * real_width
-            output_data += bmp_data[start : start + width * color_depth]
-        return output_data
+        if row_length == 0 or height == 0:
+            return bytes()
+        real_width = row_length + (4 - row_length % 4) % 4
+        if height < 0:
+            return b"".join(
+                bmp_data[start : start + row_length]
+                for start in range(0, -height * real_width, real_width)
+            )
+        return b"".join(
+            bmp_data[start : start + row_length]
+            for start in range((height - 1) * real_width, -1, -real_width)
+        )
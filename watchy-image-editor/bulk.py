@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+import functools
+import os
+import os.path
+import time
+
+from bitmap import BitmapError
+from file import File
+from image import Image
+
+
+class BulkResult(NamedTuple):
+    path: str
+    name: str
+    elapsed: float
+    error: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    data: bytes = bytes()
+
+
+def read_bmp(path: str, dither: Optional[str] = None) -> BulkResult:
+    start = time.perf_counter()
+    name = os.path.splitext(os.path.basename(path))[0]
+    image = Image(name, 0, 0)
+    try:
+        image.import_bmp(path, dither)
+    except (BitmapError, OSError, ValueError) as e:
+        return BulkResult(path, name, time.perf_counter() - start, str(e))
+    return BulkResult(
+        path,
+        name,
+        time.perf_counter() - start,
+        width=image.width,
+        height=image.height,
+        data=bytes(image.data),
+    )
+
+
+def write_bmp(job: Tuple[str, str, int, int, bytes, bool]) -> BulkResult:
+    start = time.perf_counter()
+    path, name, width, height, data, monochrome = job
+    image = Image(name, 0, 0)
+    image.set_data(width, height, data)
+    try:
+        image.export_bmp(path, monochrome)
+    except OSError as e:
+        return BulkResult(path, name, time.perf_counter() - start, str(e))
+    return BulkResult(path, name, time.perf_counter() - start)
+
+
+class Bulk:
+    # below this many files, a process pool costs more than it saves
+    MIN_PARALLEL_JOBS = 16
+    CHUNK_SIZE = 8
+
+    @classmethod
+    def run_jobs(cls, function, jobs: List, workers: Optional[int]) -> Iterator:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(jobs) < cls.MIN_PARALLEL_JOBS:
+            yield from map(function, jobs)
+            return
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            yield from executor.map(function, jobs, chunksize=cls.CHUNK_SIZE)
+        finally:
+            # stop remaining jobs when the caller gives up early
+            executor.shutdown(cancel_futures=True)
+
+    @classmethod
+    def import_bmps(
+        cls,
+        file: File,
+        paths: List[str],
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        dither: Optional[str] = None,
+    ) -> List[BulkResult]:
+        results = []
+        images = {image.name: image for image in file.images}
+        for result in cls.run_jobs(
+            functools.partial(read_bmp, dither=dither), list(paths), workers
+        ):
+            results += [result]
+            if result.error is None:
+                image = images.get(result.name)
+                if image is None:
+                    image = Image(result.name, result.width, result.height)
+                    file.images += [image]
+                    images[image.name] = image
+                image.set_data(result.width, result.height, result.data)
+            if progress is not None:
+                progress(len(results), len(paths))
+        return results
+
+    @classmethod
+    def export_bmps(
+        cls,
+        file: File,
+        dir_path: str,
+        monochrome: bool = True,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> List[BulkResult]:
+        jobs = [
+            (
+                os.path.join(dir_path, f"{image.name}.bmp"),
+                image.name,
+                image.width,
+                image.height,
+                bytes(image.data),
+                monochrome,
+            )
+            for image in file.images
+        ]
+        results = []
+        for result in cls.run_jobs(write_bmp, jobs, workers):
+            results += [result]
+            if progress is not None:
+                progress(len(results), len(jobs))
+        return results
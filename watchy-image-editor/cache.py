@@ -0,0 +1,241 @@
+from typing import List, Optional, Tuple
+import hashlib
+import os
+import os.path
+import struct
+import sys
+import tempfile
+
+from header import HeaderIndex, ImageSource
+from image import Image
+from packbits import PackBits
+from table import Table
+
+
+class ParseCache:
+    # magic, source mtime (ns), source size, image count, tables size, encoding
+    HEADER = struct.Struct("<8sqqII16s")
+    # name length, width, height, data length, text span, data span, flags
+    ENTRY = struct.Struct("<IIIIQQQQB")
+    ALIAS = 1
+    PACKED = 2
+    # lazily loaded images are stored without pixels, decoded from the file
+    UNLOADED = 4
+    MAGIC = b"WIECACH5"
+    SUFFIX = ".cache"
+    # oldest entries are evicted above this size
+    MAX_SIZE = 64 << 20
+
+    enabled = True
+    directory: Optional[str] = None
+
+    @classmethod
+    def get_directory(cls) -> str:
+        if cls.directory is None:
+            if os.name == "nt":
+                base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+            elif sys.platform == "darwin":
+                base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+            else:
+                base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+                    os.path.join("~", ".cache")
+                )
+            cls.directory = os.path.join(base, "watchy-image-editor")
+        return cls.directory
+
+    @classmethod
+    def get_path(cls, path: str) -> str:
+        # one entry per header, stale entries are overwritten
+        key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+        return os.path.join(cls.get_directory(), key + cls.SUFFIX)
+
+    @classmethod
+    def load(
+        cls, path: str, index: HeaderIndex, lazy: bool = False
+    ) -> Optional[Tuple[List[Image], List[Table], Optional[str]]]:
+        # lazy images are left unloaded, whether their pixels were stored or not
+        if not cls.enabled:
+            return None
+        try:
+            stat = os.stat(path)
+            cache_path = cls.get_path(path)
+            with open(cache_path, mode="rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        if len(content) < cls.HEADER.size:
+            return None
+        magic, mtime, size, count, tables_size, encoding = cls.HEADER.unpack_from(
+            content
+        )
+        if magic != cls.MAGIC or mtime != stat.st_mtime_ns or size != stat.st_size:
+            return None
+
+        view = memoryview(content)
+        position = cls.HEADER.size + count * cls.ENTRY.size
+        if len(content) < position:
+            return None
+        entries = list(cls.ENTRY.iter_unpack(view[cls.HEADER.size : position]))
+        # names then pixel data, both in image order, then tables
+        data_position = position + sum(entry[0] for entry in entries)
+        images = []
+        for (
+            name_size,
+            width,
+            height,
+            data_size,
+            start,
+            end,
+            data_start,
+            data_end,
+            flags,
+        ) in entries:
+            name = str(view[position : position + name_size], "utf-8")
+            image = Image(name, width, height)
+            if flags & cls.UNLOADED or (lazy and not flags & cls.ALIAS):
+                # aliases have no data span to be decoded from
+                image.data = None
+            else:
+                image.data = bytearray(view[data_position : data_position + data_size])
+            image.source = ImageSource(
+                index,
+                name,
+                (start, end),
+                None if flags & cls.ALIAS else (data_start, data_end),
+                PackBits.NAME if flags & cls.PACKED else None,
+                (image.row_size, image.height),
+            )
+            images += [image]
+            position += name_size
+            data_position += data_size
+        if data_position + tables_size != len(content):
+            return None
+        tables = [
+            Table(line[2], line[3:], (int(line[0]), int(line[1])))
+            for line in (
+                line.split(" ")
+                for line in str(view[data_position:], "utf-8").splitlines()
+            )
+        ]
+
+        # recently used entries are evicted last
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        for image in images:
+            if not lazy and not image.loaded:
+                image.data = image.source.decode()
+        return images, tables, encoding.rstrip(b"\0").decode() or None
+
+    @classmethod
+    def store(
+        cls,
+        path: str,
+        images: List[Image],
+        tables: List[Table],
+        encoding: Optional[str] = None,
+        lazy: bool = False,
+    ) -> None:
+        # only files read from path can be cached, positions refer to it, the
+        # pixels of lazy files are not stored but aliases, see load
+        if not cls.enabled or any(image.source is None for image in images):
+            return
+        try:
+            stat = os.stat(path)
+            names = [image.name.encode() for image in images]
+            stored = [
+                image.loaded and not (lazy and image.source.data_span is not None)
+                for image in images
+            ]
+            tables_data = "".join(
+                " ".join([str(table.span[0]), str(table.span[1]), table.name])
+                + "".join(" " + entry for entry in table.entries)
+                + "\n"
+                for table in tables
+                if table.span is not None
+            ).encode()
+            content = [
+                cls.HEADER.pack(
+                    cls.MAGIC,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    len(images),
+                    len(tables_data),
+                    (encoding or "").encode(),
+                )
+            ]
+            for name, image, pixels in zip(names, images, stored):
+                source = image.source
+                content += [
+                    cls.ENTRY.pack(
+                        len(name),
+                        image.width,
+                        image.height,
+                        len(image.data) if pixels else 0,
+                        *source.span,
+                        *(source.data_span or (0, 0)),
+                        (cls.ALIAS if source.data_span is None else 0)
+                        | (cls.PACKED if source.encoding == PackBits.NAME else 0)
+                        | (0 if pixels else cls.UNLOADED),
+                    )
+                ]
+            content += names
+            content += [image.data for image, pixels in zip(images, stored) if pixels]
+            content += [tables_data]
+
+            os.makedirs(cls.get_directory(), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=cls.get_directory())
+            try:
+                with os.fdopen(fd, mode="wb") as f:
+                    f.write(b"".join(content))
+                os.replace(temp_path, cls.get_path(path))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            cls.evict()
+        except OSError:
+            # the cache is only an optimization
+            pass
+
+    @classmethod
+    def evict(cls, max_size: Optional[int] = None) -> int:
+        if max_size is None:
+            max_size = cls.MAX_SIZE
+        entries = []
+        with os.scandir(cls.get_directory()) as it:
+            for entry in it:
+                if entry.name.endswith(cls.SUFFIX):
+                    stat = entry.stat()
+                    entries += [(stat.st_mtime, stat.st_size, entry.path)]
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry_path in sorted(entries):
+            if total <= max_size:
+                break
+            try:
+                os.unlink(entry_path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    @classmethod
+    def size(cls) -> int:
+        try:
+            with os.scandir(cls.get_directory()) as it:
+                return sum(
+                    entry.stat().st_size
+                    for entry in it
+                    if entry.name.endswith(cls.SUFFIX)
+                )
+        except OSError:
+            return 0
+
+    @classmethod
+    def clear(cls) -> int:
+        try:
+            return cls.evict(0)
+        except OSError:
+            return 0
@@ -0,0 +1,579 @@
+from typing import List, Optional, Tuple
+import argparse
+import collections
+import os.path
+import re
+import sys
+import time
+
+from atlas import Atlas
+from bulk import Bulk, BulkResult
+from cache import ParseCache
+from compare import Compare
+from dither import Dither
+from file import File
+from packbits import PackBits
+from pipeline import Pipeline
+from simulator import LAYOUTS, Simulator
+from transform import Transform
+
+
+def natural_key(name: str) -> List:
+    return [int(v) if v.isdigit() else v for v in re.split(r"(\d+)", name)]
+
+
+def timed(start: float) -> str:
+    return f"{(time.perf_counter() - start) * 1000:.1f}ms"
+
+
+def read_header(path: str, lazy: bool = False) -> File:
+    start = time.perf_counter()
+    file = File(path, lazy=lazy)
+    print(f"{path}: {len(file.images)} images read in {timed(start)}")
+    return file
+
+
+def print_results(results: List[BulkResult]) -> int:
+    errors = 0
+    for result in results:
+        if result.error is None:
+            print(f"{result.path}: done in {result.elapsed * 1000:.1f}ms")
+        else:
+            print(f"{result.path}: {result.error}", file=sys.stderr)
+            errors += 1
+    return errors
+
+
+def extract(args: argparse.Namespace) -> int:
+    file = read_header(args.header)
+    os.makedirs(args.output, exist_ok=True)
+    start = time.perf_counter()
+    results = Bulk.export_bmps(
+        file, args.output, monochrome=not args.color, workers=args.jobs
+    )
+    errors = print_results(results)
+    print(f"{args.output}: {len(results)} files written in {timed(start)}")
+    return 1 if errors > 0 else 0
+
+
+def pack(args: argparse.Namespace) -> int:
+    file = File(None)
+    names = sorted(
+        (name for name in os.listdir(args.input) if name.lower().endswith(".bmp")),
+        key=natural_key,
+    )
+    start = time.perf_counter()
+    results = Bulk.import_bmps(
+        file,
+        [os.path.join(args.input, name) for name in names],
+        workers=args.jobs,
+        dither=args.dither,
+    )
+    errors = print_results(results)
+    print(f"{args.input}: {len(file.images)} files read in {timed(start)}")
+    start = time.perf_counter()
+    file.export(args.header, deduplicate=args.deduplicate)
+    print(f"{args.header}: {len(file.images)} images written in {timed(start)}")
+    return 1 if errors > 0 else 0
+
+
+def list_images(args: argparse.Namespace) -> int:
+    for path in args.headers:
+        # names and sizes only, pixel data is never decoded
+        file = read_header(path, lazy=True)
+        for image in file.images:
+            print(f"\t{image.name}\t{image.width}x{image.height}px")
+        for table in file.tables:
+            print(f"\t{table.name}[{len(table.entries)}]")
+        for font in file.fonts:
+            print(f"\t{font.name}\t{len(font.glyphs)} glyphs")
+    return 0
+
+
+def info(args: argparse.Namespace) -> int:
+    for path in args.headers:
+        file = read_header(path)
+        sizes = {}
+        for image in file.images:
+            size = f"{image.width}x{image.height}px"
+            sizes[size] = sizes.get(size, 0) + 1
+        data_size = sum(len(image.data) for image in file.images)
+        print(f"\tfile size: {os.path.getsize(path)} bytes")
+        print(f"\timage data: {data_size} bytes")
+        for size, count in sorted(sizes.items(), key=lambda item: -item[1]):
+            print(f"\t{count} x {size}")
+    return 0
+
+
+def compress(args: argparse.Namespace) -> int:
+    file = read_header(args.header)
+    report = PackBits.report(file.images)
+    if args.verbose:
+        for name, raw_size, packed_size in report:
+            print(f"\t{name}\t{raw_size} -> {packed_size} bytes")
+    raw_size = sum(size for _, size, _ in report)
+    packed_size = sum(size for _, _, size in report)
+    print(
+        f"\timage data: {raw_size} -> {packed_size} bytes "
+        f"({packed_size * 100 / max(raw_size, 1):.0f}%)"
+    )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    start = time.perf_counter()
+    file.encoding = PackBits.NAME
+    file.export(args.output, deduplicate=args.deduplicate)
+    decoder = args.decoder or os.path.join(
+        os.path.dirname(os.path.abspath(args.output)), "packbits.h"
+    )
+    PackBits.write_decoder(decoder)
+    print(f"{args.output}: {len(file.images)} images written in {timed(start)}")
+    print(f"{decoder}: decoder written")
+
+    # the written header must decode to the same images
+    written = File(args.output)
+    errors = [
+        image.name
+        for image, written_image in zip(file.images, written.images)
+        if (image.width, image.height, image.data)
+        != (written_image.width, written_image.height, written_image.data)
+    ]
+    if len(written.images) != len(file.images) or len(errors) > 0:
+        print(f"{args.output}: verification failed {errors[:20]}", file=sys.stderr)
+        return 1
+    print(f"{args.output}: verified")
+    return 0
+
+
+def atlas(args: argparse.Namespace) -> int:
+    file = read_header(args.header)
+    name = args.name or re.sub(
+        r"\W", "_", os.path.splitext(os.path.basename(args.output))[0]
+    )
+    start = time.perf_counter()
+    sheet = Atlas.build(file.images, args.width, args.align)
+    print(f"\t{sheet.width}x{sheet.height}px sheet packed in {timed(start)}")
+    separate, packed = Atlas.report(file.images, sheet)
+    print(
+        f"\timage data: {separate} -> {packed} bytes "
+        f"({packed * 100 / max(separate, 1):.0f}%, sprite table included)"
+    )
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    Atlas.export(sheet, name, args.output)
+    helper = args.helper or os.path.join(
+        os.path.dirname(os.path.abspath(args.output)), "atlas.h"
+    )
+    Atlas.write_helper(helper)
+    print(f"{args.output}: {len(sheet.sprites)} sprites written")
+    print(f"{helper}: helper written")
+
+    # the written atlas must give back the same images
+    images = Atlas.extract(Atlas.read(args.output, name))
+    errors = [
+        image.name
+        for image, extracted in zip(file.images, images)
+        if (image.name, image.width, image.height, image.data[: len(extracted.data)])
+        != (extracted.name, extracted.width, extracted.height, extracted.data)
+    ]
+    if len(images) != len(file.images) or len(errors) > 0:
+        print(f"{args.output}: verification failed {errors[:20]}", file=sys.stderr)
+        return 1
+    print(f"{args.output}: verified")
+    return 0
+
+
+def process(args: argparse.Namespace) -> int:
+    file = read_header(args.header) if os.path.exists(args.header) else File(None)
+    pipeline = Pipeline(args.steps or [])
+    jobs = [
+        pipeline.job(
+            args.name.format(stem=os.path.splitext(os.path.basename(path))[0]), path
+        )
+        for path in sorted(args.sources, key=natural_key)
+    ]
+    start = time.perf_counter()
+    results = Pipeline.run(file, jobs, args.manifest, workers=args.jobs)
+    errors = print_results(results)
+    print(
+        f"{len(results) - errors} sources processed, {errors} failed, "
+        f"{len(jobs) - len(results)} unchanged in {timed(start)}"
+    )
+    if file.modified or not os.path.exists(args.header):
+        start = time.perf_counter()
+        file.export(args.header, deduplicate=args.deduplicate)
+        print(f"{args.header}: {len(file.images)} images written in {timed(start)}")
+    return 1 if errors > 0 else 0
+
+
+def resize(args: argparse.Namespace) -> int:
+    file = read_header(args.header)
+    width, height = args.size
+    images = [
+        image
+        for image in file.images
+        if args.filter is None or re.search(args.filter, image.name)
+    ]
+    start = time.perf_counter()
+    resized = Transform.resize_all(
+        file,
+        width,
+        height,
+        Transform.SCALE if args.scale else Transform.CANVAS,
+        args.anchor,
+        images,
+    )
+    print(f"\t{resized} of {len(images)} images resized in {timed(start)}")
+    output = args.output or args.header
+    start = time.perf_counter()
+    file.export(output, deduplicate=args.deduplicate)
+    print(f"{output}: {len(file.images)} images written in {timed(start)}")
+    return 0
+
+
+def edit_fonts(args: argparse.Namespace) -> int:
+    file = read_header(args.header)
+    if len(file.fonts) == 0:
+        print(f"{args.header}: no GFX font found", file=sys.stderr)
+        return 1
+    if args.extract is not None:
+        os.makedirs(args.extract, exist_ok=True)
+    imported = 0
+    for font in file.fonts:
+        print(f"\t{font.name}\t{len(font.glyphs)} glyphs, y advance {font.y_advance}")
+        for glyph in font.glyphs:
+            image = glyph.image
+            if args.verbose:
+                print(
+                    f"\t\t0x{glyph.code:02X} {glyph.char!r}\t"
+                    f"{image.width}x{image.height}px "
+                    f"at ({glyph.x_offset}, {glyph.y_offset}), "
+                    f"x advance {glyph.x_advance}"
+                )
+            # glyph files are named after the glyph images, FontName_0x41.bmp
+            filename = image.name + ".bmp"
+            if args.extract is not None and image.width * image.height > 0:
+                image.export_bmp(os.path.join(args.extract, filename))
+            if args.input is not None:
+                path = os.path.join(args.input, filename)
+                if os.path.exists(path):
+                    image.import_bmp(path)
+                    imported += 1
+    if args.extract is not None:
+        print(f"{args.extract}: glyphs written")
+    if args.input is not None:
+        print(f"{args.input}: {imported} glyphs read")
+    if file.modified:
+        output = args.output or args.header
+        start = time.perf_counter()
+        file.export(output, deduplicate=args.deduplicate)
+        print(f"{output}: {len(file.fonts)} fonts written in {timed(start)}")
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    files = [read_header(path) for path in args.headers]
+    start = time.perf_counter()
+    comparison = Compare.compare(files, args.distance)
+    print(f"\timages compared in {timed(start)}")
+    if args.verbose:
+        for group in comparison.identical:
+            print(
+                "\tidentical: "
+                + ", ".join(f"{ref.path}:{ref.image.name}" for ref in group)
+            )
+        for a, b, distance in comparison.near:
+            print(
+                f"\tnear ({distance} pixels): "
+                f"{a.path}:{a.image.name}, {b.path}:{b.image.name}"
+            )
+    # images also found in another header, they could be included from one file
+    shared = collections.Counter(
+        ref.path
+        for group in comparison.identical
+        if len({ref.path for ref in group}) > 1
+        for ref in group
+    )
+    unique = collections.Counter(ref.path for ref in comparison.unique)
+    for file in files:
+        print(
+            f"{file.path}: {len(file.images)} images, {shared[file.path]} shared "
+            f"with other headers, {unique[file.path]} unique"
+        )
+    print(
+        f"\t{len(comparison.identical)} identical groups "
+        f"({sum(len(group) for group in comparison.identical)} images), "
+        f"{len(comparison.near)} near-identical pairs, "
+        f"{len(comparison.unique)} unique images"
+    )
+    return 0
+
+
+def parse_variable(text: str) -> Tuple[str, List[int]]:
+    # name=1 or name=1,2,3
+    name, _, values = text.partition("=")
+    try:
+        return name.strip(), [int(value) for value in values.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid variable {text!r}, expected name=1,2"
+        )
+
+
+def simulate(args: argparse.Namespace) -> int:
+    files = []
+    for path in args.sources:
+        if path.lower().endswith(".h"):
+            files += [read_header(path)]
+        else:
+            # pointer tables of the watchface .cpp file
+            file = File(None)
+            print(f"{path}: {file.import_tables(path)} tables read")
+            files += [file]
+    simulator = Simulator(files)
+    layout = LAYOUTS[args.layout]
+    variables = dict(args.variables or [])
+    start = time.perf_counter()
+    if args.sheets is None:
+        combination = next(Simulator.get_combinations(layout, variables))
+        frame = simulator.render(layout, combination)
+        frame.to_image("preview").export_bmp(args.output, monochrome=not args.color)
+        print(f"{args.output}: {combination} rendered in {timed(start)}")
+        return 0
+    os.makedirs(args.sheets, exist_ok=True)
+    frames = []
+    count = sheets = 0
+    for _, frame in simulator.batch(layout, variables):
+        frames += [frame]
+        count += 1
+        if len(frames) == args.per_sheet:
+            sheets += 1
+            Simulator.contact_sheet(frames, args.columns).to_image("sheet").export_bmp(
+                os.path.join(args.sheets, f"sheet_{sheets}.bmp")
+            )
+            frames = []
+    if len(frames) > 0:
+        sheets += 1
+        Simulator.contact_sheet(frames, args.columns).to_image("sheet").export_bmp(
+            os.path.join(args.sheets, f"sheet_{sheets}.bmp")
+        )
+    print(f"{args.sheets}: {count} frames in {sheets} sheets written in {timed(start)}")
+    return 0
+
+
+def cache(args: argparse.Namespace) -> int:
+    if args.clear:
+        removed = ParseCache.clear()
+        print(f"{ParseCache.get_directory()}: {removed} entries removed")
+    else:
+        print(f"{ParseCache.get_directory()}: {ParseCache.size()} bytes")
+    return 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="watchy-image-editor",
+        description="Read/Write/Import/Export images from header files",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="always parse headers from scratch"
+    )
+    parser.add_argument(
+        "--deduplicate",
+        action="store_true",
+        help="write identical images once, the copies as #define aliases",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = subparsers.add_parser(
+        "extract", help="export every image of a header to .bmp files"
+    )
+    extract_parser.add_argument("header")
+    extract_parser.add_argument("output", help="output directory")
+    extract_parser.add_argument(
+        "--color", action="store_true", help="write 24-bit instead of 1-bit files"
+    )
+    extract_parser.add_argument(
+        "-j", "--jobs", type=int, help="worker processes (default: cpu count)"
+    )
+    extract_parser.set_defaults(function=extract)
+
+    pack_parser = subparsers.add_parser(
+        "pack", help="build a header from a directory of .bmp files"
+    )
+    pack_parser.add_argument("input", help="input directory")
+    pack_parser.add_argument("header")
+    pack_parser.add_argument(
+        "-j", "--jobs", type=int, help="worker processes (default: cpu count)"
+    )
+    pack_parser.add_argument(
+        "--dither",
+        choices=Dither.MODES,
+        help="convert colors with a dithering mode (default: threshold)",
+    )
+    pack_parser.set_defaults(function=pack)
+
+    list_parser = subparsers.add_parser("list", help="list images of headers")
+    list_parser.add_argument("headers", nargs="+")
+    list_parser.set_defaults(function=list_images)
+
+    info_parser = subparsers.add_parser("info", help="summarize headers")
+    info_parser.add_argument("headers", nargs="+")
+    info_parser.set_defaults(function=info)
+
+    compress_parser = subparsers.add_parser(
+        "compress", help="write a PackBits compressed header and its decoder"
+    )
+    compress_parser.add_argument("header")
+    compress_parser.add_argument("output")
+    compress_parser.add_argument(
+        "--decoder", help="decoder header path (default: packbits.h next to output)"
+    )
+    compress_parser.add_argument(
+        "-v", "--verbose", action="store_true", help="report every image"
+    )
+    compress_parser.set_defaults(function=compress)
+
+    atlas_parser = subparsers.add_parser(
+        "atlas", help="pack the images of a header into one sprite sheet"
+    )
+    atlas_parser.add_argument("header")
+    atlas_parser.add_argument("output")
+    atlas_parser.add_argument("--name", help="sheet name (default: output file name)")
+    atlas_parser.add_argument(
+        "--width", type=int, help="sheet width (default: smallest sheet)"
+    )
+    atlas_parser.add_argument(
+        "--align",
+        type=int,
+        default=Atlas.ALIGN,
+        help="x alignment of the sprites in pixels, 8 for bytes (default: 1)",
+    )
+    atlas_parser.add_argument(
+        "--helper", help="helper output (default: atlas.h next to output)"
+    )
+    atlas_parser.set_defaults(function=atlas)
+
+    process_parser = subparsers.add_parser(
+        "process",
+        help="convert source images into a header through a list of steps",
+    )
+    process_parser.add_argument("header", help="header to update or create")
+    process_parser.add_argument("sources", nargs="+", help="source images")
+    process_parser.add_argument(
+        "-s",
+        "--step",
+        dest="steps",
+        action="append",
+        type=Pipeline.parse_step,
+        help=(
+            "pad:WxH[:anchor], resize:WxH, threshold[:level], dither:mode "
+            "or canvas:WxH[:anchor]"
+        ),
+    )
+    process_parser.add_argument(
+        "--name", default="{stem}", help="image name template (default: {stem})"
+    )
+    process_parser.add_argument(
+        "--manifest", help="skip sources unchanged since the last run"
+    )
+    process_parser.add_argument(
+        "-j", "--jobs", type=int, help="worker processes (default: cpu count)"
+    )
+    process_parser.set_defaults(function=process)
+
+    resize_parser = subparsers.add_parser(
+        "resize", help="pad, crop or scale every image of a header"
+    )
+    resize_parser.add_argument("header")
+    resize_parser.add_argument("size", type=Transform.parse_size, help="WIDTHxHEIGHT")
+    resize_parser.add_argument("-o", "--output", help="output header (default: header)")
+    resize_parser.add_argument(
+        "--scale",
+        action="store_true",
+        help="scale the pixels (nearest neighbour) instead of padding or cropping",
+    )
+    resize_parser.add_argument(
+        "--anchor",
+        choices=list(Transform.ANCHORS),
+        default="c",
+        help="position of the images when padding or cropping (default: c)",
+    )
+    resize_parser.add_argument("--filter", help="only resize images matching a regex")
+    resize_parser.set_defaults(function=resize)
+
+    font_parser = subparsers.add_parser(
+        "font", help="list, extract or import the glyphs of GFX fonts"
+    )
+    font_parser.add_argument("header")
+    font_parser.add_argument("-x", "--extract", help="write glyph .bmp files here")
+    font_parser.add_argument(
+        "-i", "--input", help="replace glyphs by the .bmp files found here"
+    )
+    font_parser.add_argument("-o", "--output", help="output header (default: header)")
+    font_parser.add_argument("-v", "--verbose", action="store_true")
+    font_parser.set_defaults(function=edit_fonts)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="find identical and near-identical images across headers"
+    )
+    compare_parser.add_argument("headers", nargs="+")
+    compare_parser.add_argument(
+        "-d",
+        "--distance",
+        type=int,
+        default=Compare.MAX_DISTANCE,
+        help="differing pixels of near-identical images, 0 to disable "
+        f"(default: {Compare.MAX_DISTANCE})",
+    )
+    compare_parser.add_argument("-v", "--verbose", action="store_true")
+    compare_parser.set_defaults(function=compare)
+
+    simulate_parser = subparsers.add_parser(
+        "simulate", help="render watchface frames as drawWatchFace does"
+    )
+    simulate_parser.add_argument("layout", choices=list(LAYOUTS))
+    simulate_parser.add_argument(
+        "sources", nargs="+", help="headers, fonts and .cpp files with the tables"
+    )
+    simulate_parser.add_argument(
+        "-o", "--output", default="preview.bmp", help="(default: preview.bmp)"
+    )
+    simulate_parser.add_argument(
+        "-s",
+        "--set",
+        dest="variables",
+        action="append",
+        type=parse_variable,
+        help="layout variable values, e.g. back=24 or front=1,2,3",
+    )
+    simulate_parser.add_argument(
+        "--sheets", help="write every combination as contact sheets here"
+    )
+    simulate_parser.add_argument(
+        "--columns", type=int, default=8, help="frames per sheet row (default: 8)"
+    )
+    simulate_parser.add_argument(
+        "--per-sheet", type=int, default=64, help="frames per sheet (default: 64)"
+    )
+    simulate_parser.add_argument(
+        "--color", action="store_true", help="write a 24-bit preview instead of 1-bit"
+    )
+    simulate_parser.set_defaults(function=simulate)
+
+    cache_parser = subparsers.add_parser("cache", help="show or clear the parse cache")
+    cache_parser.add_argument(
+        "--clear", action="store_true", help="remove every cached header"
+    )
+    cache_parser.set_defaults(function=cache)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = get_parser().parse_args(argv)
+    if args.no_cache:
+        ParseCache.enabled = False
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import hashlib
+
+from file import File
+from image import Image
+
+
+class ImageRef(NamedTuple):
+    path: Optional[str]
+    image: Image
+
+
+class Comparison(NamedTuple):
+    # images with the same size and pixels, two or more per group
+    identical: List[List[ImageRef]]
+    # (image, image, differing pixels), one image per identical group
+    near: List[Tuple[ImageRef, ImageRef, int]]
+    # images without identical or near-identical copy
+    unique: List[ImageRef]
+
+
+class Compare:
+    # differing pixels of near-identical images
+    MAX_DISTANCE = 32
+    # bands per allowed differing pixel, more bands leave fewer images with too
+    # few inked bands but make the bands less selective
+    BANDS_PER_PIXEL = 2
+
+    @staticmethod
+    def get_payload(image: Image) -> bytes:
+        return bytes(image.data[: image.row_size * image.height])
+
+    @staticmethod
+    def get_key(image: Image, payload: bytes) -> bytes:
+        return hashlib.sha1(
+            f"{image.width}x{image.height}:".encode() + payload
+        ).digest()
+
+    @staticmethod
+    def distance(value: int, other: int) -> int:
+        # hamming distance of payloads read as ints, padding bits are always blank
+        return bin(value ^ other).count("1")
+
+    @staticmethod
+    def get_bands(size: int, count: int) -> List[Tuple[int, int]]:
+        # count byte ranges of about the same size covering size bytes
+        return [(i * size // count, (i + 1) * size // count) for i in range(count)]
+
+    @classmethod
+    def find_candidates(
+        cls, images: List[Image], payloads: List[bytes], max_distance: int
+    ) -> Set[Tuple[int, int]]:
+        # images closer than max_distance differ in at most max_distance bands,
+        # an image with more inked bands than that shares one of them with any
+        # close image, only inked bands are indexed as blank ones match most
+        # sprites; images with fewer inked bands are compared with every such
+        # image of their size, a close pair has at least one image with enough
+        count = cls.BANDS_PER_PIXEL * (max_distance + 1)
+        buckets: Dict[Tuple[int, int, int, bytes], List[int]] = {}
+        sparse: Dict[Tuple[int, int], List[int]] = {}
+        for i, (image, payload) in enumerate(zip(images, payloads)):
+            inked = 0
+            if len(payload) >= count:
+                for k, (start, end) in enumerate(cls.get_bands(len(payload), count)):
+                    band = payload[start:end]
+                    if any(band):
+                        inked += 1
+                        key = (image.width, image.height, k, band)
+                        buckets.setdefault(key, []).append(i)
+            if inked <= max_distance:
+                sparse.setdefault((image.width, image.height), []).append(i)
+        candidates = set()
+        for members in [*buckets.values(), *sparse.values()]:
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    candidates.add((members[a], members[b]))
+        return candidates
+
+    @classmethod
+    def compare(cls, files: List[File], max_distance: int = MAX_DISTANCE) -> Comparison:
+        groups: Dict[bytes, List[ImageRef]] = {}
+        payloads: Dict[bytes, bytes] = {}
+        for file in files:
+            for image in file.images:
+                payload = cls.get_payload(image)
+                key = cls.get_key(image, payload)
+                groups.setdefault(key, []).append(ImageRef(file.path, image))
+                payloads.setdefault(key, payload)
+
+        # near-identical images, between distinct payloads only
+        keys = list(groups)
+        near = []
+        if max_distance > 0:
+            images = [groups[key][0].image for key in keys]
+            candidates = cls.find_candidates(
+                images, [payloads[key] for key in keys], max_distance
+            )
+            # payloads are converted once, not for every pair
+            values = [int.from_bytes(payloads[key], "big") for key in keys]
+            for a, b in sorted(candidates):
+                distance = cls.distance(values[a], values[b])
+                if distance <= max_distance:
+                    near += [(groups[keys[a]][0], groups[keys[b]][0], distance)]
+        near.sort(key=lambda pair: pair[2])
+
+        close = {id(ref) for a, b, _ in near for ref in (a, b)}
+        return Comparison(
+            [group for group in groups.values() if len(group) > 1],
+            near,
+            [
+                group[0]
+                for group in groups.values()
+                if len(group) == 1 and id(group[0]) not in close
+            ],
+        )
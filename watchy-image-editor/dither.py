@@ -0,0 +1,148 @@
+from typing import Iterator, List
+from operator import lt
+
+from pixels import Pixels, numpy
+
+
+class Dither:
+    THRESHOLD = "threshold"
+    FLOYD_STEINBERG = "floyd-steinberg"
+    ATKINSON = "atkinson"
+    BAYER = "bayer"
+    MODES = [THRESHOLD, FLOYD_STEINBERG, ATKINSON, BAYER]
+
+    BAYER_MATRIX = [
+        [0, 8, 2, 10],
+        [12, 4, 14, 6],
+        [3, 11, 1, 9],
+        [15, 7, 13, 5],
+    ]
+    # comparison result (0 or 1) -> ascii bit, packed later with int(..., 2)
+    __bit_table = b"01" + bytes(254)
+
+    @classmethod
+    def check_mode(cls, mode: str) -> None:
+        if mode not in cls.MODES:
+            raise ValueError(f"invalid dithering mode {mode!r}")
+
+    @classmethod
+    def pack(
+        cls, data: bytes, width: int, height: int, color_depth: int, mode: str
+    ) -> bytearray:
+        # same arguments as Pixels.pack, which does the threshold mode
+        cls.check_mode(mode)
+        if mode == cls.THRESHOLD or width == 0 or height == 0:
+            return Pixels.pack(data, width, height, color_depth)
+        size = width * height * color_depth
+        if len(data) < size:
+            data = bytes(data) + bytes([Pixels.WHITE]) * (size - len(data))
+        gray = Pixels.gray(data, width, height, color_depth)
+        return bytearray(b"".join(cls.iter_rows(gray, width, height, mode)))
+
+    @classmethod
+    def iter_rows(
+        cls, gray: bytes, width: int, height: int, mode: str
+    ) -> Iterator[bytes]:
+        # packed rows of a gray image, errors are only kept for the next rows
+        if mode == cls.FLOYD_STEINBERG:
+            yield from cls.__iter_floyd_steinberg(gray, width, height)
+        elif mode == cls.ATKINSON:
+            yield from cls.__iter_atkinson(gray, width, height)
+        elif mode == cls.BAYER:
+            yield from cls.__iter_bayer(gray, width, height)
+        else:
+            yield from cls.__iter_threshold(gray, width, height)
+
+    @staticmethod
+    def __pack_row(bits: bytearray, row_size: int) -> bytes:
+        return int(bits, 2).to_bytes(row_size, "big")
+
+    @classmethod
+    def __iter_threshold(cls, gray: bytes, width: int, height: int) -> Iterator[bytes]:
+        packed = Pixels.pack(gray, width, height, 1)
+        row_size = (width + 7) // 8
+        for start in range(0, row_size * height, row_size):
+            yield bytes(packed[start : start + row_size])
+
+    @classmethod
+    def __iter_floyd_steinberg(
+        cls, gray: bytes, width: int, height: int
+    ) -> Iterator[bytes]:
+        row_size = (width + 7) // 8
+        level = Pixels.THRESHOLD
+        # errors of the current and next rows, shifted by one for x - 1
+        current = [0.0] * (width + 2)
+        following = [0.0] * (width + 2)
+        for y in range(height):
+            bits = bytearray(b"0" * (8 * row_size))
+            row = gray[y * width : (y + 1) * width]
+            for x in range(width):
+                value = row[x] + current[x + 1]
+                if value < level:
+                    bits[x] = 49
+                else:
+                    value -= 255
+                current[x + 2] += value * 0.4375
+                following[x] += value * 0.1875
+                following[x + 1] += value * 0.3125
+                following[x + 2] += value * 0.0625
+            yield cls.__pack_row(bits, row_size)
+            current, following = following, current
+            following[:] = [0.0] * (width + 2)
+
+    @classmethod
+    def __iter_atkinson(cls, gray: bytes, width: int, height: int) -> Iterator[bytes]:
+        # 3/4 of the error is spread, highlights and shadows stay clean
+        row_size = (width + 7) // 8
+        level = Pixels.THRESHOLD
+        rows = [[0.0] * (width + 3) for _ in range(3)]
+        for y in range(height):
+            current, following, last = rows
+            bits = bytearray(b"0" * (8 * row_size))
+            row = gray[y * width : (y + 1) * width]
+            for x in range(width):
+                value = row[x] + current[x + 1]
+                if value < level:
+                    bits[x] = 49
+                else:
+                    value -= 255
+                value *= 0.125
+                current[x + 2] += value
+                current[x + 3] += value
+                following[x] += value
+                following[x + 1] += value
+                following[x + 2] += value
+                last[x + 1] += value
+            yield cls.__pack_row(bits, row_size)
+            current[:] = [0.0] * (width + 3)
+            rows = [following, last, current]
+
+    @classmethod
+    def get_bayer_levels(cls, width: int) -> List[bytes]:
+        # threshold of every column, per row of the matrix
+        size = len(cls.BAYER_MATRIX)
+        return [
+            bytes((2 * row[x % size] + 1) * 128 // (size * size) for x in range(width))
+            for row in cls.BAYER_MATRIX
+        ]
+
+    @classmethod
+    def __iter_bayer(cls, gray: bytes, width: int, height: int) -> Iterator[bytes]:
+        row_size = (width + 7) // 8
+        levels = cls.get_bayer_levels(width)
+        if Pixels.use_numpy:
+            pixels = numpy.frombuffer(gray, dtype=numpy.uint8, count=width * height)
+            pixels = pixels.reshape(height, width)
+            tiles = numpy.frombuffer(b"".join(levels), dtype=numpy.uint8)
+            tiles = numpy.resize(tiles.reshape(len(levels), width), (height, width))
+            packed = numpy.packbits(pixels < tiles, axis=1).tobytes()
+            for start in range(0, row_size * height, row_size):
+                yield packed[start : start + row_size]
+            return
+        padding = b"0" * (8 * row_size - width)
+        for y in range(height):
+            row = gray[y * width : (y + 1) * width]
+            bits = bytes(map(lt, row, levels[y % len(levels)]))
+            yield int(bits.translate(cls.__bit_table) + padding, 2).to_bytes(
+                row_size, "big"
+            )
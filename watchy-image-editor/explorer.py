@@ -1,18 +1,37 @@
 from tkinter import ttk
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from file import File
+from font import Font
 from image import Image
 
 
 class Explorer(ttk.Frame):
+    # rows inserted per pass, the remaining ones are inserted when idle
+    INSERT_CHUNK = 100
+
     def __init__(self, parent, update_callback) -> None:
         super().__init__(parent)
 
         self.current_file = None
         self.current_id = None
+        # glyphs are edited like images but are not part of the image list
+        self.current_glyph = None
+        self.pending_focus = None
         self.update_callback = update_callback
 
+        # model -> tree row index, rows are only touched when they change
+        self.iids: Dict[Image, str] = {}
+        self.images: Dict[str, Image] = {}
+        self.labels: Dict[str, Tuple[str, str]] = {}
+        self.order: List[str] = []
+        # font rows after the image rows, their glyphs are child rows
+        self.font_iids: Dict[Font, str] = {}
+        self.glyph_iids: Dict[Image, str] = {}
+        self.glyph_fonts: Dict[Image, Font] = {}
+        self.next_iid = 0
+        self.sync_id = None
+
         self.explorer = ttk.Treeview(self, columns=("size"))
         self.explorer.heading("#0", text="name")
         self.explorer.heading("size", text="size")
@@ -30,7 +49,11 @@ class Explorer(ttk.Frame):
 
     @property
     def current_image(self) -> Optional[Image]:
-        if self.current_file is None or self.current_id is None:
+        if self.current_file is None:
+            return None
+        elif self.current_glyph is not None:
+            return self.current_glyph
+        elif self.current_id is None:
             return None
         else:
             return self.current_file.images[self.current_id]
@@ -45,67 +68,262 @@ class Explorer(ttk.Frame):
     def focus(self, id: int) -> None:
         if self.current_file is not None and id >= 0 and id < self.size:
             self.current_id = id
-            self.explorer.selection_set(str(id))
+            self.current_glyph = None
+            iid = self.iids.get(self.current_file.images[id])
+            if iid is not None:
+                self.explorer.selection_set(iid)
 
     def move_up(self) -> None:
         if self.current_id > 0:
-            id = self.current_id
-            images = self.current_file.images
-            images[id], images[id - 1] = images[id - 1], images[id]
+            self.swap(self.current_id - 1)
             self.current_id -= 1
             self.focus(self.current_id)
-            self.update(self.current_file, False)
 
     def move_down(self) -> None:
         if self.current_id < self.size - 1:
-            id = self.current_id
-            images = self.current_file.images
-            images[id], images[id + 1] = images[id + 1], images[id]
+            self.swap(self.current_id)
             self.current_id += 1
             self.focus(self.current_id)
-            self.update(self.current_file, False)
+
+    def swap(self, id: int) -> None:
+        # swaps images id and id + 1 and their rows
+        images = self.current_file.images
+        images[id], images[id + 1] = images[id + 1], images[id]
+        if self.aligned and id + 1 < len(self.order):
+            self.order[id], self.order[id + 1] = self.order[id + 1], self.order[id]
+            self.explorer.move(self.order[id], "", id)
+        else:
+            self.sync(False)
 
     def delete(self) -> None:
-        del self.current_file.images[self.current_id]
-        self.current_id = min(self.current_id, self.size - 1)
-        self.update(self.current_file, True)
-
-    def update(self, file: File, force: bool):
-        focus_id = self.current_id
-
-        if force or file != self.current_file:
-            focus_id = 0
-            if file is not None and file == self.current_file:
-                focus_id = self.current_id
-            ids = self.explorer.get_children()
-            if len(ids) > 0:
-                self.explorer.delete(*ids)
+        image = self.current_file.images[self.current_id]
+        self.current_file.remove_image(self.current_id)
+        self.remove_row(image, self.current_id)
+        if self.size == 0:
             self.current_id = None
+        else:
+            self.current_id = min(self.current_id, self.size - 1)
+            self.focus(self.current_id)
+
+    def clear(self) -> None:
+        if len(self.order) + len(self.font_iids) > 0:
+            self.explorer.delete(*self.order, *self.font_iids.values())
+        self.iids = {}
+        self.images = {}
+        self.labels = {}
+        self.order = []
+        self.font_iids = {}
+        self.glyph_iids = {}
+        self.glyph_fonts = {}
+        self.current_glyph = None
+        if self.sync_id is not None:
+            self.after_cancel(self.sync_id)
+            self.sync_id = None
+
+    @property
+    def aligned(self) -> bool:
+        # rows are in image order once every image has its row
+        return self.sync_id is None and len(self.order) == self.size
+
+    def update(self, file: File, force: bool, changed: Iterable[Image] = ()):
+        # changed images are the ones renamed, edited or inserted since the last
+        # update, force compares every row with the file after bulk changes
+        if file is not self.current_file:
+            self.pending_focus = 0
+            if (
+                file is not None
+                and file == self.current_file
+                and self.current_id is not None
+            ):
+                self.pending_focus = self.current_id
+            self.clear()
+            self.current_id = None
+            force = True
+        elif force and self.current_id is not None:
+            self.pending_focus = self.current_id
 
         self.current_file = file
 
         if self.current_file is not None:
-            for i, image in enumerate(self.current_file.images):
-                if self.explorer.exists(str(i)):
-                    self.explorer.item(
-                        str(i),
-                        text=f"{image.name}{'*' if image.modified else ''}",
-                        values=[f"{image.width}x{image.height}"],
-                    )
-                else:
-                    self.explorer.insert(
-                        "",
-                        "end",
-                        iid=str(i),
-                        text=f"{image.name}{'*' if image.modified else ''}",
-                        values=[f"{image.width}x{image.height}"],
-                    )
-            if self.size > 0 and (focus_id != self.current_id or force):
-                self.focus(focus_id)
+            if force:
+                self.sync(True)
+            else:
+                if self.current_id is not None and self.current_id >= self.size:
+                    self.current_id = None
+                self.refresh([self.current_image, *changed])
+            self.apply_focus(force)
 
-    def explorer_item_click(self, event) -> None:
-        if self.current_file is None or len(self.explorer.selection()) == 0:
-            self.current_id = None
+    def apply_focus(self, clamp: bool) -> None:
+        # focus may wait for its row while the file is still loading
+        if self.pending_focus is None or self.size == 0:
+            return
+        if clamp:
+            self.pending_focus = min(self.pending_focus, self.size - 1)
+        if (
+            self.pending_focus < self.size
+            and self.current_file.images[self.pending_focus] in self.iids
+        ):
+            focus_id, self.pending_focus = self.pending_focus, None
+            self.focus(focus_id)
+
+    def refresh(self, images: Iterable[Optional[Image]]) -> None:
+        # rows of the given images only, new images at the end are appended
+        file_images = self.current_file.images
+        for image in images:
+            if image is None:
+                continue
+            iid = self.iids.get(image)
+            if iid is not None:
+                self.update_row(iid)
+            elif image in self.glyph_iids:
+                self.update_row(self.glyph_iids[image])
+                self.update_font_row(self.glyph_fonts[image])
+            elif (
+                len(file_images) > 0
+                and file_images[-1] is image
+                and self.sync_id is None
+                and len(self.order) == len(file_images) - 1
+            ):
+                self.insert_row(image)
+            elif image in file_images:
+                # inserted elsewhere, compare the rows with the file
+                self.sync(False)
+
+    def sync(self, relabel: bool) -> None:
+        # every row against the file, labels are only compared when relabel is
+        # set, new rows always get their label
+        images = self.current_file.images
+        if self.sync_id is not None:
+            self.after_cancel(self.sync_id)
+            self.sync_id = None
+
+        # deleted images
+        if len(self.iids) > len(images) or any(
+            image not in self.iids for image in images
+        ):
+            present = set(images)
+            for image in [image for image in self.iids if image not in present]:
+                self.remove_row(image)
+
+        # new images, large files are populated over several idle passes
+        inserted = 0
+        for image in images:
+            if image not in self.iids:
+                if inserted == self.INSERT_CHUNK:
+                    self.sync_id = self.after_idle(self.idle_sync)
+                    break
+                self.insert_row(image)
+                inserted += 1
+
+        # moved images
+        expected = [self.iids[image] for image in images if image in self.iids]
+        if expected != self.order:
+            for index, iid in enumerate(expected):
+                if self.order[index] != iid:
+                    self.explorer.move(iid, "", index)
+                    self.order.remove(iid)
+                    self.order.insert(index, iid)
+
+        # fonts are read after the images
+        if self.sync_id is None:
+            for font in self.current_file.fonts:
+                if font not in self.font_iids:
+                    self.insert_font_rows(font)
+
+        # renamed, resized or modified images
+        if relabel:
+            for iid in self.order:
+                self.update_row(iid)
+            for font in self.font_iids:
+                for glyph in font.glyphs:
+                    self.update_row(self.glyph_iids[glyph.image])
+                self.update_font_row(font)
+
+    def insert_row(self, image: Image) -> None:
+        iid = f"I{self.next_iid}"
+        self.next_iid += 1
+        label = self.get_label(image)
+        # font rows stay after the image rows
+        self.explorer.insert(
+            "", len(self.order), iid=iid, text=label[0], values=[label[1]]
+        )
+        self.iids[image] = iid
+        self.images[iid] = image
+        self.labels[iid] = label
+        self.order += [iid]
+
+    def remove_row(self, image: Image, index: Optional[int] = None) -> None:
+        iid = self.iids.pop(image, None)
+        if iid is None:
+            return
+        del self.images[iid]
+        del self.labels[iid]
+        if index is not None and index < len(self.order) and self.order[index] == iid:
+            del self.order[index]
         else:
-            self.current_id = int(self.explorer.selection()[0])
+            self.order.remove(iid)
+        self.explorer.delete(iid)
+
+    def insert_font_rows(self, font: Font) -> None:
+        iid = f"F{self.next_iid}"
+        self.next_iid += 1
+        label = self.get_font_label(font)
+        self.explorer.insert("", "end", iid=iid, text=label[0], values=[label[1]])
+        self.font_iids[font] = iid
+        self.labels[iid] = label
+        for glyph in font.glyphs:
+            glyph_iid = f"G{self.next_iid}"
+            self.next_iid += 1
+            label = self.get_label(glyph.image)
+            self.explorer.insert(
+                iid, "end", iid=glyph_iid, text=label[0], values=[label[1]]
+            )
+            self.glyph_iids[glyph.image] = glyph_iid
+            self.glyph_fonts[glyph.image] = font
+            self.images[glyph_iid] = glyph.image
+            self.labels[glyph_iid] = label
+
+    def update_font_row(self, font: Font) -> None:
+        iid = self.font_iids[font]
+        label = self.get_font_label(font)
+        if label != self.labels[iid]:
+            self.explorer.item(iid, text=label[0], values=[label[1]])
+            self.labels[iid] = label
+
+    def update_row(self, iid: str) -> None:
+        label = self.get_label(self.images[iid])
+        if label != self.labels[iid]:
+            self.explorer.item(iid, text=label[0], values=[label[1]])
+            self.labels[iid] = label
+
+    def idle_sync(self) -> None:
+        self.sync_id = None
+        if self.current_file is not None:
+            self.sync(False)
+            self.apply_focus(False)
+
+    @staticmethod
+    def get_label(image: Image) -> Tuple[str, str]:
+        return (
+            f"{image.name}{'*' if image.modified else ''}",
+            f"{image.width}x{image.height}",
+        )
+
+    @staticmethod
+    def get_font_label(font: Font) -> Tuple[str, str]:
+        return (
+            f"{font.name}{'*' if font.modified else ''}",
+            f"{len(font.glyphs)} glyphs",
+        )
+
+    def explorer_item_click(self, event) -> None:
+        selection = self.explorer.selection()
+        self.current_id = None
+        self.current_glyph = None
+        if self.current_file is not None and len(selection) > 0:
+            image = self.images.get(selection[0])
+            if image in self.glyph_iids:
+                self.current_glyph = image
+            elif image is not None and image in self.current_file.images:
+                self.current_id = self.current_file.images.index(image)
         self.update_callback()
@@ -1,19 +1,43 @@
-from typing import List, Optional
-import re
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import contextlib
+import hashlib
+import io
+import os
 import os.path
+import shutil
+import tempfile
 
+from cache import ParseCache
+from font import Font
 from image import Image
+from packbits import PackBits
+from header import HeaderIndex, HeaderParser, ImageSource
+from table import Table
+
+# element written by File.export with its text span and data span
+Placement = Tuple[Union[Image, Table, Font], Tuple[int, int], Optional[Tuple[int, int]]]
 
 
 class File:
     FILE_TYPES = [("Header File", "*.h"), ("All Files", "*.*")]
+    BUFFER_SIZE = 1 << 16
+    # larger files are mapped and their images decoded on demand
+    LAZY_SIZE = 1 << 20
 
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, read: bool = True, lazy: bool = False) -> None:
         self.path = path
-        if path is None:
-            self.images = []
-        else:
-            self.images = self.__read_file()
+        self.lazy = lazy
+        self.index = None
+        self.images = []
+        self.tables = []
+        # GFX fonts, their glyphs are not part of images
+        self.fonts: List[Font] = []
+        self.layout: List[Tuple[Tuple[int, int], bool]] = []
+        # images are compressed on export when set, see PackBits
+        self.encoding: Optional[str] = None
+        if path is not None and read:
+            for _ in self.read_images():
+                pass
 
     @property
     def filename(self) -> str:
@@ -23,7 +47,9 @@ class File:
 
     @property
     def modified(self) -> bool:
-        return any(image.modified for image in self.images)
+        return any(image.modified for image in self.images) or any(
+            font.modified for font in self.fonts
+        )
 
     def search(self, name) -> Optional[Image]:
         for image in self.images:
@@ -31,43 +57,340 @@ class File:
                 return image
         return None
 
-    def __read_file(self) -> List[Image]:
-        images = []
+    def read_images(self) -> Iterator[Tuple[int, int]]:
+        # append images one by one, yielding (parsed bytes, total bytes)
+        self.index = HeaderIndex(self.path)
+        cached = ParseCache.load(self.path, self.index, self.lazy)
+        if cached is not None:
+            self.images += cached[0]
+            self.tables += cached[1]
+            self.encoding = cached[2]
+            self.fonts += self.index.iter_fonts()
+            self.layout = self.get_layout()
+            yield 1, 1
+            return
+        for image, (_, end) in self.index.iter_images():
+            if not self.lazy and not image.loaded:
+                image.data = image.source.decode()
+            self.images += [image]
+            yield end, self.index.size
+        self.tables += self.index.iter_tables()
+        self.encoding = self.index.find_encoding()
+        self.fonts += self.index.iter_fonts()
+        self.layout = self.get_layout()
+        ParseCache.store(self.path, self.images, self.tables, self.encoding, self.lazy)
+
+    def import_tables(self, path: str) -> int:
+        # pointer tables usually live in the watchface .cpp file, they are not
+        # written to the header unless asked to, see export
+        with open(path) as f:
+            tables = list(HeaderParser.iter_tables(f.read()))
+        for table in tables:
+            table.imported = True
+        names = {table.name for table in tables}
+        self.tables = [table for table in self.tables if table.name not in names]
+        self.tables += tables
+        return len(tables)
+
+    def rename_image(self, image: Image, name: str) -> None:
+        for table in self.tables:
+            table.rename(image.name, name)
+        image.name = name
+
+    def remove_image(self, index: int) -> None:
+        # the watchfaces index tables with fixed counts, their entries cannot move
+        image = self.images[index]
+        if sum(other.name == image.name for other in self.images) == 1:
+            for table in self.tables:
+                if image.name in table.entries:
+                    raise ValueError(f"{image.name} is used by table {table.name}")
+        self.images.pop(index)
+
+    def touch(self, image: Image) -> None:
+        if self.index is not None:
+            self.index.touch(image)
+
+    def detach(self) -> None:
+        # decode every image so the mapped file can be released
+        for image in self.images:
+            if image.source is not None:
+                image.detach()
+        self.close()
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def get_layout(self) -> List[Tuple[Tuple[int, int], bool]]:
+        # (span, is image) of the elements of the file read, deleted ones included
+        return sorted(
+            [
+                (image.source.span, True)
+                for image in self.images
+                if image.source is not None and image.source.index is self.index
+            ]
+            + [
+                (element.span, False)
+                for element in self.tables + self.fonts
+                if element.span is not None
+            ]
+        )
+
+    def __get_gap(self, layout: List[Tuple[Tuple[int, int], bool]], k: int) -> bytes:
+        # text before the k-th element, or after the last one
+        if self.index is None:
+            return b""
+        start = 0 if k == 0 else layout[k - 1][0][1]
+        end = self.index.size if k == len(layout) else layout[k][0][0]
+        return self.index.read_bytes((start, end))
+
+    def __get_image_text(self, image: Image) -> Tuple[bytes, Tuple[int, int]]:
+        # text without its line ending and the relative span of its data
+        source = image.source
+        if (
+            source is not None
+            and source.index is self.index
+            and source.data_span is not None
+            and not image.modified
+            and image.name == source.name
+            and source.encoding == self.encoding
+        ):
+            # unchanged image, copy its original text
+            start = source.span[0]
+            return self.index.read_bytes(source.span), (
+                source.data_span[0] - start,
+                source.data_span[1] - start,
+            )
+        output = io.StringIO()
+        if self.encoding == PackBits.NAME:
+            image.write_cpp(output, self.encoding, PackBits.encode_image(image))
+        else:
+            image.write_cpp(output)
+        text = self.__encode(output.getvalue()[:-1])
+        return text, (text.index(b"{") + 1, text.rindex(b"}"))
+
+    @staticmethod
+    def get_key(image: Image, text: bytes, data_span: Tuple[int, int]) -> bytes:
+        # identical payloads share a key, whatever the spacing of their values
+        data = text[data_span[0] : data_span[1]].translate(None, b" \t\r\n,").lower()
+        return hashlib.sha1(f"{image.width}x{image.height}:".encode() + data).digest()
+
+    def __get_alias_text(self, image: Image) -> Tuple[Optional[str], bytes]:
+        # target and text of an alias read from the file
+        source = image.source
+        if (
+            source is None
+            or source.index is not self.index
+            or source.data_span is not None
+            or image.name != source.name
+        ):
+            return None, b""
+        text = self.index.read_bytes(source.span)
+        match = HeaderParser.ALIAS_BYTES_PATTERN.match(text)
+        return None if match is None else match.group("target").decode(), text
 
-        current_image = None
+    def __get_table_text(self, table: Union[Table, Font]) -> bytes:
+        # fonts are written like tables, in one piece
+        if table.span is not None and not table.modified and self.index is not None:
+            return self.index.read_bytes(table.span)
+        output = io.StringIO()
+        table.write_cpp(output)
+        return self.__encode(output.getvalue()[:-1])
 
-        with open(self.path) as f:
-            for line in f:
-                header = re.match(
-                    r"const unsigned char (\w+) \[\] PROGMEM \= \{",
-                    line,
+    def __encode(self, text: str) -> bytes:
+        return text.replace("\n", self.newline.decode()).encode()
+
+    @property
+    def newline(self) -> bytes:
+        if self.index is None:
+            return os.linesep.encode()
+        return self.index.newline
+
+    @staticmethod
+    @contextlib.contextmanager
+    def replace_file(
+        path: str,
+        mode: str = "w",
+        buffering: int = -1,
+        before_replace: Optional[Callable[[], None]] = None,
+    ) -> Iterator[IO]:
+        # write next to the target then rename, a failed write leaves it untouched
+        fd, temp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(path)}.",
+            suffix=".tmp",
+            dir=os.path.dirname(os.path.abspath(path)),
+        )
+        try:
+            with os.fdopen(fd, mode=mode, buffering=buffering) as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                shutil.copymode(path, temp_path)
+                if before_replace is not None:
+                    before_replace()
+            else:
+                # mkstemp files are private, use the default mode instead
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(temp_path, 0o666 & ~umask)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def export(
+        self,
+        path: str,
+        progress: Optional[Callable[[int, int, int], None]] = None,
+        deduplicate: bool = False,
+        imported_tables: bool = False,
+    ) -> List[Placement]:
+        # text between the elements that were read is kept (includes, comments),
+        # unchanged elements are copied and only the others are written again;
+        # identical images are written as aliases when deduplicate is set, and
+        # imported tables only when imported_tables is set
+        layout = self.layout if self.index is not None else []
+        image_slots = [k for k, (_, is_image) in enumerate(layout) if is_image]
+        last_image_slot = image_slots[-1] if len(image_slots) > 0 else None
+        newline = self.newline
+
+        placements: List[Placement] = []
+        written_images: Dict[bytes, str] = {}
+        images = iter(self.images)
+        tables = iter(
+            sorted(
+                [table for table in self.tables + self.fonts if table.span is not None],
+                key=lambda table: table.span,
+            )
+        )
+        position = 0
+
+        def detach_mapped() -> None:
+            # a mapped file cannot be replaced on Windows
+            if (
+                os.name == "nt"
+                and self.index is not None
+                and os.path.samefile(path, self.index.path)
+            ):
+                self.detach()
+
+        with self.replace_file(path, "wb", self.BUFFER_SIZE, detach_mapped) as f:
+
+            def write(data: bytes) -> None:
+                nonlocal position
+                f.write(data)
+                position += len(data)
+
+            def write_image(image: Image) -> None:
+                text, data_span = self.__get_image_text(image)
+                key = self.get_key(image, text, data_span)
+                target = written_images.get(key)
+                alias_target, alias_text = self.__get_alias_text(image)
+                if target is not None and target == alias_target:
+                    # aliases of the file are kept while their target is
+                    text = alias_text
+                    data_span = None
+                elif target is not None and deduplicate:
+                    # identical data is only stored once in flash
+                    text = f"#define {image.name} {target}".encode()
+                    data_span = None
+                elif target is None:
+                    written_images[key] = image.name
+                placements.append(
+                    (
+                        image,
+                        (position, position + len(text)),
+                        (
+                            None
+                            if data_span is None
+                            else (position + data_span[0], position + data_span[1])
+                        ),
+                    )
                 )
-                if header:
-                    groups = header.groups()
-                    if current_image is None:
-                        current_image = Image(groups[0], 0, 0)
-                    current_image.name = groups[0]
-                elif current_image is not None and current_image.name is not None:
-                    data = re.match(r"((0x\w+,? ?)+)", line.strip())
-                    if data:
-                        current_image.add_data(
-                            data.groups()[0].strip().strip(",").split(", ")
-                        )
-                    else:
-                        images += [current_image]
-                        current_image.finalize()
-                        current_image = None
-                comment_header = re.match(r"// '(\w+)', (\d+)x(\d+)px", line)
-                if comment_header:
-                    groups = comment_header.groups()
-                    current_image = Image(groups[0], int(groups[1]), int(groups[2]))
-
-        return images
-
-    def export(self, path: str) -> None:
-        with open(path, mode="w") as f:
+                write(text)
+                if progress is not None:
+                    progress(len(placements), len(self.images), position)
+
+            def write_table(table: Union[Table, Font]) -> None:
+                text = self.__get_table_text(table)
+                placements.append((table, (position, position + len(text)), None))
+                write(text)
+
+            write(self.__get_gap(layout, 0))
+            if last_image_slot is None:
+                for image in images:
+                    write_image(image)
+                    write(newline)
+            for k, (_, is_image) in enumerate(layout):
+                element = next(images if is_image else tables, None)
+                gap = self.__get_gap(layout, k + 1)
+                if element is None:
+                    # removed element, keep what followed it unless blank
+                    if gap.strip():
+                        write(gap)
+                    continue
+                if is_image:
+                    write_image(element)
+                else:
+                    write_table(element)
+                if k == last_image_slot:
+                    # new images go after the last one
+                    for image in images:
+                        write(newline)
+                        write_image(image)
+                write(gap)
+            placed = {id(element) for element, _, _ in placements}
+            for table in self.tables + self.fonts:
+                if id(table) in placed or (
+                    isinstance(table, Table) and table.imported and not imported_tables
+                ):
+                    continue
+                write(newline)
+                write_table(table)
+                write(newline)
+        return placements
+
+    def save(
+        self,
+        path: str,
+        progress: Optional[Callable[[int, int, int], None]] = None,
+        deduplicate: bool = False,
+        imported_tables: bool = False,
+    ) -> None:
+        placements = self.export(path, progress, deduplicate, imported_tables)
+        # the written file becomes the source of every element, it is not read again
+        index = HeaderIndex(path)
+        for element, span, data_span in placements:
+            if isinstance(element, (Table, Font)):
+                if isinstance(element, Font) and element.modified:
+                    element.update()
+                if isinstance(element, Table):
+                    # written tables now belong to the header
+                    element.imported = False
+                element.span = span
+                element.modified = False
+            else:
+                element.source = ImageSource(
+                    index,
+                    element.name,
+                    span,
+                    data_span,
+                    self.encoding,
+                    (element.row_size, element.height),
+                )
+                element.modified = False
+        self.close()
+        self.index = index
+        self.path = path
+        self.layout = self.get_layout()
+        if self.lazy:
+            # aliases have no data span to be decoded from, they stay loaded
             for image in self.images:
-                f.write(image.export_cpp())
+                if image.loaded and image.source.data_span is not None:
+                    index.track(image)
+        ParseCache.store(path, self.images, self.tables, self.encoding, self.lazy)
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, self.__class__):
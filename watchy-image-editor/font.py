@@ -0,0 +1,182 @@
+from typing import List, NamedTuple, Optional, Sequence, TextIO, Tuple
+
+from image import Image
+
+
+class GlyphSource(NamedTuple):
+    # glyph bits inside the packed bitmap stream of its font, not copied
+    stream: bytes
+    offset: int
+    shape: Tuple[int, int]
+
+    def decode(self) -> bytearray:
+        return Font.unpack(self.stream, self.offset, *self.shape)
+
+    def load(self, image: Image) -> bytearray:
+        return self.decode()
+
+
+class Glyph:
+    def __init__(
+        self, code: int, image: Image, x_advance: int, x_offset: int, y_offset: int
+    ) -> None:
+        self.code = code
+        # width and height are the ones of the image
+        self.image = image
+        self.x_advance = x_advance
+        self.x_offset = x_offset
+        self.y_offset = y_offset
+
+    @property
+    def char(self) -> str:
+        return chr(self.code)
+
+
+class Font:
+    # Adafruit GFX font, glyph bitmaps are packed without row alignment
+    VALUES_PER_LINE = 12
+    # size of the GFXglyph and GFXfont structs, for the flash usage comment
+    GLYPH_SIZE = 7
+    FONT_SIZE = 7
+
+    def __init__(
+        self,
+        name: str,
+        glyphs: List[Glyph],
+        first: int,
+        y_advance: int,
+        bitmaps_name: Optional[str] = None,
+        glyphs_name: Optional[str] = None,
+        span: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        self.name = name
+        self.glyphs = glyphs
+        self.first = first
+        self.y_advance = y_advance
+        self.bitmaps_name = bitmaps_name or f"{name}Bitmaps"
+        self.glyphs_name = glyphs_name or f"{name}Glyphs"
+        # position in the file it was read from, see File.export
+        self.span = span
+        self.__modified = False
+
+    @classmethod
+    def read(
+        cls,
+        name: str,
+        stream: bytes,
+        metrics: Sequence[Tuple[int, int, int, int, int, int]],
+        first: int,
+        y_advance: int,
+        bitmaps_name: Optional[str] = None,
+        glyphs_name: Optional[str] = None,
+        span: Optional[Tuple[int, int]] = None,
+    ) -> "Font":
+        # metrics are the GFXglyph values, glyphs are only unpacked when used
+        glyphs = []
+        for code, (offset, width, height, x_advance, x_offset, y_offset) in enumerate(
+            metrics, first
+        ):
+            image = Image(cls.get_glyph_name(name, code), width, height)
+            image.source = GlyphSource(stream, offset, (width, height))
+            image.data = None
+            glyphs += [Glyph(code, image, x_advance, x_offset, y_offset)]
+        return cls(name, glyphs, first, y_advance, bitmaps_name, glyphs_name, span)
+
+    @staticmethod
+    def get_glyph_name(name: str, code: int) -> str:
+        return f"{name}_0x{code:02X}"
+
+    @property
+    def last(self) -> int:
+        return self.first + len(self.glyphs) - 1
+
+    @property
+    def modified(self) -> bool:
+        return self.__modified or any(glyph.image.modified for glyph in self.glyphs)
+
+    @modified.setter
+    def modified(self, modified: bool) -> None:
+        self.__modified = modified
+        if not modified:
+            for glyph in self.glyphs:
+                glyph.image.modified = False
+
+    def search(self, code: int) -> Optional[Glyph]:
+        if self.first <= code <= self.last:
+            return self.glyphs[code - self.first]
+        return None
+
+    @staticmethod
+    def unpack(stream: bytes, offset: int, width: int, height: int) -> bytearray:
+        # glyph bits to byte-aligned rows, the glyph is one big int
+        size = (width * height + 7) // 8
+        value = int.from_bytes(stream[offset : offset + size], "big")
+        value >>= 8 * size - width * height
+        row_size = (width + 7) // 8
+        shift = 8 * row_size - width
+        mask = (1 << width) - 1
+        return bytearray(
+            b"".join(
+                (((value >> (width * (height - 1 - j))) & mask) << shift).to_bytes(
+                    row_size, "big"
+                )
+                for j in range(height)
+            )
+        )
+
+    def pack(self) -> Tuple[bytearray, List[int]]:
+        # bitmap stream and glyph offsets, each glyph starts on a byte
+        stream = bytearray()
+        offsets = []
+        for glyph in self.glyphs:
+            image = glyph.image
+            shift = 8 * image.row_size - image.width
+            value = 0
+            for row in image.rows():
+                value = (value << image.width) | int.from_bytes(row, "big") >> shift
+            bits = image.width * image.height
+            size = (bits + 7) // 8
+            offsets += [len(stream)]
+            stream += (value << (8 * size - bits)).to_bytes(size, "big")
+        return stream, offsets
+
+    def update(self) -> None:
+        # glyphs become views into the packed stream again
+        stream, offsets = self.pack()
+        stream = bytes(stream)
+        for glyph, offset in zip(self.glyphs, offsets):
+            image = glyph.image
+            image.source = GlyphSource(stream, offset, (image.width, image.height))
+
+    def write_cpp(self, f: TextIO) -> int:
+        # same layout as fontconvert
+        stream, offsets = self.pack()
+        count = self.VALUES_PER_LINE
+        written = f.write(f"const uint8_t {self.bitmaps_name}[] PROGMEM = {{\n  ")
+        written += f.write(
+            ",\n  ".join(
+                ", ".join(f"0x{value:02X}" for value in stream[start : start + count])
+                for start in range(0, len(stream), count)
+            )
+        )
+        written += f.write(
+            f" }};\n\nconst GFXglyph {self.glyphs_name}[] PROGMEM = {{\n"
+        )
+        for i, (glyph, offset) in enumerate(zip(self.glyphs, offsets)):
+            end = " }; //" if i == len(self.glyphs) - 1 else ",   //"
+            written += f.write(
+                f"  {{ {offset:5d}, {glyph.image.width:3d}, {glyph.image.height:3d}, "
+                f"{glyph.x_advance:3d}, {glyph.x_offset:4d}, {glyph.y_offset:4d} }}"
+                f"{end} 0x{glyph.code:02X} '{glyph.char}'\n"
+            )
+        written += f.write(
+            f"\nconst GFXfont {self.name} PROGMEM = {{\n"
+            f"  (uint8_t  *){self.bitmaps_name},\n"
+            f"  (GFXglyph *){self.glyphs_name},\n"
+            f"  0x{self.first:02X}, 0x{self.last:02X}, {self.y_advance} }};\n\n"
+            f"// Approx. {self.get_flash_size(len(stream))} bytes\n"
+        )
+        return written
+
+    def get_flash_size(self, stream_size: int) -> int:
+        return stream_size + self.GLYPH_SIZE * len(self.glyphs) + self.FONT_SIZE
@@ -0,0 +1,352 @@
+from collections import OrderedDict
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+import heapq
+import mmap
+import re
+import threading
+
+from font import Font
+from image import Image
+from packbits import PackBits
+from table import Table
+
+
+class HeaderParser:
+    IMAGE_PATTERN = re.compile(
+        r"(?://[ \t]*'(?P<comment_name>\w+)',[ \t]*(?P<width>\d+)[ \t]*x[ \t]*(?P<height>\d+)[ \t]*px"
+        r"(?:,[ \t]*(?P<encoding>packbits)\b)?[^\n]*\s*)?"
+        r"const\s+unsigned\s+char\s+(?P<name>\w+)\s*\[\s*\d*\s*\]\s*PROGMEM\s*=\s*\{"
+        r"(?P<data>[^}]*)\}\s*;"
+    )
+    IMAGE_BYTES_PATTERN = re.compile(IMAGE_PATTERN.pattern.encode())
+    ENCODING_PATTERN = re.compile(r"px,[ \t]*(?P<encoding>packbits)\b")
+    ENCODING_BYTES_PATTERN = re.compile(ENCODING_PATTERN.pattern.encode())
+    # duplicated images are written as an alias of the first one
+    ALIAS_PATTERN = re.compile(
+        r"#define[ \t]+(?P<name>\w+)[ \t]+(?P<target>\w+)[ \t]*$", re.MULTILINE
+    )
+    ALIAS_BYTES_PATTERN = re.compile(ALIAS_PATTERN.pattern.encode(), re.MULTILINE)
+    TABLE_PATTERN = re.compile(
+        r"const\s+unsigned\s+char\s*\*\s*(?:const\s+)?(?P<name>\w+)\s*\[\s*\d*\s*\]\s*"
+        r"(?:PROGMEM\s*)?=\s*\{(?P<entries>[^}]*)\}\s*;"
+    )
+    TABLE_BYTES_PATTERN = re.compile(TABLE_PATTERN.pattern.encode())
+    # Adafruit GFX fonts: bitmap stream, glyph table and the font itself
+    FONT_PATTERN = re.compile(
+        r"const\s+GFXfont\s+(?P<name>\w+)\s*(?:PROGMEM\s*)?=\s*\{\s*"
+        r"\(\s*uint8_t\s*\*\s*\)\s*(?P<bitmaps>\w+)\s*,\s*"
+        r"\(\s*GFXglyph\s*\*\s*\)\s*(?P<glyphs>\w+)\s*,\s*"
+        r"(?P<first>\w+)\s*,\s*(?P<last>\w+)\s*,\s*(?P<y_advance>\w+)\s*\}\s*;"
+        r"(?:[ \t]*\n\s*//[ \t]*Approx\.[^\n]*)?"
+    )
+    FONT_BYTES_PATTERN = re.compile(FONT_PATTERN.pattern.encode())
+    FONT_BITMAPS_PATTERN = re.compile(
+        r"const\s+uint8_t\s+(?P<name>\w+)\s*\[\s*\d*\s*\]\s*(?:PROGMEM\s*)?=\s*\{"
+        r"(?P<data>[^}]*)\}\s*;"
+    )
+    FONT_BITMAPS_BYTES_PATTERN = re.compile(FONT_BITMAPS_PATTERN.pattern.encode())
+    # glyph comments may contain braces ('{', '}')
+    FONT_GLYPHS_PATTERN = re.compile(
+        r"const\s+GFXglyph\s+(?P<name>\w+)\s*\[\s*\d*\s*\]\s*(?:PROGMEM\s*)?=\s*\{"
+        r"(?P<entries>(?:[^{}/]|//[^\n]*|\{[^{}]*\})*)\}\s*;"
+    )
+    FONT_GLYPHS_BYTES_PATTERN = re.compile(FONT_GLYPHS_PATTERN.pattern.encode())
+    GLYPH_PATTERN = re.compile(r"\{([^{}]*)\}")
+    COMMENT_PATTERN = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+    NAME_PATTERN = re.compile(r"\w+")
+    VALUE_PATTERN = re.compile(r"0[xX]([0-9a-fA-F]{1,2})\b")
+
+    @classmethod
+    def read_file(cls, path: str) -> Iterator[Image]:
+        with open(path) as f:
+            content = f.read()
+        return cls.parse(content)
+
+    @classmethod
+    def parse(cls, content: str) -> Iterator[Image]:
+        for image, _ in cls.iter_images(content):
+            yield image
+
+    @classmethod
+    def iter_images(cls, content: str) -> Iterator[Tuple[Image, Tuple[int, int]]]:
+        images: Dict[str, Image] = {}
+        for match in heapq.merge(
+            cls.IMAGE_PATTERN.finditer(content),
+            cls.ALIAS_PATTERN.finditer(content),
+            key=lambda match: match.start(),
+        ):
+            if match.re is cls.ALIAS_PATTERN:
+                target = images.get(match.group("target"))
+                if target is not None:
+                    image = cls.alias(match.group("name"), target)
+                    images[image.name] = image
+                    yield image, match.span()
+                continue
+            if match.group("width") is None:
+                image = Image(match.group("name"), 0, 0)
+            else:
+                image = Image(
+                    match.group("name"),
+                    int(match.group("width")),
+                    int(match.group("height")),
+                )
+            image.add_data(cls.decode_data(match.group("data")))
+            image.finalize()
+            if match.group("encoding") is not None:
+                image.data = cls.unpack(
+                    image.data, match.group("encoding"), image.row_size, image.height
+                )
+            images[image.name] = image
+            yield image, match.span()
+
+    @classmethod
+    def find_encoding(cls, content: str) -> Optional[str]:
+        match = cls.ENCODING_PATTERN.search(content)
+        return None if match is None else match.group("encoding")
+
+    @staticmethod
+    def unpack(data: bytes, encoding: str, row_size: int, height: int) -> bytearray:
+        if encoding == PackBits.NAME:
+            return PackBits.decode(data, row_size, height)
+        return bytearray(data)
+
+    @classmethod
+    def iter_tables(cls, content: str) -> Iterator[Table]:
+        for match in cls.TABLE_PATTERN.finditer(content):
+            yield cls.table(match.group("name"), match.group("entries"))
+
+    @staticmethod
+    def alias(name: str, target: Image) -> Image:
+        image = Image(name, target.width, target.height)
+        image.data = bytearray(target.data)
+        return image
+
+    @classmethod
+    def table(
+        cls, name: str, raw_entries: str, span: Optional[Tuple[int, int]] = None
+    ) -> Table:
+        return Table(
+            name,
+            cls.NAME_PATTERN.findall(cls.COMMENT_PATTERN.sub("", raw_entries)),
+            span,
+        )
+
+    @classmethod
+    def font(
+        cls,
+        name: str,
+        bitmaps_name: str,
+        raw_data: str,
+        glyphs_name: str,
+        raw_entries: str,
+        first: str,
+        y_advance: str,
+        span: Optional[Tuple[int, int]] = None,
+    ) -> Font:
+        metrics = [
+            tuple(int(value, 0) for value in entry.split(","))
+            for entry in cls.GLYPH_PATTERN.findall(
+                cls.COMMENT_PATTERN.sub("", raw_entries)
+            )
+        ]
+        if any(len(values) != 6 for values in metrics):
+            raise ValueError(f"invalid glyphs in font {name}")
+        return Font.read(
+            name,
+            bytes(cls.decode_data(raw_data)),
+            metrics,
+            int(first, 0),
+            int(y_advance, 0),
+            bitmaps_name,
+            glyphs_name,
+            span,
+        )
+
+    @classmethod
+    def decode_data(cls, raw_data: str) -> bytearray:
+        count = raw_data.count("0x") + raw_data.count("0X")
+        try:
+            data = bytearray.fromhex(
+                raw_data.replace("0x", "").replace("0X", "").replace(",", "")
+            )
+            if len(data) == count:
+                # fromhex over-allocates, keep an exactly sized copy
+                return bytearray(data)
+        except ValueError:
+            pass
+        # values without leading zero (0x0, 0xf, ...) or comments inside data
+        return bytearray(int(v, 16) for v in cls.VALUE_PATTERN.findall(raw_data))
+
+
+class ImageSource(NamedTuple):
+    index: "HeaderIndex"
+    name: str
+    span: Tuple[int, int]
+    # aliases have no data of their own
+    data_span: Optional[Tuple[int, int]]
+    # compressed images also need their row size and height
+    encoding: Optional[str] = None
+    shape: Tuple[int, int] = (0, 0)
+
+    @property
+    def text(self) -> str:
+        return self.index.read(self.span)
+
+    def decode(self) -> bytearray:
+        data = HeaderParser.decode_data(self.index.read(self.data_span))
+        if self.encoding is not None:
+            data = HeaderParser.unpack(data, self.encoding, *self.shape)
+        return data
+
+    def load(self, image: Image) -> bytearray:
+        data = self.decode()
+        self.index.track(image)
+        return data
+
+
+class HeaderIndex:
+    # decoded images kept in memory, least recently used ones are unloaded
+    CACHE_SIZE = 32
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.__file = open(path, mode="rb")
+        try:
+            self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            self.__mmap = bytes()
+        self.__resident = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.__mmap)
+
+    @property
+    def newline(self) -> bytes:
+        end = self.__mmap.find(b"\n")
+        if end > 0 and self.__mmap[end - 1 : end] == b"\r":
+            return b"\r\n"
+        return b"\n"
+
+    def iter_images(self) -> Iterator[Tuple[Image, Tuple[int, int]]]:
+        images: Dict[str, Image] = {}
+        for match in heapq.merge(
+            HeaderParser.IMAGE_BYTES_PATTERN.finditer(self.__mmap),
+            HeaderParser.ALIAS_BYTES_PATTERN.finditer(self.__mmap),
+            key=lambda match: match.start(),
+        ):
+            if match.re is HeaderParser.ALIAS_BYTES_PATTERN:
+                target = images.get(match.group("target").decode())
+                if target is not None:
+                    image = HeaderParser.alias(match.group("name").decode(), target)
+                    image.source = ImageSource(self, image.name, match.span(), None)
+                    images[image.name] = image
+                    yield image, match.span()
+                continue
+            name = match.group("name").decode()
+            if match.group("width") is None:
+                source = ImageSource(self, name, match.span(), match.span("data"))
+                # size is guessed from the data, decode it now
+                image = Image(name, 0, 0)
+                image.add_data(source.decode())
+                image.finalize()
+            else:
+                image = Image(
+                    name, int(match.group("width")), int(match.group("height"))
+                )
+                encoding = match.group("encoding")
+                source = ImageSource(
+                    self,
+                    name,
+                    match.span(),
+                    match.span("data"),
+                    None if encoding is None else encoding.decode(),
+                    (image.row_size, image.height),
+                )
+                image.data = None
+            image.source = source
+            images[name] = image
+            yield image, match.span()
+
+    def find_encoding(self) -> Optional[str]:
+        match = HeaderParser.ENCODING_BYTES_PATTERN.search(self.__mmap)
+        return None if match is None else match.group("encoding").decode()
+
+    def iter_tables(self) -> Iterator[Table]:
+        for match in HeaderParser.TABLE_BYTES_PATTERN.finditer(self.__mmap):
+            yield HeaderParser.table(
+                match.group("name").decode(),
+                match.group("entries").decode(),
+                match.span(),
+            )
+
+    def iter_fonts(self) -> Iterator[Font]:
+        if self.__mmap.find(b"GFXfont") < 0:
+            return
+        bitmaps = {
+            match.group("name"): match
+            for match in HeaderParser.FONT_BITMAPS_BYTES_PATTERN.finditer(self.__mmap)
+        }
+        glyphs = {
+            match.group("name"): match
+            for match in HeaderParser.FONT_GLYPHS_BYTES_PATTERN.finditer(self.__mmap)
+        }
+        for match in HeaderParser.FONT_BYTES_PATTERN.finditer(self.__mmap):
+            bitmaps_match = bitmaps.get(match.group("bitmaps"))
+            glyphs_match = glyphs.get(match.group("glyphs"))
+            if bitmaps_match is None or glyphs_match is None:
+                continue
+            # the font is one element, only comments may be found in between
+            parts = sorted(
+                [bitmaps_match, glyphs_match, match], key=lambda part: part.start()
+            )
+            if not all(
+                previous.end() <= part.start()
+                and not HeaderParser.COMMENT_PATTERN.sub(
+                    "", self.read((previous.end(), part.start()))
+                ).strip()
+                for previous, part in zip(parts, parts[1:])
+            ):
+                continue
+            try:
+                font = HeaderParser.font(
+                    match.group("name").decode(),
+                    match.group("bitmaps").decode(),
+                    bitmaps_match.group("data").decode(),
+                    match.group("glyphs").decode(),
+                    glyphs_match.group("entries").decode(),
+                    match.group("first").decode(),
+                    match.group("y_advance").decode(),
+                    (parts[0].start(), parts[-1].end()),
+                )
+            except ValueError:
+                continue
+            # glyphs are looked up with code - first
+            if font.last == int(match.group("last"), 0):
+                yield font
+
+    def read(self, span: Tuple[int, int]) -> str:
+        return self.read_bytes(span).decode()
+
+    def read_bytes(self, span: Tuple[int, int]) -> bytes:
+        return self.__mmap[span[0] : span[1]]
+
+    def track(self, image: Image) -> None:
+        with self.__lock:
+            self.__resident[image] = None
+            self.__resident.move_to_end(image)
+            while len(self.__resident) > self.CACHE_SIZE:
+                oldest, _ = self.__resident.popitem(last=False)
+                oldest.unload()
+
+    def touch(self, image: Image) -> None:
+        with self.__lock:
+            if image in self.__resident:
+                self.__resident.move_to_end(image)
+
+    def close(self) -> None:
+        if isinstance(self.__mmap, mmap.mmap):
+            self.__mmap.close()
+        self.__file.close()
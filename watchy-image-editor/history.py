@@ -0,0 +1,316 @@
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+import zlib
+
+from file import File
+from image import Image
+from table import Table
+
+# width, height and data of an image
+State = Tuple[int, int, bytes]
+
+
+def get_state(image: Image) -> State:
+    return image.width, image.height, bytes(image.data)
+
+
+def set_state(image: Image, state: State) -> None:
+    image.set_data(*state)
+
+
+def detach_removed(before: List[Image], after: List[Image]) -> None:
+    # images out of the file are not given a new source when it is saved, their
+    # data is decoded while the file they were read from is still open
+    present = set(after)
+    for image in before:
+        if image not in present and image.source is not None:
+            image.detach()
+
+
+class PixelDelta(NamedTuple):
+    # xor mask of the bytes a stroke changed, applying it twice is a no-op
+    image: Image
+    start: int
+    mask: bytes
+    before_crc: int
+    after_crc: int
+
+    @property
+    def size(self) -> int:
+        return len(self.mask)
+
+    def apply(self, expected_crc: int) -> bool:
+        end = self.start + len(self.mask)
+        data = self.image.data
+        if zlib.crc32(data[self.start : end]) != expected_crc:
+            # the image was changed outside of the history
+            return False
+        data[self.start : end] = (
+            int.from_bytes(data[self.start : end], "big")
+            ^ int.from_bytes(self.mask, "big")
+        ).to_bytes(len(self.mask), "big")
+        self.image.modified = True
+        return True
+
+    def undo(self) -> bool:
+        return self.apply(self.after_crc)
+
+    def redo(self) -> bool:
+        return self.apply(self.before_crc)
+
+
+class Keyframe(NamedTuple):
+    # full states, for changes of size or of most of the image
+    image: Image
+    before: State
+    after: State
+
+    @property
+    def size(self) -> int:
+        return len(self.before[2]) + len(self.after[2])
+
+    def undo(self) -> bool:
+        set_state(self.image, self.before)
+        return True
+
+    def redo(self) -> bool:
+        set_state(self.image, self.after)
+        return True
+
+
+class Rename(NamedTuple):
+    file: File
+    image: Image
+    before: str
+    after: str
+
+    @property
+    def size(self) -> int:
+        return 0
+
+    def undo(self) -> bool:
+        self.file.rename_image(self.image, self.before)
+        return True
+
+    def redo(self) -> bool:
+        self.file.rename_image(self.image, self.after)
+        return True
+
+
+class ListChange(NamedTuple):
+    # image list and table entries before and after adding, removing or moving
+    file: File
+    image: Optional[Image]
+    before: List[Image]
+    after: List[Image]
+    tables: List[Tuple[Table, List[str], List[str]]]
+
+    @property
+    def size(self) -> int:
+        return 8 * (len(self.before) + len(self.after))
+
+    def restore(self, images: List[Image], entries_index: int) -> bool:
+        detach_removed(self.file.images, images)
+        self.file.images[:] = images
+        for table, *entries in self.tables:
+            table.entries = list(entries[entries_index])
+            table.modified = True
+        return True
+
+    def undo(self) -> bool:
+        return self.restore(self.before, 0)
+
+    def redo(self) -> bool:
+        return self.restore(self.after, 1)
+
+
+class Batch(NamedTuple):
+    image: Optional[Image]
+    entries: List["Entry"]
+
+    @property
+    def size(self) -> int:
+        return sum(entry.size for entry in self.entries)
+
+    def undo(self) -> bool:
+        return all([entry.undo() for entry in reversed(self.entries)])
+
+    def redo(self) -> bool:
+        return all([entry.redo() for entry in self.entries])
+
+
+Entry = Union[PixelDelta, Keyframe, Rename, ListChange, Batch]
+
+
+class History:
+    # bytes kept for undo, oldest entries are dropped first
+    MAX_SIZE = 4 << 20
+    # fixed cost of an entry
+    ENTRY_SIZE = 64
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self.max_size = self.MAX_SIZE if max_size is None else max_size
+        self.undo_entries = deque()
+        self.redo_entries = deque()
+        self.size = 0
+        self.pending: Dict[Image, State] = {}
+
+    @property
+    def can_undo(self) -> bool:
+        return len(self.undo_entries) > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return len(self.redo_entries) > 0
+
+    def clear(self) -> None:
+        self.undo_entries.clear()
+        self.redo_entries.clear()
+        self.size = 0
+        self.pending = {}
+
+    def record(self, entry: Entry) -> None:
+        for dropped in self.redo_entries:
+            self.size -= self.ENTRY_SIZE + dropped.size
+        self.redo_entries.clear()
+        self.undo_entries.append(entry)
+        self.size += self.ENTRY_SIZE + entry.size
+        # the last change can always be undone, whatever its size
+        while self.size > self.max_size and len(self.undo_entries) > 1:
+            dropped = self.undo_entries.popleft()
+            self.size -= self.ENTRY_SIZE + dropped.size
+
+    def undo(self) -> Optional[Entry]:
+        return self.__move(self.undo_entries, self.redo_entries, True)
+
+    def redo(self) -> Optional[Entry]:
+        return self.__move(self.redo_entries, self.undo_entries, False)
+
+    def __move(self, source: deque, target: deque, undo: bool) -> Optional[Entry]:
+        if len(source) == 0:
+            return None
+        entry = source.pop()
+        if not (entry.undo() if undo else entry.redo()):
+            # deltas no longer match the images, the history is unusable
+            self.clear()
+            return None
+        target.append(entry)
+        return entry
+
+    # image edits, begin before changing an image and end after
+
+    def begin(self, image: Image) -> None:
+        if image not in self.pending:
+            self.pending[image] = get_state(image)
+
+    def cancel(self, image: Image) -> None:
+        # undo a failed edit without recording it
+        before = self.pending.pop(image, None)
+        if before is not None and get_state(image) != before:
+            set_state(image, before)
+
+    def end(
+        self, image: Image, span: Optional[Tuple[int, int]] = None
+    ) -> Optional[Entry]:
+        # span is the byte range the edit may have changed, the whole image if None
+        before = self.pending.pop(image, None)
+        if before is None:
+            return None
+        entry = self.get_change(image, before, span)
+        if entry is not None:
+            self.record(entry)
+        return entry
+
+    @staticmethod
+    def get_change(
+        image: Image, before: State, span: Optional[Tuple[int, int]] = None
+    ) -> Optional[Entry]:
+        if before[:2] != (image.width, image.height) or len(before[2]) != len(
+            image.data
+        ):
+            return Keyframe(image, before, get_state(image))
+        if span is None:
+            span = (0, len(image.data))
+        # smallest byte range of span holding every changed bit
+        offset = max(span[0], 0)
+        previous = before[2][offset : span[1]]
+        current = bytes(image.data[offset : span[1]])
+        if previous == current:
+            return None
+        diff = int.from_bytes(previous, "big") ^ int.from_bytes(current, "big")
+        low = ((diff & -diff).bit_length() - 1) // 8
+        high = (diff.bit_length() + 7) // 8
+        start, end = len(current) - high, len(current) - low
+        if end - start >= len(image.data):
+            return Keyframe(image, before, get_state(image))
+        return PixelDelta(
+            image,
+            offset + start,
+            (diff >> (8 * low)).to_bytes(end - start, "big"),
+            zlib.crc32(previous[start:end]),
+            zlib.crc32(current[start:end]),
+        )
+
+    # structural edits
+
+    def rename(self, file: File, image: Image, name: str) -> None:
+        entry = Rename(file, image, image.name, name)
+        entry.redo()
+        self.record(entry)
+
+    def change_list(
+        self, file: File, image: Optional[Image], change: Callable[[], None]
+    ) -> None:
+        # change adds, removes or moves images of file
+        before = list(file.images)
+        entries = [list(table.entries) for table in file.tables]
+        change()
+        detach_removed(before, file.images)
+        if file.images != before:
+            self.record(
+                ListChange(
+                    file,
+                    image,
+                    before,
+                    list(file.images),
+                    [
+                        (table, table_entries, list(table.entries))
+                        for table, table_entries in zip(file.tables, entries)
+                        if table.entries != table_entries
+                    ],
+                )
+            )
+
+    def snapshot(self, file: File) -> Tuple[List[Image], Dict[Image, State]]:
+        # state of a whole file before a bulk change, see record_file, the data
+        # of images not loaded yet is still in the file
+        return list(file.images), {
+            image: (
+                image.width,
+                image.height,
+                bytes(image.data) if image.loaded else None,
+            )
+            for image in file.images
+        }
+
+    def record_file(
+        self, file: File, snapshot: Tuple[List[Image], Dict[Image, State]]
+    ) -> None:
+        images, states = snapshot
+        entries: List[Entry] = []
+        for image in images:
+            width, height, data = states[image]
+            if data is None:
+                # unloaded images are unmodified, unless changed since
+                if not image.modified:
+                    continue
+                data = image.source.decode()
+            if (image.width, image.height) != (width, height) or image.data != data:
+                entries += [
+                    Keyframe(image, (width, height, bytes(data)), get_state(image))
+                ]
+        detach_removed(images, file.images)
+        if images != file.images:
+            entries += [ListChange(file, None, images, list(file.images), [])]
+        if len(entries) > 0:
+            self.record(Batch(None, entries))
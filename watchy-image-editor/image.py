@@ -1,94 +1,160 @@
-from typing import List
+from typing import Iterator, Optional, TextIO
+import io
 from math import sqrt
 
 from bitmap import Bitmap
+from dither import Dither
+from pixels import Pixels
 
 
 class Image:
+    __slots__ = ("name", "width", "height", "row_size", "modified", "source", "__data")
+
+    VALUES_PER_LINE = 16
+    HEX_VALUES = [f"0x{v:02x}" for v in range(256)]
+
     def __init__(self, name: str, width: int, height: int, empty: bool = False) -> None:
         self.name = name
         self.width = width
         self.height = height
+        self.row_size = (width + 7) // 8
         self.modified = False
+        # lazily decoded image, see HeaderIndex
+        self.source = None
         if empty:
-            self.data = [0] * ((width * height) // 8)
+            self.data = bytearray(self.row_size * height)
             self.modified = True
         else:
-            self.data = []
+            self.data = bytearray()
+
+    @property
+    def data(self) -> bytearray:
+        if self.__data is None:
+            self.__data = self.source.load(self)
+        return self.__data
+
+    @data.setter
+    def data(self, data: bytearray) -> None:
+        self.__data = data
+
+    @property
+    def loaded(self) -> bool:
+        return self.__data is not None
+
+    def unload(self) -> None:
+        # only unmodified images can be decoded again from their source
+        if self.source is not None and not self.modified:
+            self.__data = None
+
+    def detach(self) -> None:
+        if self.__data is None:
+            self.__data = self.source.decode()
+        self.source = None
 
     def finalize(self) -> None:
         if self.width == 0:
-            pixels = len(self.data) * 8
-            width = int(sqrt(pixels))
-            while width > 1 and pixels % width != 0:
-                width -= 1
-            self.width = width
-            self.height = pixels // width
+            # guess a squarish size with byte-aligned rows
+            row_size = max(int(sqrt(len(self.data) * 8)) // 8, 1)
+            while row_size > 1 and len(self.data) % row_size != 0:
+                row_size -= 1
+            self.width = row_size * 8
+            self.height = len(self.data) // row_size
+            self.row_size = row_size
+
+    def add_data(self, raw_data: bytes) -> None:
+        self.data += raw_data
 
-    def add_data(self, raw_data: List[str]) -> None:
-        for v in raw_data:
-            self.data += [int(v, 16)]
+    def row(self, y: int) -> memoryview:
+        start = y * self.row_size
+        return memoryview(self.data)[start : start + self.row_size]
 
-    def __get_position(self, x: int, y: int) -> int:
-        real_width = (len(self.data) * 8) // self.height
-        return y * real_width + x
+    def rows(self) -> Iterator[memoryview]:
+        view = memoryview(self.data)
+        for start in range(0, self.row_size * self.height, self.row_size):
+            yield view[start : start + self.row_size]
 
     def get_pixel(self, x: int, y: int) -> bool:
-        position = self.__get_position(x, y)
-        chunk_id = position // 8
-        try:
-            return self.data[chunk_id] & (1 << (7 - position % 8)) > 0
-        except:
-            return False
-
-    def set_pixel(self, x: int, y: int, v: bool) -> None:
-        position = self.__get_position(x, y)
-        chunk_id = position // 8
-        if v != self.get_pixel(x, y):
-            try:
-                if v:
-                    self.data[chunk_id] |= 1 << (7 - position % 8)
-                else:
-                    self.data[chunk_id] &= ~(1 << (7 - position % 8))
-            except:
-                pass
-            self.modified = True
+        if 0 <= x < self.width and 0 <= y < self.height:
+            chunk_id = y * self.row_size + x // 8
+            if chunk_id < len(self.data):
+                return self.data[chunk_id] & (0x80 >> (x % 8)) != 0
+        return False
+
+    def set_pixel(self, x: int, y: int, v: bool) -> bool:
+        # returns True if the pixel changed
+        if 0 <= x < self.width and 0 <= y < self.height:
+            chunk_id = y * self.row_size + x // 8
+            if chunk_id < len(self.data):
+                mask = 0x80 >> (x % 8)
+                if v != (self.data[chunk_id] & mask != 0):
+                    self.data[chunk_id] ^= mask
+                    self.modified = True
+                    return True
+        return False
 
     def __get_color_bytes(self) -> bytes:
-        output = bytes()
-        for y in range(self.height):
-            for x in range(self.width):
-                if self.get_pixel(x, y):
-                    output += bytes([0, 0, 0])
-                else:
-                    output += bytes([255, 255, 255])
-        return output
-
-    def export_bmp(self, path: str) -> None:
-        Bitmap.write_bmp(path, self.width, 3, self.__get_color_bytes())
-
-    def __set_color_bytes(self, color_depth: int, data: bytes) -> None:
-        for y in range(self.height):
-            for x in range(self.width):
-                position = (y * self.width + x) * color_depth
-                colors = data[position : position + color_depth]
-                mean_color = sum(c for c in colors) / color_depth
-                if mean_color < 128:
-                    self.set_pixel(x, y, True)
-
-    def import_bmp(self, path: str) -> None:
-        self.width, self.height, color_depth, bmp_data = Bitmap.read_bmp(path)
-        self.data = [0] * ((self.width * self.height) // 8)
-        self.__set_color_bytes(color_depth, bmp_data)
+        return Pixels.expand(self.data, self.width, self.height, self.row_size, 3)
+
+    def export_bmp(self, path: str, monochrome: bool = True) -> None:
+        if monochrome:
+            Bitmap.write_bmp(
+                path,
+                self.width,
+                Bitmap.PACKED,
+                self.data[: self.row_size * self.height],
+            )
+        else:
+            Bitmap.write_bmp(path, self.width, 3, self.__get_color_bytes())
+
+    def __set_color_bytes(
+        self, color_depth: int, data: bytes, dither: Optional[str] = None
+    ) -> None:
+        if color_depth == Bitmap.PACKED:
+            self.data = bytearray(data)
+        elif dither is not None:
+            self.data = Dither.pack(data, self.width, self.height, color_depth, dither)
+        else:
+            self.data = Pixels.pack(data, self.width, self.height, color_depth)
+
+    def import_bmp(self, path: str, dither: Optional[str] = None) -> None:
+        # dither is one of Dither.MODES, colors are thresholded by default
+        width, height, color_depth, bmp_data = Bitmap.read_bmp(path)
+        self.width = width
+        self.height = height
+        self.row_size = (width + 7) // 8
+        self.__set_color_bytes(color_depth, bmp_data, dither)
+        self.modified = True
+
+    def set_data(self, width: int, height: int, data: bytes) -> None:
+        self.width = width
+        self.height = height
+        self.row_size = (width + 7) // 8
+        self.data = bytearray(data)
+        self.modified = True
+
+    def write_cpp(
+        self, f: TextIO, encoding: Optional[str] = None, data: Optional[bytes] = None
+    ) -> int:
+        # encoded images are written with their encoding after the size
+        values = list(
+            map(self.HEX_VALUES.__getitem__, self.data if data is None else data)
+        )
+        count = self.VALUES_PER_LINE
+        written = f.write(
+            f"// '{self.name}', {self.width}x{self.height}px"
+            f"{'' if encoding is None else ', ' + encoding}\n"
+            f"const unsigned char {self.name} [] PROGMEM = {{\n\t"
+        )
+        written += f.write(
+            ",\n\t".join(
+                ", ".join(values[start : start + count])
+                for start in range(0, len(values), count)
+            )
+        )
+        written += f.write("\n};\n")
+        return written
 
     def export_cpp(self) -> str:
-        # 16 per line
-        output = [
-            f"// '{self.name}', {self.width}x{self.height}px",
-            f"const unsigned char {self.name} [] PROGMEM = {{",
-        ]
-        while len(self.data) > 16:
-            output += ["\t" + ", ".join(f"0x{v:02x}" for v in self.data[0:16]) + ","]
-            self.data = self.data[16:]
-        output += ["\t" + ", ".join(f"0x{v:02x}" for v in self.data), "};", ""]
-        return "\n".join(output)
+        output = io.StringIO()
+        self.write_cpp(output)
+        return output.getvalue()
@@ -1,31 +1,45 @@
 import tkinter as tk
 from tkinter import ttk
+from fractions import Fraction
+from typing import Callable, Iterator, Optional, Tuple
 
+from history import History
 from image import Image
+from pixels import Pixels
 
 
 class ImageView(ttk.Frame):
     INITIAL_DRAW_SCALE = 3
+    # motion events are applied at most once per frame
+    FRAME_DELAY = 16
 
-    def __init__(self, parent) -> None:
+    def __init__(self, parent, history: History, busy: Callable[[], bool]) -> None:
         super().__init__(parent, height=650, width=650)
 
+        self.history = history
+        # images are not edited while a task reads or writes the file
+        self.busy = busy
+
         self.draw_scale = self.INITIAL_DRAW_SCALE
 
         self.current_image = None
+        self.photo = None
+
+        self.stroke_value = None
+        self.last_point = None
+        self.pending_points = []
+        self.flush_id = None
+        # rows changed by the current stroke, only those are diffed for undo
+        self.stroke_rows = None
 
         self.canvas = tk.Canvas(self, width=0, height=0, background="white")
         self.canvas.place(in_=self, anchor="c", relx=0.5, rely=0.5)
         self.canvas.bind("<Button-1>", self.click_canvas_b1)
         self.canvas.bind("<B1-Motion>", self.click_canvas_b1)
-        self.canvas.bind(
-            "<ButtonRelease-1>", lambda event: self.update(self.current_image)
-        )
+        self.canvas.bind("<ButtonRelease-1>", self.release_canvas)
         self.canvas.bind("<Button-3>", self.click_canvas_b3)
         self.canvas.bind("<B3-Motion>", self.click_canvas_b3)
-        self.canvas.bind(
-            "<ButtonRelease-3>", lambda event: self.update(self.current_image)
-        )
+        self.canvas.bind("<ButtonRelease-3>", self.release_canvas)
 
         self.canvas.bind("<MouseWheel>", self.zoom_canvas)
         self.canvas.bind("<Button-4>", self.zoom_canvas_up)
@@ -38,12 +52,15 @@ class ImageView(ttk.Frame):
     def update(self, image: Image) -> None:
         if self.current_image != image:
             self.draw_scale = self.INITIAL_DRAW_SCALE
+            self.end_stroke()
         if image is None:
             self.canvas.configure(
                 width=0,
                 height=0,
                 background="white",
             )
+            self.canvas.delete("all")
+            self.photo = None
         else:
             try:
                 self.canvas.configure(
@@ -52,21 +69,68 @@ class ImageView(ttk.Frame):
                     background="white",
                 )
                 self.canvas.delete("all")
-                for x in range(image.width):
-                    for y in range(image.height):
-                        if image.get_pixel(x, y):
-                            self.canvas.create_rectangle(
-                                x * self.draw_scale + 1,
-                                y * self.draw_scale + 1,
-                                (x + 1) * self.draw_scale + 1,
-                                (y + 1) * self.draw_scale + 1,
-                                fill="black",
-                                outline="",
-                            )
+                self.photo = self.get_photo(image)
+                self.canvas.create_image(1, 1, anchor="nw", image=self.photo)
             except tk.TclError:
                 pass
         self.current_image = image
 
+    def get_photo(
+        self,
+        image: Image,
+        x0: int = 0,
+        y0: int = 0,
+        x1: Optional[int] = None,
+        y1: Optional[int] = None,
+    ) -> tk.PhotoImage:
+        # binary PGM of the [x0, x1[ x [y0, y1[ region, one byte per pixel
+        x1 = image.width if x1 is None else x1
+        y1 = image.height if y1 is None else y1
+        if x0 == 0 and x1 == image.width:
+            pixels = Pixels.expand(
+                image.data[y0 * image.row_size : y1 * image.row_size],
+                image.width,
+                y1 - y0,
+                image.row_size,
+                1,
+            )
+        else:
+            start, end = x0 // 8, (x1 + 7) // 8
+            offset = x0 - start * 8
+            pixels = b"".join(
+                Pixels.expand(
+                    image.row(y)[start:end], (end - start) * 8, 1, end - start, 1
+                )[offset : offset + x1 - x0]
+                for y in range(y0, y1)
+            )
+        photo = tk.PhotoImage(
+            data=f"P5 {x1 - x0} {y1 - y0} 255\n".encode() + pixels,
+            format="PPM",
+        )
+        scale = Fraction(self.draw_scale).limit_denominator(16)
+        if scale.numerator > 1:
+            photo = photo.zoom(scale.numerator)
+        if scale.denominator > 1:
+            photo = photo.subsample(scale.denominator)
+        return photo
+
+    def draw_region(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        if self.photo is None:
+            return
+        # align on the subsample step so the region matches the full render
+        step = Fraction(self.draw_scale).limit_denominator(16).denominator
+        x0 -= x0 % step
+        y0 -= y0 % step
+        region = self.get_photo(self.current_image, x0, y0, x1, y1)
+        self.photo.tk.call(
+            self.photo,
+            "copy",
+            region,
+            "-to",
+            int(x0 * self.draw_scale),
+            int(y0 * self.draw_scale),
+        )
+
     def click_canvas_b1(self, event):
         self.click_canvas(True, event)
 
@@ -74,19 +138,85 @@ class ImageView(ttk.Frame):
         self.click_canvas(False, event)
 
     def click_canvas(self, value: bool, event):
-        if self.current_image is None:
+        if self.current_image is None or self.busy():
             return
-        x = int(event.x / self.draw_scale)
-        y = int(event.y / self.draw_scale)
-        self.current_image.set_pixel(x, y, value)
-        self.canvas.create_rectangle(
-            x * self.draw_scale + 1,
-            y * self.draw_scale + 1,
-            (x + 1) * self.draw_scale + 1,
-            (y + 1) * self.draw_scale + 1,
-            fill=("black" if value else "white"),
-            outline="",
-        )
+        if self.stroke_value != value:
+            self.end_stroke()
+            self.stroke_value = value
+            self.history.begin(self.current_image)
+        self.pending_points += [
+            (int(event.x / self.draw_scale), int(event.y / self.draw_scale))
+        ]
+        if self.flush_id is None:
+            self.flush_id = self.after(self.FRAME_DELAY, self.flush_stroke)
+
+    def release_canvas(self, event):
+        if not self.busy():
+            self.end_stroke()
+
+    def end_stroke(self) -> None:
+        if self.flush_id is not None:
+            self.after_cancel(self.flush_id)
+        self.flush_stroke()
+        if self.stroke_value is not None and self.current_image is not None:
+            # one undo step per stroke
+            y0, y1 = self.stroke_rows or (0, 0)
+            row_size = self.current_image.row_size
+            self.history.end(self.current_image, (y0 * row_size, y1 * row_size))
+        self.stroke_value = None
+        self.stroke_rows = None
+        self.last_point = None
+
+    def flush_stroke(self) -> None:
+        self.flush_id = None
+        points, self.pending_points = self.pending_points, []
+        if self.current_image is None or len(points) == 0:
+            return
+        dirty = None
+        for point in points:
+            for x, y in self.get_line(self.last_point or point, point):
+                if self.current_image.set_pixel(x, y, self.stroke_value):
+                    if dirty is None:
+                        dirty = [x, y, x + 1, y + 1]
+                    else:
+                        dirty = [
+                            min(dirty[0], x),
+                            min(dirty[1], y),
+                            max(dirty[2], x + 1),
+                            max(dirty[3], y + 1),
+                        ]
+            self.last_point = point
+        if dirty is not None:
+            if self.stroke_rows is None:
+                self.stroke_rows = (dirty[1], dirty[3])
+            else:
+                self.stroke_rows = (
+                    min(self.stroke_rows[0], dirty[1]),
+                    max(self.stroke_rows[1], dirty[3]),
+                )
+            self.draw_region(*dirty)
+
+    @staticmethod
+    def get_line(
+        start: Tuple[int, int], end: Tuple[int, int]
+    ) -> Iterator[Tuple[int, int]]:
+        # Bresenham, so fast strokes leave no gaps between motion events
+        x, y = start
+        dx, dy = abs(end[0] - x), -abs(end[1] - y)
+        sx = 1 if x < end[0] else -1
+        sy = 1 if y < end[1] else -1
+        error = dx + dy
+        while True:
+            yield x, y
+            if (x, y) == end:
+                return
+            e2 = 2 * error
+            if e2 >= dy:
+                error += dy
+                x += sx
+            if e2 <= dx:
+                error += dx
+                y += sy
 
     def zoom_canvas(self, event):
         if event.delta > 0:
@@ -1,9 +1,16 @@
-import tkinter as tk
-import os.path
-
-from app import App
+import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # headless mode, tkinter is never imported
+        from cli import main
+
+        sys.exit(main(sys.argv[1:]))
+
+    import tkinter as tk
+
+    from app import App
+
     app = App(tk.Tk())
 
     app.mainloop()
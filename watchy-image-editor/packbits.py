@@ -0,0 +1,154 @@
+from typing import Iterator, List, Tuple
+import re
+
+from image import Image
+
+
+class PackBitsError(Exception):
+    pass
+
+
+class PackBits:
+    NAME = "packbits"
+    MAX_RUN = 128
+    # runs shorter than 3 bytes are cheaper as literals
+    RUN_PATTERN = re.compile(rb"(.)\1{2,}", re.DOTALL)
+    DECODER = """\
+// PackBits decoder for images exported by watchy-image-editor
+#ifndef WATCHY_PACKBITS_H
+#define WATCHY_PACKBITS_H
+
+#include <Arduino.h>
+
+// rows are encoded separately, one row never exceeds this size
+#ifndef PACKBITS_MAX_ROW
+#define PACKBITS_MAX_ROW 64
+#endif
+
+// decodes size bytes from a PROGMEM stream, returns the next packet
+static inline const uint8_t *packbits_unpack(const uint8_t *src, uint8_t *dst, uint16_t size)
+{
+    while (size > 0)
+    {
+        int8_t header = (int8_t)pgm_read_byte(src++);
+        if (header >= 0)
+        {
+            uint16_t count = header + 1;
+            size -= count;
+            while (count--)
+                *dst++ = pgm_read_byte(src++);
+        }
+        else if (header != -128)
+        {
+            uint16_t count = 1 - header;
+            uint8_t value = pgm_read_byte(src++);
+            size -= count;
+            while (count--)
+                *dst++ = value;
+        }
+    }
+    return src;
+}
+
+// same arguments as drawBitmap, for images exported with packbits
+template <typename Display>
+void drawPackedBitmap(Display &display, int16_t x, int16_t y, const uint8_t *bitmap, int16_t w, int16_t h, uint16_t color)
+{
+    uint8_t row[PACKBITS_MAX_ROW];
+    for (int16_t j = 0; j < h; j++)
+    {
+        bitmap = packbits_unpack(bitmap, row, (w + 7) / 8);
+        display.drawBitmap(x, y + j, row, w, 1, color);
+    }
+}
+
+#endif
+"""
+
+    @classmethod
+    def iter_packets(cls, row: bytes) -> Iterator[bytes]:
+        position = 0
+        for match in cls.RUN_PATTERN.finditer(row):
+            start, end = match.span()
+            # literal bytes before the run
+            for literal in range(position, start, cls.MAX_RUN):
+                chunk = row[literal : min(literal + cls.MAX_RUN, start)]
+                yield bytes([len(chunk) - 1]) + chunk
+            for run in range(start, end, cls.MAX_RUN):
+                count = min(cls.MAX_RUN, end - run)
+                if count < 3:
+                    yield bytes([count - 1]) + row[run : run + count]
+                else:
+                    yield bytes([257 - count, row[start]])
+            position = end
+        for literal in range(position, len(row), cls.MAX_RUN):
+            chunk = row[literal : literal + cls.MAX_RUN]
+            yield bytes([len(chunk) - 1]) + chunk
+
+    @classmethod
+    def encode(cls, data: bytes, row_size: int) -> bytes:
+        view = memoryview(data)
+        return b"".join(
+            packet
+            for start in range(0, len(data), row_size)
+            for packet in cls.iter_packets(bytes(view[start : start + row_size]))
+        )
+
+    @classmethod
+    def decode(cls, data: bytes, row_size: int, height: int) -> bytearray:
+        output = bytearray()
+        size = row_size * height
+        position = 0
+        row_end = row_size
+        while len(output) < size:
+            if position >= len(data):
+                raise PackBitsError("truncated data")
+            header = data[position]
+            if header < 128:
+                count = header + 1
+                output += data[position + 1 : position + 1 + count]
+                position += 1 + count
+            elif header > 128:
+                count = 257 - header
+                output += data[position + 1 : position + 2] * count
+                position += 2
+            else:
+                position += 1
+                continue
+            if len(output) > row_end:
+                raise PackBitsError("packet crosses a row boundary")
+            if len(output) == row_end:
+                row_end += row_size
+        if position != len(data):
+            raise PackBitsError(f"{len(data) - position} trailing bytes")
+        return output
+
+    @classmethod
+    def encode_image(cls, image: Image) -> bytes:
+        return cls.encode(image.data, image.row_size)
+
+    @classmethod
+    def verify(cls, images: List[Image]) -> List[str]:
+        # names of images that do not survive a round trip
+        errors = []
+        for image in images:
+            try:
+                data = cls.decode(cls.encode_image(image), image.row_size, image.height)
+                if data != image.data:
+                    errors += [image.name]
+            except PackBitsError:
+                errors += [image.name]
+        return errors
+
+    @classmethod
+    def report(cls, images: List[Image]) -> List[Tuple[str, int, int]]:
+        # (name, raw bytes, encoded bytes) per image
+        return [
+            (image.name, len(image.data), len(cls.encode_image(image)))
+            for image in images
+        ]
+
+    @classmethod
+    def write_decoder(cls, path: str) -> None:
+        with open(path, mode="w") as f:
+            f.write(cls.DECODER)
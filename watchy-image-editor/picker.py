@@ -0,0 +1,161 @@
+from typing import Dict, List, NamedTuple, Optional
+import base64
+import datetime
+import json
+import math
+import os.path
+
+from file import File
+from image import Image
+from simulator import Frame
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+
+class Pick(NamedTuple):
+    # image table of a watchface and the random function choosing its entry
+    name: str
+    table: str
+    hourly: bool = False
+
+
+class Picker:
+    # TimeLib years start in 1970, the seed is an uint32_t
+    EPOCH = 1970
+    SEED_MASK = 0xFFFFFFFF
+    # JSON tables and atlas of the docs page
+    COLUMNS = 16
+    VERSION = 1
+
+    @classmethod
+    def random(
+        cls,
+        day: datetime.date,
+        hour: Optional[int] = None,
+        minute: Optional[int] = None,
+    ) -> float:
+        # random(), randomDay(), randomHour() and randomMinute() of the watchfaces
+        seed = day.year - cls.EPOCH
+        seed = (seed * 12 + day.month) & cls.SEED_MASK
+        seed = (seed * 31 + day.day) & cls.SEED_MASK
+        if hour is not None:
+            seed = (seed * 24 + hour) & cls.SEED_MASK
+            if minute is not None:
+                seed = (seed * 60 + minute) & cls.SEED_MASK
+        v = math.pow(seed, 6.0 / 7.0)
+        v *= math.sin(v) + 1
+        return v - math.floor(v)
+
+    @classmethod
+    def pick(
+        cls,
+        count: int,
+        day: datetime.date,
+        hour: Optional[int] = None,
+        minute: Optional[int] = None,
+    ) -> int:
+        return int(cls.random(day, hour, minute) * count)
+
+    @classmethod
+    def build_table(
+        cls, count: int, start: datetime.date, days: int, hourly: bool = False
+    ) -> bytes:
+        # one entry per day, or 24 per day, starting at start
+        if count > 256:
+            raise ValueError(f"{count} images do not fit in a byte")
+        one_day = datetime.timedelta(days=1)
+        table = bytearray()
+        for i in range(days):
+            day = start + i * one_day
+            if hourly:
+                table += bytes(cls.pick(count, day, hour) for hour in range(24))
+            else:
+                table.append(cls.pick(count, day))
+        return bytes(table)
+
+    @classmethod
+    def build_atlas(cls, images: List[Image], columns: int = COLUMNS) -> Frame:
+        # images in a grid of cells of the largest image size, top left aligned
+        width = max(image.width for image in images)
+        height = max(image.height for image in images)
+        rows = (len(images) + columns - 1) // columns
+        atlas = Frame(min(columns, len(images)) * width, rows * height)
+        for i, image in enumerate(images):
+            atlas.blit(
+                image.data,
+                (i % columns) * width,
+                (i // columns) * height,
+                image.width,
+                image.height,
+            )
+        return atlas
+
+    @staticmethod
+    def write_atlas(atlas: Frame, path: str) -> None:
+        if not path.lower().endswith(".png"):
+            atlas.to_image("atlas").export_bmp(path)
+            return
+        if PILImage is None:
+            raise ValueError("PIL is needed for .png atlases")
+        # set bits are white in PIL 1-bit images
+        data = atlas.data.translate(bytes(255 - v for v in range(256)))
+        PILImage.frombytes("1", (atlas.width, atlas.height), data).save(path)
+
+    @classmethod
+    def export(
+        cls,
+        name: str,
+        file: File,
+        picks: List[Pick],
+        start: datetime.date,
+        end: datetime.date,
+        directory: str,
+        atlas_format: str = "png",
+        columns: int = COLUMNS,
+    ) -> Dict:
+        # name.json with the tables of every pick and name.png with the images of
+        # every pick, entry k of the day d of a pick is the atlas cell
+        # offset + table[d * stride + k]
+        tables = {table.name: table for table in file.tables}
+        images = {image.name: image for image in file.images}
+        days = (end - start).days + 1
+        sprites: List[Image] = []
+        entries = {}
+        for pick in picks:
+            if pick.table not in tables:
+                raise ValueError(f"unknown table {pick.table!r}")
+            names = tables[pick.table].entries
+            missing = [entry for entry in names if entry not in images]
+            if len(missing) > 0:
+                raise ValueError(f"unknown images {missing[:5]} in {pick.table}")
+            table = cls.build_table(len(names), start, days, pick.hourly)
+            entries[pick.name] = {
+                "table": pick.table,
+                "offset": len(sprites),
+                "count": len(names),
+                "stride": 24 if pick.hourly else 1,
+                "data": base64.b64encode(table).decode(),
+            }
+            sprites += [images[entry] for entry in names]
+
+        atlas = cls.build_atlas(sprites, columns)
+        atlas_name = f"{name}.{atlas_format}"
+        cls.write_atlas(atlas, os.path.join(directory, atlas_name))
+        index = {
+            "version": cls.VERSION,
+            "start": start.isoformat(),
+            "days": days,
+            "atlas": atlas_name,
+            "cell": [
+                max(image.width for image in sprites),
+                max(image.height for image in sprites),
+            ],
+            "columns": columns,
+            "picks": entries,
+        }
+        with open(os.path.join(directory, f"{name}.json"), mode="w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        return index
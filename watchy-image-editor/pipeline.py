@@ -0,0 +1,328 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from operator import itemgetter
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+import time
+
+from bitmap import Bitmap, BitmapError
+from bulk import Bulk, BulkResult
+from dither import Dither
+from file import File
+from image import Image
+from pixels import Pixels, numpy
+from transform import Transform
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+# (operation, *arguments), see Pipeline.apply_step
+Step = Tuple
+
+
+class Raster(NamedTuple):
+    width: int
+    height: int
+    # gray levels, one byte per pixel, or packed rows once thresholded
+    data: bytes
+    packed: bool = False
+
+
+class Job(NamedTuple):
+    name: str
+    path: str
+    steps: Tuple[Step, ...]
+
+
+def run_job(job: Job) -> BulkResult:
+    start = time.perf_counter()
+    try:
+        raster = Pipeline.load(job.path)
+        for step in job.steps:
+            raster = Pipeline.apply_step(raster, step)
+        raster = Pipeline.threshold(raster)
+    except (BitmapError, OSError, ValueError) as e:
+        return BulkResult(job.path, job.name, time.perf_counter() - start, str(e))
+    return BulkResult(
+        job.path,
+        job.name,
+        time.perf_counter() - start,
+        width=raster.width,
+        height=raster.height,
+        data=bytes(raster.data),
+    )
+
+
+class Pipeline:
+    # pad and canvas place the image in a new canvas, resize scales it
+    SIZE_STEPS = ["pad", "resize", "canvas"]
+    DEFAULT_ANCHORS = {"pad": "c", "canvas": "nw"}
+    MANIFEST_VERSION = 1
+
+    def __init__(self, steps: List[Step]) -> None:
+        for step in steps:
+            self.check_step(step)
+        self.steps = tuple(tuple(step) for step in steps)
+
+    def job(self, name: str, path: str) -> Job:
+        return Job(name, path, self.steps)
+
+    @classmethod
+    def check_step(cls, step: Step) -> None:
+        operation, *arguments = step
+        if operation in cls.SIZE_STEPS:
+            if len(arguments) not in (2, 3) or min(arguments[:2]) <= 0:
+                raise ValueError(f"invalid step {step!r}, expected size")
+            if len(arguments) == 3 and arguments[2] not in Transform.ANCHORS:
+                raise ValueError(f"invalid step {step!r}, unknown anchor")
+        elif operation == "threshold":
+            if len(arguments) > 1:
+                raise ValueError(f"invalid step {step!r}")
+            # pixels darker than the level are black, 0 to 256 included
+            if len(arguments) == 1 and (
+                not isinstance(arguments[0], int)
+                or isinstance(arguments[0], bool)
+                or not 0 <= arguments[0] <= 256
+            ):
+                raise ValueError(f"invalid step {step!r}, level out of 0-256")
+        elif operation == "dither":
+            if len(arguments) != 1 or arguments[0] not in Dither.MODES:
+                raise ValueError(f"invalid step {step!r}, unknown dithering mode")
+        else:
+            raise ValueError(f"invalid step {step!r}, unknown operation")
+
+    @classmethod
+    def parse_step(cls, text: str) -> Step:
+        # pad:56x56:c, resize:68x68, threshold:128, dither:atkinson, canvas:80x68:nw
+        operation, *arguments = text.split(":")
+        if operation in cls.SIZE_STEPS and len(arguments) > 0:
+            step = (operation, *Transform.parse_size(arguments[0]), *arguments[1:])
+        elif operation == "dither":
+            step = (operation, *arguments)
+        else:
+            step = (operation, *map(int, arguments))
+        cls.check_step(step)
+        return step
+
+    @classmethod
+    def load(cls, path: str) -> Raster:
+        if path.lower().endswith(".bmp"):
+            width, height, color_depth, data = Bitmap.read_bmp(path)
+            if color_depth == Bitmap.PACKED:
+                return Raster(width, height, data, True)
+            return Raster(width, height, Pixels.gray(data, width, height, color_depth))
+        if PILImage is None:
+            raise ValueError("PIL is needed for non .bmp sources")
+        with PILImage.open(path) as source:
+            if "A" not in source.getbands() and "transparency" not in source.info:
+                image = source.convert("L")
+            else:
+                # transparent pixels are white, like the watch background
+                image = PILImage.new("RGBA", source.size, "white")
+                image.alpha_composite(source.convert("RGBA"))
+                image = image.convert("L")
+            return Raster(image.width, image.height, image.tobytes())
+
+    @classmethod
+    def apply_step(cls, raster: Raster, step: Step) -> Raster:
+        operation, *arguments = step
+        if operation == "threshold":
+            return cls.threshold(raster, *arguments)
+        if operation == "dither":
+            return cls.dither(raster, *arguments)
+        width, height = arguments[:2]
+        if operation == "resize":
+            return cls.resize(raster, width, height)
+        anchor = arguments[2] if len(arguments) > 2 else cls.DEFAULT_ANCHORS[operation]
+        x, y = Transform.get_offset(raster.width, raster.height, width, height, anchor)
+        return cls.window(raster, x, y, width, height)
+
+    @classmethod
+    def threshold(cls, raster: Raster, level: int = Pixels.THRESHOLD) -> Raster:
+        # pixels darker than level are black
+        if raster.packed:
+            return raster
+        data = raster.data
+        if level != Pixels.THRESHOLD:
+            data = data.translate(
+                bytes([Pixels.BLACK]) * level + bytes([Pixels.WHITE]) * (256 - level)
+            )
+        return Raster(
+            raster.width,
+            raster.height,
+            Pixels.pack(data, raster.width, raster.height, 1),
+            True,
+        )
+
+    @classmethod
+    def dither(cls, raster: Raster, mode: str) -> Raster:
+        if raster.packed:
+            return raster
+        return Raster(
+            raster.width,
+            raster.height,
+            Dither.pack(raster.data, raster.width, raster.height, 1, mode),
+            True,
+        )
+
+    @classmethod
+    def window(cls, raster: Raster, x: int, y: int, width: int, height: int) -> Raster:
+        # same as Transform.window, white outside of the image
+        if raster.packed:
+            return Raster(
+                width,
+                height,
+                Transform.window(
+                    raster.data, raster.width, raster.height, x, y, width, height
+                ),
+                True,
+            )
+        white = bytes([Pixels.WHITE])
+        start, end = max(0, x), min(raster.width, x + width)
+        if start >= end:
+            return Raster(width, height, white * (width * height))
+        left = white * (start - x)
+        right = white * (width - (start - x) - (end - start))
+        blank = white * width
+        data = raster.data
+        return Raster(
+            width,
+            height,
+            b"".join(
+                (
+                    left
+                    + data[j * raster.width + start : j * raster.width + end]
+                    + right
+                    if 0 <= j < raster.height
+                    else blank
+                )
+                for j in range(y, y + height)
+            ),
+        )
+
+    @classmethod
+    def resize(cls, raster: Raster, width: int, height: int) -> Raster:
+        if raster.packed:
+            return Raster(
+                width,
+                height,
+                Transform.scale_data(
+                    raster.data, raster.width, raster.height, width, height
+                ),
+                True,
+            )
+        # same sampling as Transform.scale_data
+        columns = Transform.get_sources(raster.width, width)
+        if Pixels.use_numpy:
+            pixels = numpy.frombuffer(raster.data, dtype=numpy.uint8)
+            pixels = pixels.reshape(raster.height, raster.width)
+            rows = Transform.get_sources(raster.height, height)
+            return Raster(width, height, pixels[numpy.ix_(rows, columns)].tobytes())
+        # a 1-tuple from itemgetter would be a single value
+        pick = itemgetter(*columns, 0)
+        data = raster.data
+        scaled: Dict[int, bytes] = {}
+        rows = []
+        for j in Transform.get_sources(raster.height, height):
+            if j not in scaled:
+                row = data[j * raster.width : (j + 1) * raster.width]
+                scaled[j] = bytes(pick(row)[:-1])
+            rows += [scaled[j]]
+        return Raster(width, height, b"".join(rows))
+
+    @staticmethod
+    def get_key(job: Job) -> str:
+        # a source is processed again when its content or its steps change
+        with open(job.path, mode="rb") as f:
+            content = f.read()
+        return hashlib.sha1(repr(job.steps).encode() + b"\0" + content).hexdigest()
+
+    @classmethod
+    def load_manifest(cls, path: Optional[str]) -> Dict[str, str]:
+        if path is None:
+            return {}
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != cls.MANIFEST_VERSION:
+            return {}
+        return manifest.get("images", {})
+
+    @classmethod
+    def store_manifest(cls, path: str, keys: Dict[str, str]) -> None:
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                suffix=".tmp", dir=os.path.dirname(os.path.abspath(path))
+            )
+            try:
+                with os.fdopen(fd, mode="w") as f:
+                    json.dump(
+                        {"version": cls.MANIFEST_VERSION, "images": keys},
+                        f,
+                        indent=1,
+                        sort_keys=True,
+                    )
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError:
+            # the manifest is only an optimization
+            pass
+
+    @classmethod
+    def run(
+        cls,
+        file: File,
+        jobs: List[Job],
+        manifest_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> List[BulkResult]:
+        # results of the jobs that were not skipped, images are set in the file
+        # as results arrive, new ones are added in job order
+        manifest = cls.load_manifest(manifest_path)
+        images = {image.name: image for image in file.images}
+        keys: Dict[str, Optional[str]] = {}
+        pending = []
+        for job in jobs:
+            try:
+                keys[job.name] = cls.get_key(job)
+            except OSError:
+                # reported by the job itself
+                keys[job.name] = None
+            if (
+                keys[job.name] is None
+                or job.name not in images
+                or manifest.get(job.name) != keys[job.name]
+            ):
+                pending += [job]
+
+        results = []
+        for result in Bulk.run_jobs(run_job, pending, workers):
+            results += [result]
+            if result.error is None:
+                image = images.get(result.name)
+                if image is None:
+                    image = Image(result.name, result.width, result.height)
+                    file.images += [image]
+                    images[image.name] = image
+                if (image.width, image.height, image.data) != (
+                    result.width,
+                    result.height,
+                    result.data,
+                ):
+                    image.set_data(result.width, result.height, result.data)
+                manifest[result.name] = keys[result.name]
+            if progress is not None:
+                progress(len(results), len(pending))
+
+        if manifest_path is not None:
+            cls.store_manifest(manifest_path, manifest)
+        return results
@@ -0,0 +1,119 @@
+from typing import Dict, List
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Pixels:
+    BLACK = 0
+    WHITE = 255
+    THRESHOLD = 128
+
+    use_numpy = numpy is not None
+
+    __expand_tables: Dict[int, List[bytes]] = {}
+    # gray level -> ascii bit, packed later with int(..., 2)
+    __threshold_table = b"1" * THRESHOLD + b"0" * (256 - THRESHOLD)
+
+    @classmethod
+    def expand_table(cls, color_depth: int) -> List[bytes]:
+        if color_depth not in cls.__expand_tables:
+            cls.__expand_tables[color_depth] = [
+                b"".join(
+                    bytes([cls.BLACK if v & (0x80 >> i) else cls.WHITE]) * color_depth
+                    for i in range(8)
+                )
+                for v in range(256)
+            ]
+        return cls.__expand_tables[color_depth]
+
+    @classmethod
+    def expand(
+        cls, data: bytes, width: int, height: int, row_size: int, color_depth: int
+    ) -> bytes:
+        size = row_size * height
+        if len(data) < size:
+            data = bytes(data) + bytes(size - len(data))
+        if cls.use_numpy:
+            return cls.__expand_numpy(data, width, height, row_size, color_depth)
+        table = cls.expand_table(color_depth)
+        view = memoryview(data)[:size]
+        if width == row_size * 8:
+            return b"".join(map(table.__getitem__, view))
+        row_length = width * color_depth
+        return b"".join(
+            b"".join(map(table.__getitem__, view[start : start + row_size]))[
+                :row_length
+            ]
+            for start in range(0, size, row_size)
+        )
+
+    @classmethod
+    def __expand_numpy(
+        cls, data: bytes, width: int, height: int, row_size: int, color_depth: int
+    ) -> bytes:
+        bits = numpy.frombuffer(data, dtype=numpy.uint8, count=row_size * height)
+        bits = numpy.unpackbits(bits.reshape(height, row_size), axis=1)[:, :width]
+        colors = numpy.where(bits, cls.BLACK, cls.WHITE).astype(numpy.uint8)
+        return numpy.repeat(colors, color_depth, axis=1).tobytes()
+
+    @classmethod
+    def gray(cls, data: bytes, width: int, height: int, color_depth: int) -> bytes:
+        # mean of the channels, one byte per pixel
+        if color_depth == 1:
+            return bytes(data[: width * height])
+        if cls.use_numpy:
+            colors = numpy.frombuffer(
+                data, dtype=numpy.uint8, count=width * height * color_depth
+            )
+            colors = colors.reshape(width * height, color_depth).sum(
+                axis=1, dtype=numpy.uint32
+            )
+            return (colors // color_depth).astype(numpy.uint8).tobytes()
+        size = width * height * color_depth
+        channels = [data[c:size:color_depth] for c in range(color_depth)]
+        if all(channel == channels[0] for channel in channels):
+            return bytes(channels[0])
+        return bytes(sum(pixel) // color_depth for pixel in zip(*channels))
+
+    @classmethod
+    def pack(cls, data: bytes, width: int, height: int, color_depth: int) -> bytearray:
+        row_size = (width + 7) // 8
+        if width == 0 or height == 0:
+            return bytearray()
+        size = width * height * color_depth
+        if len(data) < size:
+            data = bytes(data) + bytes([cls.WHITE]) * (size - len(data))
+        if cls.use_numpy:
+            return cls.__pack_numpy(data, width, height, color_depth)
+        row_length = width * color_depth
+        limit = cls.THRESHOLD * color_depth
+        padding = b"0" * (row_size * 8 - width)
+        output = bytearray()
+        for start in range(0, row_length * height, row_length):
+            row = data[start : start + row_length]
+            channels = [row[c::color_depth] for c in range(color_depth)]
+            if all(channel == channels[0] for channel in channels):
+                bits = channels[0].translate(cls.__threshold_table)
+            else:
+                bits = bytes(
+                    ord("1") if sum(pixel) < limit else ord("0")
+                    for pixel in zip(*channels)
+                )
+            output += int(bits + padding, 2).to_bytes(row_size, byteorder="big")
+        return output
+
+    @classmethod
+    def __pack_numpy(
+        cls, data: bytes, width: int, height: int, color_depth: int
+    ) -> bytearray:
+        colors = numpy.frombuffer(
+            data, dtype=numpy.uint8, count=width * height * color_depth
+        )
+        colors = colors.reshape(height, width, color_depth).sum(
+            axis=2, dtype=numpy.uint32
+        )
+        bits = colors < cls.THRESHOLD * color_depth
+        return bytearray(numpy.packbits(bits, axis=1).tobytes())
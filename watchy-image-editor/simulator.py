@@ -0,0 +1,268 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import itertools
+import re
+
+from file import File
+from font import Font
+from image import Image
+from transform import Transform
+
+# (operation, *arguments), see Simulator.apply
+Operation = Tuple
+
+
+class Layout(NamedTuple):
+    operations: Tuple[Operation, ...]
+    # values of the variables used by the operations, see Simulator.batch
+    variables: Dict[str, Sequence[int]]
+
+
+# drawWatchFace of the watchfaces, text that is not computed from the date and
+# the step/battery bars are left out
+POKEMON = Layout(
+    (
+        ("bitmap", 0, 0, "pokemon", 200, 200),
+        ("bitmap", 10, 60, "pokemon_back[{back}]", 80, 68),
+        ("bitmap", 120, 10, "pokemon_front[{front}]", 80, 68),
+        ("text", 130, 120, "FreeMonoBold7pt7b", "{day:2d}/ {month:2d}"),
+        ("text", 14, 165, "FreeMonoBold10pt7b", "{hour:02d}:{minute:02d}"),
+        ("bitmap", 90, 148, "cursor", 8, 9),
+    ),
+    {
+        "back": range(151),
+        "front": range(151),
+        "hour": [10],
+        "minute": [9],
+        "day": [18],
+        "month": [10],
+    },
+)
+TETRIS = Layout(
+    (
+        ("bitmap", 0, 0, "tetrisbg", 200, 200),
+        ("bitmap", 25, 20, "tetris_nums_0[{hour_tens}]", 40, 60),
+        ("bitmap", 75, 20, "tetris_nums_1[{hour_units}]", 40, 60),
+        ("bitmap", 25, 110, "tetris_nums_2[{minute_tens}]", 40, 60),
+        ("bitmap", 75, 110, "tetris_nums_3[{minute_units}]", 40, 60),
+        ("bitmap", 150, 140, "pieces[{piece}]", 40, 40),
+    ),
+    {
+        "hour_tens": range(3),
+        "hour_units": range(10),
+        "minute_tens": range(6),
+        "minute_units": range(10),
+        "piece": [0],
+    },
+)
+LAYOUTS = {"pokemon": POKEMON, "tetris": TETRIS}
+
+
+class Frame:
+    # 1-bit framebuffer, the whole frame is one big int and rows are byte-aligned
+    BLACK = 1
+    WHITE = 0
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.row_size = (width + 7) // 8
+        # bits per row, padding included
+        self.stride = 8 * self.row_size
+        self.mask = (1 << (self.stride * height)) - 1
+        self.bits = 0
+
+    def fill(self, color: int) -> None:
+        # padding bits of the rows stay blank
+        if color == self.BLACK:
+            row = ((1 << self.width) - 1) << (self.stride - self.width)
+            self.bits = int.from_bytes(
+                row.to_bytes(self.row_size, "big") * self.height, "big"
+            )
+        else:
+            self.bits = 0
+
+    def spread(self, data: bytes, width: int, height: int) -> int:
+        # packed rows at the frame stride, on the top rows of an empty frame
+        row_size = (width + 7) // 8
+        padding = bytes(self.row_size - row_size)
+        view = memoryview(data)
+        rows = b"".join(
+            bytes(view[start : start + row_size]) + padding
+            for start in range(0, row_size * height, row_size)
+        )
+        return int.from_bytes(rows, "big") << (self.stride * (self.height - height))
+
+    def blit_sprite(self, sprite: int, x: int, y: int, color: int = BLACK) -> None:
+        # sprite from spread, fully inside the frame horizontally
+        shift = self.stride * y + x
+        value = sprite >> shift if shift >= 0 else (sprite << -shift) & self.mask
+        if color == self.BLACK:
+            self.bits |= value
+        else:
+            self.bits &= ~value
+
+    def blit(
+        self, data: bytes, x: int, y: int, width: int, height: int, color: int = BLACK
+    ) -> None:
+        # set bits are drawn with color, others are transparent like drawBitmap
+        first, last = max(0, -x), min(width, self.width - x)
+        if first >= last or y >= self.height or y + height <= 0:
+            return
+        data = Transform.window(data, width, height, first, 0, last - first, height)
+        self.blit_sprite(self.spread(data, last - first, height), x + first, y, color)
+
+    @property
+    def data(self) -> bytes:
+        return self.bits.to_bytes(self.row_size * self.height, "big")
+
+    def to_image(self, name: str) -> Image:
+        image = Image(name, self.width, self.height)
+        image.set_data(self.width, self.height, self.data)
+        return image
+
+
+class Simulator:
+    WIDTH = 200
+    HEIGHT = 200
+    REFERENCE_PATTERN = re.compile(r"^(\w+)\[(\d+)\]$")
+
+    def __init__(
+        self, files: List[File], width: int = WIDTH, height: int = HEIGHT
+    ) -> None:
+        self.width = width
+        self.height = height
+        # first definition wins, like the includes of a watchface
+        self.images: Dict[str, Image] = {}
+        self.tables: Dict[str, List[str]] = {}
+        self.fonts: Dict[str, Font] = {}
+        for file in files:
+            for image in file.images:
+                self.images.setdefault(image.name, image)
+            for table in file.tables:
+                self.tables.setdefault(table.name, table.entries)
+            for font in file.fonts:
+                self.fonts.setdefault(font.name, font)
+        # images at the frame stride, images must not change while rendering
+        self.__sprites: Dict[Tuple[Image, int, int], int] = {}
+
+    def clear(self) -> None:
+        self.__sprites.clear()
+
+    def get_image(self, reference: str) -> Image:
+        # image name or table[index]
+        match = self.REFERENCE_PATTERN.match(reference)
+        name = reference
+        if match is not None:
+            entries = self.tables.get(match.group(1))
+            if entries is None or int(match.group(2)) >= len(entries):
+                raise ValueError(f"unknown image {reference!r}")
+            name = entries[int(match.group(2))]
+        if name not in self.images:
+            raise ValueError(f"unknown image {reference!r}")
+        return self.images[name]
+
+    def draw_bitmap(
+        self,
+        frame: Frame,
+        image: Image,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        color: int = Frame.BLACK,
+    ) -> None:
+        # image data is read with the given size, like display.drawBitmap
+        if x < 0 or x + width > frame.width:
+            frame.blit(image.data, x, y, width, height, color)
+            return
+        key = (image, width, height)
+        if key not in self.__sprites:
+            data = Transform.window(image.data, width, height, 0, 0, width, height)
+            self.__sprites[key] = frame.spread(data, width, height)
+        frame.blit_sprite(self.__sprites[key], x, y, color)
+
+    def draw_text(
+        self,
+        frame: Frame,
+        font: Font,
+        x: int,
+        y: int,
+        text: str,
+        color: int = Frame.BLACK,
+    ) -> None:
+        # y is the baseline, like display.setCursor with a GFX font
+        for char in text:
+            glyph = font.search(ord(char))
+            if glyph is None:
+                continue
+            image = glyph.image
+            self.draw_bitmap(
+                frame,
+                image,
+                x + glyph.x_offset,
+                y + glyph.y_offset,
+                image.width,
+                image.height,
+                color,
+            )
+            x += glyph.x_advance
+
+    def apply(
+        self, frame: Frame, operation: Operation, variables: Dict[str, int]
+    ) -> None:
+        name, *arguments = operation
+        if name == "fill":
+            frame.fill(*arguments)
+        elif name == "bitmap":
+            x, y, reference, width, height, *color = arguments
+            image = self.get_image(reference.format(**variables))
+            self.draw_bitmap(frame, image, x, y, width, height, *color)
+        elif name == "text":
+            x, y, font_name, template, *color = arguments
+            font = self.fonts.get(font_name)
+            if font is None:
+                raise ValueError(f"unknown font {font_name!r}")
+            self.draw_text(frame, font, x, y, template.format(**variables), *color)
+        else:
+            raise ValueError(f"invalid operation {operation!r}")
+
+    def render(self, layout: Layout, variables: Dict[str, int]) -> Frame:
+        frame = Frame(self.width, self.height)
+        for operation in layout.operations:
+            self.apply(frame, operation, variables)
+        return frame
+
+    @staticmethod
+    def get_combinations(
+        layout: Layout, variables: Optional[Dict[str, Sequence[int]]] = None
+    ) -> Iterator[Dict[str, int]]:
+        # every combination of the layout variables, some can be overridden
+        values = dict(layout.variables)
+        values.update(variables or {})
+        names = list(values)
+        for combination in itertools.product(*(values[name] for name in names)):
+            yield dict(zip(names, combination))
+
+    def batch(
+        self, layout: Layout, variables: Optional[Dict[str, Sequence[int]]] = None
+    ) -> Iterator[Tuple[Dict[str, int], Frame]]:
+        for combination in self.get_combinations(layout, variables):
+            yield combination, self.render(layout, combination)
+
+    @staticmethod
+    def contact_sheet(frames: Sequence[Frame], columns: int, gap: int = 8) -> Frame:
+        # frames in a grid, white gaps between them
+        width, height = frames[0].width, frames[0].height
+        rows = (len(frames) + columns - 1) // columns
+        sheet = Frame(
+            columns * (width + gap) - gap, max(rows * (height + gap) - gap, 0)
+        )
+        for i, frame in enumerate(frames):
+            sheet.blit(
+                frame.data,
+                (i % columns) * (width + gap),
+                (i // columns) * (height + gap),
+                frame.width,
+                frame.height,
+            )
+        return sheet
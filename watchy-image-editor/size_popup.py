@@ -0,0 +1,78 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import NamedTuple
+
+from transform import Transform
+
+
+class SizeChoice(NamedTuple):
+    width: int
+    height: int
+    mode: str
+    anchor: str
+    all_images: bool
+
+
+class SizePopup(tk.Toplevel):
+    def __init__(self, parent, *, title: str, width: int, height: int):
+        super().__init__(parent)
+        self.title(title)
+
+        self.value = None
+
+        ttk.Label(self, text="Please enter image size").grid(
+            row=0, column=0, columnspan=2
+        )
+
+        self.width_entry = ttk.Entry(self)
+        self.width_entry.insert(0, str(width))
+        self.width_entry.grid(row=1, column=0)
+
+        self.height_entry = ttk.Entry(self)
+        self.height_entry.insert(0, str(height))
+        self.height_entry.grid(row=1, column=1)
+
+        # scale the pixels, or pad/crop the canvas around the anchor
+        self.mode = tk.StringVar(self, Transform.SCALE)
+        ttk.Radiobutton(
+            self, text="Scale", variable=self.mode, value=Transform.SCALE
+        ).grid(row=2, column=0, sticky="w")
+        ttk.Radiobutton(
+            self, text="Pad / Crop", variable=self.mode, value=Transform.CANVAS
+        ).grid(row=2, column=1, sticky="w")
+
+        ttk.Label(self, text="Anchor").grid(row=3, column=0, sticky="w")
+        self.anchor = tk.StringVar(self, "c")
+        ttk.Combobox(
+            self,
+            textvariable=self.anchor,
+            values=list(Transform.ANCHORS),
+            state="readonly",
+            width=4,
+        ).grid(row=3, column=1, sticky="w")
+
+        self.all_images = tk.BooleanVar(self, False)
+        ttk.Checkbutton(self, text="All images", variable=self.all_images).grid(
+            row=4, column=0, columnspan=2, sticky="w"
+        )
+
+        self.error = ttk.Label(self, foreground="red")
+        self.error.grid(row=5, column=0, columnspan=2)
+
+        button = ttk.Button(self, text="Ok", command=self.cleanup)
+        button.grid(row=6, column=0, columnspan=2)
+
+        parent.wait_window(self)
+
+    def cleanup(self):
+        try:
+            width, height = Transform.parse_size(
+                f"{self.width_entry.get()}x{self.height_entry.get()}"
+            )
+        except ValueError as e:
+            self.error.configure(text=str(e))
+            return
+        self.value = SizeChoice(
+            width, height, self.mode.get(), self.anchor.get(), self.all_images.get()
+        )
+        self.destroy()
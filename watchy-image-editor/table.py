@@ -0,0 +1,37 @@
+from typing import List, Optional, TextIO, Tuple
+
+
+class Table:
+    VALUES_PER_LINE = 8
+
+    def __init__(
+        self, name: str, entries: List[str], span: Optional[Tuple[int, int]] = None
+    ) -> None:
+        self.name = name
+        self.entries = entries
+        # position in the file it was read from, see File.export
+        self.span = span
+        self.modified = False
+        # read from another file, like the watchface .cpp, see File.import_tables
+        self.imported = False
+
+    def rename(self, name: str, new_name: str) -> None:
+        if name in self.entries:
+            self.entries = [
+                new_name if entry == name else entry for entry in self.entries
+            ]
+            self.modified = True
+
+    def write_cpp(self, f: TextIO) -> int:
+        count = self.VALUES_PER_LINE
+        written = f.write(
+            f"const unsigned char *{self.name}[{len(self.entries)}] = {{\n\t"
+        )
+        written += f.write(
+            ",\n\t".join(
+                ", ".join(self.entries[start : start + count])
+                for start in range(0, len(self.entries), count)
+            )
+        )
+        written += f.write("\n};\n")
+        return written
@@ -0,0 +1,55 @@
+from typing import Any, Callable, Optional, Tuple
+import queue
+import threading
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task(threading.Thread):
+    def __init__(
+        self,
+        title: str,
+        function: Callable[["Task"], Any],
+        cancellable: bool = True,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.title = title
+        self.function = function
+        self.cancellable = cancellable
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.__events = queue.Queue()
+        self.__cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancel_event.is_set()
+
+    def cancel(self) -> None:
+        if self.cancellable:
+            self.__cancel_event.set()
+
+    def report(self, value: int, total: int, message: str = "") -> None:
+        # called from the worker thread, stops it when cancelled
+        if self.cancelled:
+            raise TaskCancelled()
+        self.__events.put((value, total, message))
+
+    def poll(self) -> Optional[Tuple[int, int, str]]:
+        # called from the UI thread, returns the latest progress if any
+        last_event = None
+        while True:
+            try:
+                last_event = self.__events.get_nowait()
+            except queue.Empty:
+                return last_event
+
+    def run(self) -> None:
+        try:
+            self.result = self.function(self)
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            self.error = e
@@ -0,0 +1,63 @@
+from tkinter import ttk
+from typing import Callable
+
+from task import Task
+
+
+class TaskBar(ttk.Frame):
+    POLL_DELAY = 50
+
+    def __init__(self, parent, update_callback) -> None:
+        super().__init__(parent)
+
+        self.task = None
+        self.done_callback = None
+        self.update_callback = update_callback
+
+        self.label = ttk.Label(self, width=40)
+        self.label.grid(row=0, column=0, sticky="w")
+
+        self.progress = ttk.Progressbar(self, length=300, mode="determinate")
+        self.progress.grid(row=0, column=1, sticky="ew")
+
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self.cancel)
+        self.cancel_button.grid(row=0, column=2, sticky="e")
+
+        self.grid_columnconfigure(1, weight=1)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+    def start(self, task: Task, done_callback: Callable[[Task], None]) -> None:
+        self.task = task
+        self.done_callback = done_callback
+        self.label.configure(text=task.title)
+        self.progress.configure(value=0, maximum=1)
+        self.cancel_button.configure(
+            state=("normal" if task.cancellable else "disabled")
+        )
+        self.grid()
+        task.start()
+        self.after(self.POLL_DELAY, self.poll)
+
+    def poll(self) -> None:
+        event = self.task.poll()
+        if event is not None:
+            value, total, message = event
+            self.progress.configure(value=value, maximum=max(total, 1))
+            self.label.configure(text=f"{self.task.title} {message}")
+            self.update_callback()
+        if self.task.is_alive():
+            self.after(self.POLL_DELAY, self.poll)
+        else:
+            task, done_callback = self.task, self.done_callback
+            self.task = None
+            self.done_callback = None
+            self.grid_remove()
+            done_callback(task)
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.cancel_button.configure(state="disabled")
@@ -0,0 +1,118 @@
+import os.path
+import tempfile
+import unittest
+from unittest import mock
+
+from atlas import Atlas
+from cache import ParseCache
+from file import File
+from image import Image
+
+WATCHFACES_DIR = os.path.join(os.path.dirname(__file__), "..", "watchfaces")
+HEADERS = [
+    os.path.join(WATCHFACES_DIR, "pokemon-2.0", "pokemon.h"),
+    os.path.join(WATCHFACES_DIR, "tetris-2.0", "tetris.h"),
+]
+
+
+def setUpModule():
+    ParseCache.enabled = False
+
+
+def tearDownModule():
+    ParseCache.enabled = True
+
+
+def get_content(images):
+    return [
+        (image.name, image.width, image.height, bytes(image.data)) for image in images
+    ]
+
+
+class AtlasTest(unittest.TestCase):
+    def test_trim(self):
+        image = Image("image", 12, 5, empty=True)
+        self.assertEqual(Atlas.trim(image), (0, 0, 0, 0))
+        image.set_pixel(2, 1, True)
+        image.set_pixel(9, 3, True)
+        self.assertEqual(Atlas.trim(image), (2, 1, 8, 3))
+
+    def test_pack(self):
+        sizes = [(5, 3), (8, 8), (3, 7), (0, 0), (9, 2), (4, 4)]
+        for align in (1, 8):
+            with self.subTest(align=align):
+                positions, height = Atlas.pack(sizes, 16, align)
+                rectangles = [
+                    (x, y, x + w, y + h)
+                    for (x, y), (w, h) in zip(positions, sizes)
+                    if w > 0
+                ]
+                for x0, y0, x1, y1 in rectangles:
+                    self.assertEqual(x0 % align, 0)
+                    self.assertLessEqual(x1, 16)
+                    self.assertLessEqual(y1, height)
+                for k, a in enumerate(rectangles):
+                    for b in rectangles[k + 1 :]:
+                        self.assertFalse(
+                            a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+                        )
+
+    def test_shared_sprites(self):
+        first = Image("first", 16, 16, empty=True)
+        first.set_pixel(3, 4, True)
+        second = Image("second", 8, 8, empty=True)
+        second.set_pixel(7, 0, True)
+        blank = Image("blank", 8, 8, empty=True)
+        sheet = Atlas.build([first, second, blank])
+        # trimmed to the same pixel, both use the same place in the sheet
+        self.assertEqual(sheet.sprites[0][1:5], sheet.sprites[1][1:5])
+        self.assertEqual(sheet.sprites[2][3:5], (0, 0))
+        self.assertEqual(
+            get_content(Atlas.extract(sheet)), get_content([first, second, blank])
+        )
+
+    def test_extract(self):
+        for path in HEADERS:
+            for align in (1, 8):
+                with self.subTest(path=os.path.basename(path), align=align):
+                    file = File(path)
+                    self.addCleanup(file.close)
+                    sheet = Atlas.build(file.images, align=align)
+                    self.assertEqual(
+                        get_content(Atlas.extract(sheet)), get_content(file.images)
+                    )
+                    separate, packed = Atlas.report(file.images, sheet)
+                    self.assertLess(packed, separate)
+
+    def test_export_read(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for path in HEADERS:
+                with self.subTest(path=os.path.basename(path)):
+                    file = File(path)
+                    self.addCleanup(file.close)
+                    sheet = Atlas.build(file.images)
+                    output = os.path.join(directory, "atlas.h")
+                    Atlas.export(sheet, "sheet", output)
+                    read = Atlas.read(output)
+                    self.assertEqual(read, sheet)
+                    self.assertEqual(
+                        get_content(Atlas.extract(read)), get_content(file.images)
+                    )
+
+    def test_failed_export(self):
+        # the previous header is kept and no temporary file is left
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "atlas.h")
+            with open(output, mode="w") as f:
+                f.write("// previous atlas\n")
+            sheet = Atlas.build([Image("image", 8, 8, empty=True)])
+            with mock.patch.object(Atlas, "write_cpp", side_effect=OSError("full")):
+                with self.assertRaises(OSError):
+                    Atlas.export(sheet, "sheet", output)
+            with open(output) as f:
+                self.assertEqual(f.read(), "// previous atlas\n")
+            self.assertEqual(os.listdir(directory), ["atlas.h"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import os.path
+import tempfile
+import unittest
+
+from cache import ParseCache
+from file import File
+from header import HeaderIndex
+
+HEADER = """\
+// 'one', 8x2px
+const unsigned char one [] PROGMEM = {
+\t0x18, 0x3c
+};
+// 'two', 8x2px
+const unsigned char two [] PROGMEM = {
+\t0x81, 0x42
+};
+#define three one
+const unsigned char *sprites[3] = {
+\tone, two, three
+};
+"""
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "images.h")
+        with open(self.path, mode="w") as f:
+            f.write(HEADER)
+        ParseCache.directory = os.path.join(directory.name, "cache")
+        ParseCache.enabled = True
+        self.addCleanup(setattr, ParseCache, "directory", None)
+
+    def open(self, lazy: bool = False) -> File:
+        file = File(self.path, lazy=lazy)
+        self.addCleanup(file.close)
+        return file
+
+    def load(self, lazy: bool = False):
+        index = HeaderIndex(self.path)
+        self.addCleanup(index.close)
+        return ParseCache.load(self.path, index, lazy)
+
+    def get_content(self, file: File):
+        return [
+            (image.name, image.width, image.height, bytes(image.data))
+            for image in file.images
+        ], [(table.name, table.entries, table.span) for table in file.tables]
+
+    def test_store_and_load(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                ParseCache.clear()
+                self.assertIsNone(self.load(lazy))
+                expected = self.get_content(self.open(lazy))
+                self.assertIsNotNone(self.load(lazy))
+                self.assertEqual(self.get_content(self.open(lazy)), expected)
+
+    def test_lazy_entry(self):
+        self.open(True)
+        images, _, _ = self.load(True)
+        # only aliases are loaded, with the pixels of their target
+        self.assertEqual([image.loaded for image in images], [False, False, True])
+        self.assertEqual(bytes(images[1].data), b"\x81\x42")
+        # an eager open decodes what the lazy one did not store
+        images, _, _ = self.load(False)
+        self.assertTrue(all(image.loaded for image in images))
+        self.assertEqual(
+            [bytes(image.data) for image in images],
+            [b"\x18\x3c", b"\x81\x42", b"\x18\x3c"],
+        )
+
+    def test_modified_file(self):
+        self.open()
+        with open(self.path, mode="a") as f:
+            f.write("// 'four', 8x1px\nconst unsigned char four [] PROGMEM = {0xff};\n")
+        self.assertIsNone(self.load())
+        self.assertEqual([image.name for image in self.open().images][-1], "four")
+        self.assertIsNotNone(self.load())
+
+    def test_touched_file(self):
+        self.open()
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        self.assertIsNone(self.load())
+
+    def test_truncated_entry(self):
+        self.open()
+        cache_path = ParseCache.get_path(self.path)
+        with open(cache_path, mode="rb") as f:
+            content = f.read()
+        for size in (0, ParseCache.HEADER.size, len(content) - 1):
+            with open(cache_path, mode="wb") as f:
+                f.write(content[:size])
+            self.assertIsNone(self.load())
+
+    def test_save_refreshes_entry(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                file = self.open(lazy)
+                file.search("two").set_pixel(0, 0, False)
+                file.save(self.path)
+                images, _, _ = self.load(lazy)
+                self.assertEqual(bytes(images[1].data), bytes(file.images[1].data))
+                self.assertEqual(images[1].source.span, file.images[1].source.span)
+
+    def test_disabled(self):
+        ParseCache.enabled = False
+        self.addCleanup(setattr, ParseCache, "enabled", True)
+        self.open()
+        self.assertFalse(os.path.exists(ParseCache.get_path(self.path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
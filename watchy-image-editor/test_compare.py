@@ -0,0 +1,90 @@
+import unittest
+
+from compare import Compare
+from file import File
+from image import Image
+
+
+def make_file(*images: Image) -> File:
+    file = File(None)
+    file.images = list(images)
+    return file
+
+
+def make_sprite(name: str, width: int, height: int) -> Image:
+    # blank top half, inked bottom half
+    image = Image(name, width, height, empty=True)
+    half = image.row_size * (height // 2)
+    image.data[half:] = b"\x5a" * (len(image.data) - half)
+    return image
+
+
+class CompareTest(unittest.TestCase):
+    def test_identical(self):
+        first = make_sprite("first", 80, 68)
+        second = make_sprite("second", 80, 68)
+        comparison = Compare.compare([make_file(first), make_file(second)])
+        self.assertEqual(len(comparison.identical), 1)
+        self.assertEqual(
+            [ref.image for ref in comparison.identical[0]], [first, second]
+        )
+        self.assertEqual(comparison.near, [])
+        self.assertEqual(comparison.unique, [])
+
+    def test_near_with_blank_bands(self):
+        # one pixel differs in every inked band of max_distance + 1 bands
+        first = make_sprite("first", 80, 68)
+        second = make_sprite("second", 80, 68)
+        size = len(first.data)
+        changed = 0
+        for start, end in Compare.get_bands(size, Compare.MAX_DISTANCE + 1):
+            if any(first.data[start:end]):
+                second.data[start] ^= 0x80
+                changed += 1
+        self.assertGreater(changed, Compare.MAX_DISTANCE // 2)
+        comparison = Compare.compare([make_file(first), make_file(second)])
+        self.assertEqual(
+            [(a.image, b.image, distance) for a, b, distance in comparison.near],
+            [(first, second, changed)],
+        )
+        self.assertEqual(comparison.unique, [])
+
+    def test_near_sparse_images(self):
+        # too few inked bands to be indexed, the pair only shares blank bands
+        first = Image("first", 80, 68, empty=True)
+        second = Image("second", 80, 68, empty=True)
+        count = Compare.BANDS_PER_PIXEL * (Compare.MAX_DISTANCE + 1)
+        bands = Compare.get_bands(len(first.data), count)
+        for start, _ in bands[::8]:
+            first.data[start] = 0x0F
+            second.data[start] = 0x1F
+        comparison = Compare.compare([make_file(first, second)])
+        self.assertEqual(
+            [(a.image, b.image, distance) for a, b, distance in comparison.near],
+            [(first, second, len(bands[::8]))],
+        )
+
+    def test_near_small_images(self):
+        first = Image("first", 8, 4, empty=True)
+        second = Image("second", 8, 4, empty=True)
+        second.data[3] = 0x01
+        comparison = Compare.compare([make_file(first, second)])
+        self.assertEqual(len(comparison.near), 1)
+        self.assertEqual(comparison.near[0][2], 1)
+
+    def test_distance_limit(self):
+        first = make_sprite("first", 80, 68)
+        second = make_sprite("second", 80, 68)
+        second.data[-4:] = b"\xff" * 4
+        distance = Compare.distance(
+            int.from_bytes(first.data, "big"), int.from_bytes(second.data, "big")
+        )
+        self.assertEqual(distance, 16)
+        self.assertEqual(len(Compare.compare([make_file(first, second)], 16).near), 1)
+        comparison = Compare.compare([make_file(first, second)], 15)
+        self.assertEqual(comparison.near, [])
+        self.assertEqual([ref.image for ref in comparison.unique], [first, second])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from cache import ParseCache
+from file import File
+from header import HeaderIndex
+from image import Image
+
+WATCHFACES_DIR = os.path.join(os.path.dirname(__file__), "..", "watchfaces")
+
+HEADER = """\
+#include <Arduino.h>
+
+// first sprite
+// 'one', 8x2px
+const unsigned char one [] PROGMEM = {
+\t0x18, 0x3c
+};
+// 'two', 8x2px
+const unsigned char two [] PROGMEM = {
+\t0x81, 0x42
+};
+#define three one
+const unsigned char *sprites[3] = {
+\tone, two, three
+};
+// end of file
+"""
+
+WATCHFACE = """\
+#include "images.h"
+
+const unsigned char *frames[2] = {two, one};
+
+void draw() {}
+"""
+
+
+def setUpModule():
+    ParseCache.enabled = False
+
+
+def tearDownModule():
+    ParseCache.enabled = True
+
+
+class FileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = self.get_path("images.h")
+        with open(self.path, mode="w", newline="") as f:
+            f.write(HEADER)
+
+    def get_path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def read(self, path: str) -> str:
+        with open(path, newline="") as f:
+            return f.read()
+
+    def open(self, path: str, lazy: bool = False) -> File:
+        file = File(path, lazy=lazy)
+        self.addCleanup(file.close)
+        return file
+
+    def test_unchanged(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                file = self.open(self.path, lazy)
+                self.assertEqual(
+                    [image.name for image in file.images], ["one", "two", "three"]
+                )
+                self.assertEqual(file.tables[0].entries, ["one", "two", "three"])
+                file.save(self.path)
+                self.assertEqual(self.read(self.path), HEADER)
+
+    def test_watchfaces_unchanged(self):
+        for name in ["pokemon-2.0/pokemon.h", "tetris-2.0/tetris.h"]:
+            with self.subTest(name=name):
+                path = self.get_path(os.path.basename(name))
+                shutil.copy(os.path.join(WATCHFACES_DIR, name), path)
+                expected = self.read(path)
+                self.open(path).save(path)
+                self.assertEqual(self.read(path), expected)
+
+    def test_modified_image(self):
+        file = self.open(self.path, True)
+        file.search("two").set_pixel(0, 0, False)
+        file.save(self.path)
+        self.assertEqual(self.read(self.path), HEADER.replace("0x81", "0x01"))
+
+    def test_modified_alias_target(self):
+        # the alias keeps the pixels it was read with
+        file = self.open(self.path)
+        file.search("one").set_pixel(0, 0, True)
+        file.save(self.path)
+        content = self.read(self.path)
+        self.assertIn("const unsigned char three [] PROGMEM", content)
+        self.assertNotIn("#define three", content)
+        self.assertEqual(bytes(File(self.path).search("three").data), b"\x18\x3c")
+
+    def test_new_image_after_last(self):
+        file = self.open(self.path)
+        file.images.append(Image("four", 8, 1, empty=True))
+        file.save(self.path)
+        content = self.read(self.path)
+        self.assertLess(content.index("#define three one"), content.index("four"))
+        self.assertLess(content.index("four"), content.index("*sprites"))
+        self.assertEqual(
+            [image.name for image in File(self.path).images],
+            ["one", "two", "three", "four"],
+        )
+
+    def test_deduplicate_opt_in(self):
+        file = self.open(self.path)
+        file.search("two").data[:] = b"\x18\x3c"
+        file.search("two").modified = True
+        file.save(self.get_path("plain.h"))
+        self.assertNotIn("#define two", self.read(self.get_path("plain.h")))
+        file.save(self.get_path("deduplicated.h"), deduplicate=True)
+        content = self.read(self.get_path("deduplicated.h"))
+        self.assertIn("#define two one", content)
+        self.assertIn("#define three one", content)
+        self.assertEqual(
+            [
+                bytes(image.data)
+                for image in File(self.get_path("deduplicated.h")).images
+            ],
+            [b"\x18\x3c"] * 3,
+        )
+
+    def test_lazy_deduplicate_evict(self):
+        # aliases written by the save are never unloaded
+        path = self.get_path("pokemon.h")
+        shutil.copy(os.path.join(WATCHFACES_DIR, "pokemon-2.0", "pokemon.h"), path)
+        expected = [bytes(image.data) for image in File(path).images]
+        file = self.open(path, True)
+        sizes = [(image.width, image.height) for image in file.images]
+        second = next(k for k in range(1, len(sizes)) if sizes[k] in sizes[:k])
+        first = sizes.index(sizes[second])
+        file.images[second].data[:] = file.images[first].data
+        file.images[second].modified = True
+        expected[second] = expected[first]
+        second = file.images[second]
+        file.save(path, deduplicate=True)
+        self.assertIsNone(second.source.data_span)
+        for image in file.images:
+            image.data
+        self.assertGreater(len(file.images), HeaderIndex.CACHE_SIZE)
+        self.assertEqual([bytes(image.data) for image in file.images], expected)
+
+    def test_remove_image(self):
+        file = self.open(self.path)
+        with self.assertRaises(ValueError):
+            file.remove_image(1)
+        self.assertEqual(len(file.images), 3)
+        self.assertEqual(file.tables[0].entries, ["one", "two", "three"])
+        file.tables = []
+        file.remove_image(1)
+        self.assertEqual([image.name for image in file.images], ["one", "three"])
+
+    def test_remove_image_imported_table(self):
+        cpp_path = self.get_path("watchface.cpp")
+        with open(cpp_path, mode="w") as f:
+            f.write(WATCHFACE)
+        file = self.open(self.path)
+        file.tables = []
+        self.assertEqual(file.import_tables(cpp_path), 1)
+        with self.assertRaises(ValueError):
+            file.remove_image(0)
+
+    def test_imported_tables(self):
+        cpp_path = self.get_path("watchface.cpp")
+        with open(cpp_path, mode="w") as f:
+            f.write(WATCHFACE)
+        file = self.open(self.path)
+        file.import_tables(cpp_path)
+        self.assertEqual(file.tables[-1].entries, ["two", "one"])
+        file.save(self.path)
+        self.assertEqual(self.read(self.path), HEADER)
+        file.save(self.path, imported_tables=True)
+        content = self.read(self.path)
+        self.assertIn("frames[2]", content)
+        self.assertEqual(
+            [table.name for table in File(self.path).tables], ["sprites", "frames"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
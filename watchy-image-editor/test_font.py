@@ -0,0 +1,119 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from cache import ParseCache
+from file import File
+from font import Font
+
+POKEMON_DIR = os.path.join(os.path.dirname(__file__), "..", "watchfaces", "pokemon-2.0")
+FONTS = ["FreeMonoBold7pt7b", "FreeMonoBold10pt7b"]
+
+
+def setUpModule():
+    ParseCache.enabled = False
+
+
+def tearDownModule():
+    ParseCache.enabled = True
+
+
+class FontTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def copy(self, name: str) -> str:
+        path = os.path.join(self.directory, f"{name}.h")
+        shutil.copy(os.path.join(POKEMON_DIR, f"{name}.h"), path)
+        return path
+
+    def open(self, path: str) -> File:
+        file = File(path)
+        self.addCleanup(file.close)
+        return file
+
+    def read(self, path: str) -> str:
+        with open(path, newline="") as f:
+            return f.read()
+
+    def get_glyphs(self, font: Font):
+        return [
+            (
+                glyph.code,
+                glyph.image.width,
+                glyph.image.height,
+                glyph.x_advance,
+                glyph.x_offset,
+                glyph.y_offset,
+                bytes(glyph.image.data),
+            )
+            for glyph in font.glyphs
+        ]
+
+    def test_write_unchanged(self):
+        # every glyph written again, in the layout of fontconvert
+        for name in FONTS:
+            with self.subTest(name=name):
+                path = self.copy(name)
+                expected = self.read(path)
+                file = self.open(path)
+                self.assertEqual([font.name for font in file.fonts], [name])
+                file.fonts[0].modified = True
+                file.save(path)
+                self.assertEqual(self.read(path), expected)
+
+    def test_edit_glyph(self):
+        path = self.copy(FONTS[0])
+        file = self.open(path)
+        font = file.fonts[0]
+        expected = self.get_glyphs(font)
+        glyph = font.search(ord("A"))
+        glyph.image.set_pixel(0, 0, not glyph.image.get_pixel(0, 0))
+        self.assertTrue(file.modified)
+        k = glyph.code - font.first
+        expected[k] = expected[k][:-1] + (bytes(glyph.image.data),)
+        file.save(path)
+        self.assertFalse(file.modified)
+        self.assertEqual(self.get_glyphs(font), expected)
+        self.assertEqual(self.get_glyphs(File(path).fonts[0]), expected)
+
+    def test_resize_glyph(self):
+        # later glyphs move in the bitmap stream
+        path = self.copy(FONTS[1])
+        file = self.open(path)
+        font = file.fonts[0]
+        glyph = font.search(ord("!"))
+        width, height = glyph.image.width + 3, glyph.image.height + 1
+        row_size = (width + 7) // 8
+        # padding bits of the rows stay blank
+        mask = ((1 << width) - 1) << (8 * row_size - width)
+        rows = [(0x5A5A5A >> k) & mask for k in range(height)]
+        glyph.image.set_data(
+            width, height, b"".join(row.to_bytes(row_size, "big") for row in rows)
+        )
+        _, offsets = font.pack()
+        k = glyph.code - font.first
+        self.assertEqual(offsets[k + 1] - offsets[k], (width * height + 7) // 8)
+        expected = self.get_glyphs(font)
+        file.save(path)
+        self.assertEqual(self.get_glyphs(File(path).fonts[0]), expected)
+
+    def test_pack_unpack(self):
+        # rows of odd widths are packed without alignment
+        for width, height in [(1, 1), (3, 5), (7, 3), (9, 2), (17, 4)]:
+            with self.subTest(width=width, height=height):
+                bits = width * height
+                value = (0x5A5A5A5A5A5A5A5A5A >> 3) & ((1 << bits) - 1)
+                size = (bits + 7) // 8
+                stream = (value << (8 * size - bits)).to_bytes(size, "big")
+                font = Font.read(
+                    "test", b"\xff" + stream, [(1, width, height, 0, 0, 0)], 32, 10
+                )
+                self.assertEqual(bytes(font.pack()[0]), stream)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os.path
+import tempfile
+import unittest
+
+from cache import ParseCache
+from file import File
+from history import History, Keyframe, PixelDelta
+from image import Image
+
+
+def setUpModule():
+    ParseCache.enabled = False
+
+
+def tearDownModule():
+    ParseCache.enabled = True
+
+
+def make_image(name: str, value: int) -> Image:
+    image = Image(name, 16, 8, empty=True)
+    image.data[:] = bytes((value + k) % 256 for k in range(len(image.data)))
+    return image
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "images.h")
+        file = File(None)
+        file.images = [make_image(f"image_{k}", 16 * k) for k in range(4)]
+        file.save(self.path)
+        file.close()
+        self.expected = {image.name: bytes(image.data) for image in file.images}
+        self.history = History()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self, lazy: bool) -> File:
+        file = File(self.path, lazy=lazy)
+        self.addCleanup(file.close)
+        return file
+
+    def test_delete_save_undo(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                file = self.open(lazy)
+                image = file.images[1]
+                self.assertEqual(image.loaded, not lazy)
+                self.history.change_list(file, None, lambda: file.remove_image(1))
+                file.save(self.path)
+                self.history.undo()
+                self.assertIs(file.images[1], image)
+                self.assertEqual(bytes(image.data), self.expected["image_1"])
+                file.save(self.path)
+                self.assertEqual(
+                    {image.name: bytes(image.data) for image in File(self.path).images},
+                    self.expected,
+                )
+
+    def test_insert_save_undo_redo(self):
+        file = self.open(True)
+        image = make_image("image_4", 7)
+        self.history.change_list(file, image, lambda: file.images.append(image))
+        file.save(self.path)
+        self.history.undo()
+        file.save(self.path)
+        self.history.redo()
+        self.assertEqual(file.images[-1], image)
+        self.assertEqual(bytes(image.data), bytes(make_image("image_4", 7).data))
+
+    def test_stroke_across_save(self):
+        file = self.open(True)
+        image = file.images[2]
+        self.history.begin(image)
+        image.set_pixel(3, 5, not image.get_pixel(3, 5))
+        row = 5 * image.row_size
+        entry = self.history.end(image, (row, row + image.row_size))
+        self.assertIsInstance(entry, PixelDelta)
+        self.assertEqual(entry.size, 1)
+        edited = bytes(image.data)
+        file.save(self.path)
+        self.history.undo()
+        self.assertEqual(bytes(image.data), self.expected["image_2"])
+        file.save(self.path)
+        self.assertEqual(
+            bytes(File(self.path).search("image_2").data), self.expected["image_2"]
+        )
+        self.history.redo()
+        self.assertEqual(bytes(image.data), edited)
+
+    def test_change_outside_of_span(self):
+        image = make_image("image", 0)
+        self.history.begin(image)
+        image.data[0] ^= 0xFF
+        self.assertIsNone(self.history.end(image, (8, 16)))
+        self.history.begin(image)
+        image.data[0] ^= 0xFF
+        self.assertIsInstance(self.history.end(image), PixelDelta)
+
+    def test_record_file_in_place(self):
+        file = self.open(False)
+        snapshot = self.history.snapshot(file)
+        image = file.images[0]
+        image.data[0] ^= 0xFF
+        image.modified = True
+        self.history.record_file(file, snapshot)
+        entry = self.history.undo()
+        self.assertIsInstance(entry.entries[0], Keyframe)
+        self.assertEqual(bytes(image.data), self.expected["image_0"])
+
+    def test_record_file_unchanged(self):
+        file = self.open(False)
+        snapshot = self.history.snapshot(file)
+        self.history.record_file(file, snapshot)
+        self.assertFalse(self.history.can_undo)
+
+
+if __name__ == "__main__":
+    unittest.main()
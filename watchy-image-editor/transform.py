@@ -0,0 +1,166 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from operator import itemgetter
+import re
+
+from file import File
+from image import Image
+
+
+class Transform:
+    # tk anchors, position of the image in the new canvas in halves
+    ANCHORS = {
+        "nw": (0, 0),
+        "n": (1, 0),
+        "ne": (2, 0),
+        "w": (0, 1),
+        "c": (1, 1),
+        "e": (2, 1),
+        "sw": (0, 2),
+        "s": (1, 2),
+        "se": (2, 2),
+    }
+    SCALE = "scale"
+    CANVAS = "canvas"
+    MODES = [SCALE, CANVAS]
+    SIZE_PATTERN = re.compile(r"^\s*(\d+)\s*[xX,]\s*(\d+)\s*$")
+
+    @classmethod
+    def parse_size(cls, text: str) -> Tuple[int, int]:
+        match = cls.SIZE_PATTERN.match(text)
+        if match is None:
+            raise ValueError(f"invalid size {text!r}, expected WIDTHxHEIGHT")
+        width, height = int(match.group(1)), int(match.group(2))
+        if width == 0 or height == 0:
+            raise ValueError(f"invalid size {text!r}, empty image")
+        return width, height
+
+    @classmethod
+    def window(
+        cls,
+        data: bytes,
+        width: int,
+        height: int,
+        x: int,
+        y: int,
+        new_width: int,
+        new_height: int,
+    ) -> bytearray:
+        # pixels (x, y) to (x + new_width, y + new_height) of the image, blank
+        # outside of it: a crop inside the image, a pad around it
+        row_size = (width + 7) // 8
+        new_row_size = (new_width + 7) // 8
+        # a row is one big int, moving it by x pixels is a single shift
+        shift = 8 * new_row_size - 8 * row_size + x
+        first, last = max(0, -x), min(new_width, width - x)
+        if first >= last:
+            return bytearray(new_row_size * new_height)
+        mask = ((1 << (last - first)) - 1) << (8 * new_row_size - last)
+        blank = bytes(new_row_size)
+        view = memoryview(data)
+        rows = []
+        for j in range(y, y + new_height):
+            if j < 0 or j >= height:
+                rows += [blank]
+                continue
+            value = int.from_bytes(view[j * row_size : (j + 1) * row_size], "big")
+            value = value << shift if shift >= 0 else value >> -shift
+            rows += [(value & mask).to_bytes(new_row_size, "big")]
+        return bytearray(b"".join(rows))
+
+    @staticmethod
+    def get_sources(size: int, new_size: int) -> List[int]:
+        # nearest neighbour, sampled at the center of each new pixel
+        return [(2 * i + 1) * size // (2 * new_size) for i in range(new_size)]
+
+    @classmethod
+    def scale_data(
+        cls, data: bytes, width: int, height: int, new_width: int, new_height: int
+    ) -> bytearray:
+        row_size = (width + 7) // 8
+        new_row_size = (new_width + 7) // 8
+        bit_count = 8 * row_size
+        # a 1-tuple from itemgetter would be a single character
+        pick = itemgetter(*cls.get_sources(width, new_width), 0)
+        padding = "0" * (8 * new_row_size - new_width)
+        view = memoryview(data)
+        scaled: Dict[bytes, bytes] = {}
+        rows = []
+        for j in cls.get_sources(height, new_height):
+            row = bytes(view[j * row_size : (j + 1) * row_size])
+            # sprites repeat rows a lot, blank ones above all
+            if row not in scaled:
+                bits = format(int.from_bytes(row, "big"), f"0{bit_count}b")
+                scaled[row] = int("".join(pick(bits)[:-1]) + padding, 2).to_bytes(
+                    new_row_size, "big"
+                )
+            rows += [scaled[row]]
+        return bytearray(b"".join(rows))
+
+    @classmethod
+    def get_offset(
+        cls, width: int, height: int, new_width: int, new_height: int, anchor: str
+    ) -> Tuple[int, int]:
+        # window origin keeping the image at anchor, centered images are
+        # rounded to the top left like a PIL paste
+        if anchor not in cls.ANCHORS:
+            raise ValueError(f"invalid anchor {anchor!r}")
+        ax, ay = cls.ANCHORS[anchor]
+        return -((new_width - width) * ax // 2), -((new_height - height) * ay // 2)
+
+    @classmethod
+    def crop(cls, image: Image, x: int, y: int, width: int, height: int) -> None:
+        image.set_data(
+            width,
+            height,
+            cls.window(image.data, image.width, image.height, x, y, width, height),
+        )
+
+    @classmethod
+    def pad(cls, image: Image, width: int, height: int, anchor: str = "c") -> None:
+        # smaller sizes crop, around the same anchor
+        x, y = cls.get_offset(image.width, image.height, width, height, anchor)
+        cls.crop(image, x, y, width, height)
+
+    @classmethod
+    def scale(cls, image: Image, width: int, height: int) -> None:
+        image.set_data(
+            width,
+            height,
+            cls.scale_data(image.data, image.width, image.height, width, height),
+        )
+
+    @classmethod
+    def resize(
+        cls, image: Image, width: int, height: int, mode: str, anchor: str = "c"
+    ) -> bool:
+        # False when the image already has this size
+        if (image.width, image.height) == (width, height):
+            return False
+        if mode == cls.SCALE:
+            cls.scale(image, width, height)
+        elif mode == cls.CANVAS:
+            cls.pad(image, width, height, anchor)
+        else:
+            raise ValueError(f"invalid mode {mode!r}")
+        return True
+
+    @classmethod
+    def resize_all(
+        cls,
+        file: File,
+        width: int,
+        height: int,
+        mode: str,
+        anchor: str = "c",
+        images: Optional[List[Image]] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        # number of images resized
+        images = file.images if images is None else images
+        resized = 0
+        for i, image in enumerate(images):
+            if cls.resize(image, width, height, mode, anchor):
+                resized += 1
+            if progress is not None:
+                progress(i + 1, len(images))
+        return resized